@@ -0,0 +1,109 @@
+"""Deterministic synthetic inputs for the benchmarks."""
+
+import json
+import re
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+SIZE_UNITS = {"B": 1, "KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(B|KB|MB|GB)", re.IGNORECASE)
+
+# Bytes generated before each write to the output file
+WRITE_SIZE = 1 << 20
+
+CSV_HEADER = "userId,email,first_name,last_name,age,score,active,signup_date\n"
+FIRST_NAMES = ["Alice", "Bob", "Carol", "Dan", "Erin", "Frank", "Grace", "Heidi"]
+LAST_NAMES = ["Smith", "Jones", "O'Brien", "Garcia", "Chen", "Novak", "Okafor"]
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as `1MB` or `10 GB` into bytes."""
+    match = SIZE_PATTERN.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: int) -> str:
+    for unit in ("GB", "MB", "KB"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def csv_line(i: int) -> str:
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[i % len(LAST_NAMES)]
+    # Some names need quoting, so the parser's slow path is exercised too
+    name = f'"{last}, Jr."' if i % 10 == 0 else last
+    return (
+        f"user_{i},{first.lower()}.{i}@example.com,{first},{name},{18 + i % 60},"
+        f"{(i % 1000) / 10},{'true' if i % 3 else 'false'},2024-{1 + i % 12:02d}-"
+        f"{1 + i % 28:02d}\n"
+    )
+
+
+def user_line(i: int) -> str:
+    record = {
+        "userId": f"user_{i}",
+        "email": f"user.{i}@example.com",
+        "dataFields": {"plan": "pro" if i % 4 else "free", "score": i % 100},
+    }
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def write_lines(
+    path: Path, header: str, line: Callable[[int], str], target_bytes: int
+) -> int:
+    """Write generated lines until the file reaches `target_bytes`.
+
+    Returns the number of lines written, excluding the header.
+    """
+    rows = 0
+    written = 0
+    with open(path, "w", newline="") as f:
+        f.write(header)
+        written += len(header)
+        while written < target_bytes:
+            block = []
+            block_size = 0
+            while block_size < WRITE_SIZE and written + block_size < target_bytes:
+                text = line(rows)
+                block.append(text)
+                block_size += len(text)
+                rows += 1
+            f.write("".join(block))
+            written += block_size
+    return rows
+
+
+def cached_input(
+    directory: Path, name: str, header: str, line: Callable[[int], str], size: int
+) -> Tuple[Path, int]:
+    """Generate an input file once per size and reuse it on later runs.
+
+    `name` is a format string for the file name, e.g. `users_{size}.csv`.
+    Returns the path and the number of records in the file.
+    """
+    path = directory / name.format(size=format_size(size))
+    rows_path = path.with_name(path.name + ".rows")
+    if path.exists() and rows_path.exists():
+        return path, int(rows_path.read_text())
+    rows = write_lines(path, header, line, size)
+    rows_path.write_text(str(rows))
+    return path, rows
+
+
+def users_csv(directory: Path, size: int) -> Tuple[Path, int]:
+    return cached_input(directory, "users_{size}.csv", CSV_HEADER, csv_line, size)
+
+
+def users_jsonl(directory: Path, size: int) -> Tuple[Path, int]:
+    return cached_input(directory, "users_{size}.jsonl", "", user_line, size)
+
+
+def iter_blocks(path: Path, size: int = WRITE_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while block := f.read(size):
+            yield block
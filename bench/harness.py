@@ -0,0 +1,197 @@
+"""Run connector commands and pipelines as subprocesses and measure them."""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, Dict, List, NamedTuple, Optional, Sequence
+
+from pydantic import BaseModel
+
+ROOT = Path(__file__).resolve().parent.parent
+CONNECTORS = ["csv", "iterable", "snowflake"]
+
+# Connectors all name their package `src`, so each runs from its own directory
+LAUNCHER = "from src.main import app; app()"
+
+# Bytes read at a time from the output of the last stage of a pipeline
+READ_SIZE = 1 << 20
+
+
+class Stage(NamedTuple):
+    connector: str
+    args: List[str]
+
+    @property
+    def argv(self) -> List[str]:
+        return [sys.executable, "-c", LAUNCHER, *self.args]
+
+    @property
+    def cwd(self) -> Path:
+        return ROOT / self.connector
+
+    def __str__(self) -> str:
+        return " ".join([self.connector, *self.args])
+
+
+class StageResult(BaseModel):
+    command: str
+    exit_code: int
+    # Peak resident set size of the process, in bytes
+    peak_rss: int
+    user_seconds: float
+    system_seconds: float
+
+
+class ScenarioResult(BaseModel):
+    name: str
+    # Number of records moved by the scenario
+    rows: int
+    # Size of the input, in bytes
+    input_bytes: int = 0
+    seconds: float
+    rows_per_second: float
+    # Largest peak RSS of any process of the pipeline, in bytes
+    peak_rss: int
+    stages: List[StageResult]
+
+
+class StartupResult(BaseModel):
+    connector: str
+    command: str
+    # Whether SNOWPILOT_FAST_START was set
+    fast_start: bool = False
+    repeat: int
+    min_seconds: float
+    median_seconds: float
+    peak_rss: int
+
+
+class PipelineError(Exception):
+    pass
+
+
+def max_rss_bytes(rusage) -> int:
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss
+    return rusage.ru_maxrss * 1024
+
+
+def reap(process: subprocess.Popen, stage: Stage) -> StageResult:
+    """Wait for a process, collecting its own resource usage."""
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return StageResult(
+        command=str(stage),
+        exit_code=process.returncode,
+        peak_rss=max_rss_bytes(rusage),
+        user_seconds=rusage.ru_utime,
+        system_seconds=rusage.ru_stime,
+    )
+
+
+def drain(stream: IO[bytes]) -> int:
+    """Read a stream to the end, returning the number of lines in it."""
+    lines = 0
+    while block := stream.read(READ_SIZE):
+        lines += block.count(b"\n")
+    return lines
+
+
+def run_pipeline(
+    stages: Sequence[Stage],
+    stdin: Optional[Path] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> tuple[float, List[StageResult], int]:
+    """Run the stages connected by pipes, like `a | b | c`.
+
+    Returns the wall time, the result of each stage and the number of lines
+    the last stage wrote. Raises `PipelineError` with the stderr of the
+    failed stages if any exits with a non-zero code.
+    """
+    processes = []
+    stderr_files = []
+    started = time.perf_counter()
+    with open(stdin or os.devnull, "rb") as source:
+        upstream: IO[bytes] = source
+        for stage in stages:
+            stderr = tempfile.TemporaryFile()
+            stderr_files.append(stderr)
+            process = subprocess.Popen(
+                stage.argv,
+                cwd=stage.cwd,
+                stdin=upstream,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env={**os.environ, **(env or {})},
+            )
+            # The next stage now owns the read end
+            if upstream is not source:
+                upstream.close()
+            upstream = process.stdout
+            processes.append(process)
+        lines = drain(upstream)
+        upstream.close()
+
+    results = [reap(process, stage) for process, stage in zip(processes, stages)]
+    seconds = time.perf_counter() - started
+
+    failed = []
+    for result, stderr in zip(results, stderr_files):
+        if result.exit_code != 0:
+            stderr.seek(0)
+            failed.append(
+                f"{result.command}:\n{stderr.read().decode(errors='replace')}"
+            )
+        stderr.close()
+    if failed:
+        raise PipelineError("\n".join(failed))
+    return seconds, results, lines
+
+
+def run_scenario(
+    name: str,
+    stages: Sequence[Stage],
+    rows: Optional[int] = None,
+    stdin: Optional[Path] = None,
+    input_bytes: int = 0,
+) -> ScenarioResult:
+    """Run a pipeline once; `rows` defaults to the lines of its output."""
+    seconds, results, lines = run_pipeline(stages, stdin)
+    rows = lines if rows is None else rows
+    return ScenarioResult(
+        name=name,
+        rows=rows,
+        input_bytes=input_bytes,
+        seconds=seconds,
+        rows_per_second=rows / seconds if seconds else 0.0,
+        peak_rss=max(result.peak_rss for result in results),
+        stages=results,
+    )
+
+
+def measure_startup(
+    connector: str, repeat: int = 10, fast_start: bool = False
+) -> StartupResult:
+    """Time `--help`, the cheapest invocation of a connector."""
+    stage = Stage(connector, ["--help"])
+    env = {"SNOWPILOT_FAST_START": "1" if fast_start else "0"}
+    timings = []
+    peak_rss = 0
+    for _ in range(repeat):
+        seconds, (result,), _ = run_pipeline([stage], env=env)
+        timings.append(seconds)
+        peak_rss = max(peak_rss, result.peak_rss)
+    return StartupResult(
+        connector=connector,
+        command=str(stage),
+        fast_start=fast_start,
+        repeat=repeat,
+        min_seconds=min(timings),
+        median_seconds=statistics.median(timings),
+        peak_rss=peak_rss,
+    )
@@ -0,0 +1,121 @@
+"""A local stand-in for the Iterable API, fast enough not to be the bottleneck.
+
+The connector tests run against it too, replacing its responses.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from data import iter_blocks
+
+USER_FIELDS = {
+    "userId": "string",
+    "email": "string",
+    "dataFields.plan": "string",
+    "dataFields.score": "long",
+}
+
+# Status, headers and body; a body given in blocks needs a Content-Length header
+Response = Tuple[int, Dict[str, str], Union[bytes, Iterable[bytes]]]
+
+
+class MockIterableServer:
+    """Serve `export/data.json` from a JSONL file and accept `users/bulkUpdate`.
+
+    Uploaded users are counted but not stored. Tests replace `handler`, a
+    callable that receives each request and returns `(status, headers, body)`,
+    and with `record_requests` find every request in `requests`. Use as a
+    context manager; the server runs on a background thread of the process.
+    """
+
+    def __init__(
+        self, export_path: Optional[Path] = None, record_requests: bool = False
+    ):
+        self.export_path = export_path
+        self.record_requests = record_requests
+        self.requests: List[dict] = []
+        self.received_users = 0
+        self.handler: Callable[[dict], Response] = self.default_handler
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    @staticmethod
+    def json_response(body, status=200, headers=None) -> Response:
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        return status, headers, json.dumps(body).encode()
+
+    def default_handler(self, request: dict) -> Response:
+        path = request["path"]
+        if path == "/api/users/getFields":
+            return self.json_response({"fields": USER_FIELDS})
+        if path == "/api/export/data.json" and self.export_path is not None:
+            headers = {
+                "Content-Type": "application/x-json-stream",
+                "Content-Length": str(self.export_path.stat().st_size),
+            }
+            return 200, headers, iter_blocks(self.export_path)
+        if path == "/api/users/bulkUpdate":
+            count = len(json.loads(request["body"])["users"])
+            with self.lock:
+                self.received_users += count
+            return self.json_response({"successCount": count, "failCount": 0})
+        return self.json_response({"msg": "Not found"}, 404)
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                url = urlparse(self.path)
+                request = {
+                    "method": self.command,
+                    "path": url.path,
+                    "params": parse_qs(url.query),
+                    "headers": dict(self.headers),
+                    "body": self.rfile.read(length),
+                }
+                if mock.record_requests:
+                    with mock.lock:
+                        mock.requests.append(request)
+                status, headers, body = mock.handler(request)
+                self.send_response(status)
+                if isinstance(body, bytes):
+                    headers = {**headers, "Content-Length": str(len(body))}
+                    body = [body]
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                for block in body:
+                    self.wfile.write(block)
+
+            do_GET = handle_request
+            do_POST = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockIterableServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
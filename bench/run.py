@@ -0,0 +1,332 @@
+"""Benchmark the connectors end to end.
+
+python bench/run.py run --sizes 1MB,100MB,10GB --output results.json
+python bench/run.py compare baseline.json results.json
+"""
+
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import typer
+from pydantic import BaseModel
+from rich.console import Console
+from rich.table import Table
+from typing_extensions import Annotated
+
+from data import format_size, parse_size, users_csv, users_jsonl
+from harness import (
+    CONNECTORS,
+    ROOT,
+    ScenarioResult,
+    Stage,
+    StartupResult,
+    measure_startup,
+    run_scenario,
+)
+from mock_iterable import MockIterableServer
+
+err_console = Console(stderr=True)
+app = typer.Typer()
+
+SCENARIO_GROUPS = ["csv", "jsonl", "iterable"]
+
+
+class BenchReport(BaseModel):
+    created_at: datetime
+    git_commit: Optional[str]
+    python: str
+    platform: str
+    startup: List[StartupResult]
+    scenarios: List[ScenarioResult]
+
+
+def git_commit() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+    )
+    return result.stdout.strip() or None
+
+
+def write_json(path: Path, data: dict) -> Path:
+    path.write_text(json.dumps(data))
+    return path
+
+
+def csv_config(workdir: Path, csv_path: Path) -> str:
+    name = f"csv_{csv_path.stem}.json"
+    return str(write_json(workdir / name, {"csv_path": str(csv_path)}))
+
+
+def iterable_config(workdir: Path, mock: MockIterableServer) -> str:
+    config = {
+        "api_key": "benchmark",
+        "project_type": "user_id_based",
+        "region": "us",
+        "base_url": mock.base_url,
+        "schema_cache_ttl": 0,
+    }
+    return str(write_json(workdir / "iterable.json", config))
+
+
+def fresh_target(workdir: Path, name: str) -> Path:
+    target = workdir / name
+    target.unlink(missing_ok=True)
+    return target
+
+
+def csv_scenarios(workdir: Path, size: int) -> List[ScenarioResult]:
+    source, rows = users_csv(workdir, size)
+    label = format_size(size)
+    input_bytes = source.stat().st_size
+    config = csv_config(workdir, source)
+    results = [
+        run_scenario(
+            f"csv discover {label}",
+            [Stage("csv", ["--config", config, "discover", "--no-cache"])],
+            rows=0,
+            input_bytes=input_bytes,
+        ),
+    ]
+    for engine in ("python", "columnar"):
+        results.append(
+            run_scenario(
+                f"csv extract ({engine} engine) {label}",
+                [Stage("csv", ["--config", config, "extract", "--engine", engine])],
+                input_bytes=input_bytes,
+            )
+        )
+    for data_format in ("jsonl", "arrow"):
+        formats = ["--format", data_format]
+        target = csv_config(workdir, fresh_target(workdir, "target.csv"))
+        results.append(
+            run_scenario(
+                f"csv extract | csv load ({data_format}) {label}",
+                [
+                    Stage("csv", ["--config", config, "extract"] + formats),
+                    Stage(
+                        "csv", ["--config", target, "load", "--no-validate"] + formats
+                    ),
+                ],
+                rows=rows,
+                input_bytes=input_bytes,
+            )
+        )
+    return results
+
+
+def jsonl_scenarios(workdir: Path, size: int) -> List[ScenarioResult]:
+    source, rows = users_jsonl(workdir, size)
+    results = []
+    for engine in ("python", "columnar"):
+        target = csv_config(workdir, fresh_target(workdir, "target.csv"))
+        load = ["--config", target, "load", "--no-validate", "--engine", engine]
+        results.append(
+            run_scenario(
+                f"jsonl | csv load ({engine} engine) {format_size(size)}",
+                [Stage("csv", load)],
+                rows=rows,
+                stdin=source,
+                input_bytes=source.stat().st_size,
+            )
+        )
+    return results
+
+
+def iterable_scenarios(workdir: Path, size: int) -> List[ScenarioResult]:
+    users, rows = users_jsonl(workdir, size)
+    label = format_size(size)
+    input_bytes = users.stat().st_size
+    source, csv_rows = users_csv(workdir, size)
+    # Throttling would measure the rate limit rather than the connector
+    unthrottled = ["--rate-limit", "1000000"]
+    with MockIterableServer(export_path=users) as mock:
+        config = iterable_config(workdir, mock)
+        load = ["--config", config, "load", "-c", "users", "-o", "upsert"]
+        return [
+            run_scenario(
+                f"iterable discover {label}",
+                [Stage("iterable", ["--config", config, "discover", "--no-cache"])],
+                rows=0,
+            ),
+            run_scenario(
+                f"iterable extract {label}",
+                [Stage("iterable", ["--config", config, "extract", "-c", "users"])],
+                input_bytes=input_bytes,
+            ),
+            run_scenario(
+                f"jsonl | iterable load {label}",
+                [Stage("iterable", load + unthrottled)],
+                rows=rows,
+                stdin=users,
+                input_bytes=input_bytes,
+            ),
+            run_scenario(
+                f"csv extract | iterable load {label}",
+                [
+                    Stage(
+                        "csv",
+                        ["--config", csv_config(workdir, source), "extract"]
+                        + ["--fields", "userId,email"],
+                    ),
+                    Stage("iterable", load + unthrottled),
+                ],
+                rows=csv_rows,
+                input_bytes=source.stat().st_size,
+            ),
+        ]
+
+
+SCENARIOS: Dict[str, Callable[[Path, int], List[ScenarioResult]]] = {
+    "csv": csv_scenarios,
+    "jsonl": jsonl_scenarios,
+    "iterable": iterable_scenarios,
+}
+
+
+@app.command()
+def run(
+    sizes: Annotated[
+        str,
+        typer.Option("--sizes", help="Comma-separated input sizes, e.g. 1MB,1GB,10GB"),
+    ] = "1MB,10MB",
+    groups: Annotated[
+        str,
+        typer.Option("--groups", help=f"Scenario groups to run: {SCENARIO_GROUPS}"),
+    ] = ",".join(SCENARIO_GROUPS),
+    startup_repeat: Annotated[
+        int, typer.Option("--startup-repeat", help="Runs of each startup timing")
+    ] = 10,
+    workdir: Annotated[
+        Optional[Path],
+        typer.Option("--workdir", help="Directory for generated inputs, reused"),
+    ] = None,
+    output: Annotated[
+        Optional[Path], typer.Option("--output", "-o", help="File for the results")
+    ] = None,
+):
+    """Run the benchmarks and write the results as JSON."""
+    selected = [group.strip() for group in groups.split(",") if group.strip()]
+    unknown = [group for group in selected if group not in SCENARIOS]
+    if unknown:
+        raise typer.BadParameter(f"Unknown groups: {', '.join(unknown)}")
+
+    workdir = workdir or Path(tempfile.gettempdir()) / "snowpilot-bench"
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    startup = []
+    for connector in CONNECTORS:
+        for fast_start in (False, True):
+            result = measure_startup(connector, startup_repeat, fast_start)
+            err_console.print(
+                f"{startup_name(result)}: {result.median_seconds * 1000:.0f} ms median"
+            )
+            startup.append(result)
+
+    scenarios = []
+    for size in [parse_size(size) for size in sizes.split(",")]:
+        for group in selected:
+            for result in SCENARIOS[group](workdir, size):
+                err_console.print(
+                    f"{result.name}: {result.rows_per_second:,.0f} rows/s, "
+                    f"{result.peak_rss / (1 << 20):.0f} MiB peak RSS"
+                )
+                scenarios.append(result)
+
+    report = BenchReport(
+        created_at=datetime.now(timezone.utc),
+        git_commit=git_commit(),
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        startup=startup,
+        scenarios=scenarios,
+    )
+    text = report.model_dump_json(indent=2)
+    if output:
+        output.write_text(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+def startup_name(result: StartupResult) -> str:
+    suffix = " (fast start)" if result.fast_start else ""
+    return f"startup {result.connector}{suffix}"
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before if before else 0.0
+
+
+@app.command()
+def compare(
+    baseline: Path,
+    current: Path,
+    threshold: Annotated[
+        float,
+        typer.Option("--threshold", help="Relative change reported as a regression"),
+    ] = 0.1,
+):
+    """Compare two result files, exiting with 1 if anything regressed."""
+    before = BenchReport.model_validate_json(baseline.read_text())
+    after = BenchReport.model_validate_json(current.read_text())
+
+    table = Table("Benchmark", "Metric", "Baseline", "Current", "Change")
+    regressions = 0
+
+    def add(name: str, metric: str, old: float, new: float, higher_is_better: bool):
+        nonlocal regressions
+        delta = change(old, new)
+        regressed = -delta > threshold if higher_is_better else delta > threshold
+        regressions += regressed
+        delta_text = f"[red]{delta:+.1%}[/red]" if regressed else f"{delta:+.1%}"
+        table.add_row(name, metric, f"{old:,.3f}", f"{new:,.3f}", delta_text)
+
+    old_startup = {startup_name(result): result for result in before.startup}
+    for result in after.startup:
+        name = startup_name(result)
+        if name in old_startup:
+            add(
+                name,
+                "seconds",
+                old_startup[name].median_seconds,
+                result.median_seconds,
+                higher_is_better=False,
+            )
+
+    old_scenarios = {result.name: result for result in before.scenarios}
+    for result in after.scenarios:
+        if result.name not in old_scenarios:
+            continue
+        old = old_scenarios[result.name]
+        add(result.name, "seconds", old.seconds, result.seconds, False)
+        if result.rows:
+            add(
+                result.name,
+                "rows/s",
+                old.rows_per_second,
+                result.rows_per_second,
+                higher_is_better=True,
+            )
+        add(
+            result.name,
+            "peak RSS MiB",
+            old.peak_rss / (1 << 20),
+            result.peak_rss / (1 << 20),
+            higher_is_better=False,
+        )
+
+    Console().print(table)
+    if regressions:
+        err_console.print(
+            f"[bold red]{regressions} metrics regressed by more than {threshold:.0%}[/bold red]"
+        )
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,207 @@
+from datetime import date, datetime, time
+from typing import IO, Dict, Iterable, Optional, Sequence
+
+import orjson
+from pydantic import AwareDatetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+except ImportError as e:
+    raise ImportError(
+        "--format arrow and --engine columnar require pyarrow, "
+        "install snowpilot-core[arrow]"
+    ) from e
+
+from snowpilot_core.cache import unwrap_optional
+from snowpilot_core.jsonl import JsonlWriter
+from snowpilot_core.models import Schema
+
+# Bytes that JSON strings escape. Quotes and backslashes are escaped column by
+# column; control characters are rare, so batches with any take the slow path.
+CONTROL_CHARACTERS = bytes(range(0x20))
+ESCAPED_CHARACTERS = CONTROL_CHARACTERS + b'"\\'
+# Deleting these from a column leaves only the bytes that need escaping
+UNESCAPED_CHARACTERS = bytes(b for b in range(256) if b not in ESCAPED_CHARACTERS)
+
+# Ends an ISO 8601 timestamp with a zone offset
+ZONE_OFFSET = r"[T ].*(?:Z|[+-]\d{2}:?\d{2})$"
+
+# Semi-structured values (objects, arrays) travel as JSON text
+ARROW_TYPES: Dict[type, pa.DataType] = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    date: pa.date32(),
+    datetime: pa.timestamp("us"),
+    AwareDatetime: pa.timestamp("us", "UTC"),
+    time: pa.time64("us"),
+    dict: pa.string(),
+    list: pa.string(),
+}
+
+
+def arrow_schema(schema: Schema, fields: Optional[Sequence[str]] = None) -> pa.Schema:
+    """Convert a flat discover schema to the Arrow schema of its record batches.
+
+    Only `fields` are included, in that order, if given.
+    """
+    model_fields = schema.model_fields
+    names = fields or list(model_fields)
+    arrow_fields = []
+    for name in names:
+        annotation, nullable = unwrap_optional(model_fields[name].annotation)
+        arrow_fields.append(pa.field(name, ARROW_TYPES[annotation], nullable))
+    return pa.schema(arrow_fields)
+
+
+def naive_timestamps(column: pa.StringArray) -> pa.TimestampArray:
+    """Parse ISO 8601 strings into naive timestamps, and empty strings into nulls.
+
+    A naive timestamp column may still hold zoned values, which Arrow only
+    parses into zoned columns: they are converted to UTC.
+    """
+    column = pc.if_else(pc.equal(column, ""), None, column)
+    zoned = pc.match_substring_regex(column, ZONE_OFFSET)
+    utc = pc.if_else(zoned, column, None).cast(pa.timestamp("us", "UTC"))
+    naive = pc.if_else(zoned, None, column).cast(pa.timestamp("us"))
+    return pc.coalesce(utc.cast(pa.timestamp("us")), naive)
+
+
+def rows_to_batch(rows: Sequence[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    """Transpose row tuples into a record batch of the given schema."""
+    columns = list(zip(*rows)) if rows else [() for _ in schema]
+    arrays = [
+        pa.array(values).cast(field.type) for values, field in zip(columns, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def conform_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    """Reorder and cast the columns of a batch to `schema`.
+
+    Columns missing from the batch are filled with nulls. Raises
+    `pyarrow.ArrowInvalid` if a column cannot be cast to its target type.
+    """
+    arrays = []
+    for field in schema:
+        index = batch.schema.get_field_index(field.name)
+        if index == -1:
+            arrays.append(pa.nulls(batch.num_rows, field.type))
+        else:
+            arrays.append(batch.column(index).cast(field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_stream(
+    stream: IO[bytes], schema: pa.Schema, batches: Iterable[pa.RecordBatch]
+) -> int:
+    """Write record batches to a binary stream in the Arrow IPC stream format.
+
+    Returns the number of rows written.
+    """
+    rows = 0
+    with pa.ipc.new_stream(stream, schema) as writer:
+        for batch in batches:
+            if isinstance(batch, pa.Table):
+                writer.write_table(batch)
+            else:
+                writer.write_batch(batch)
+            rows += batch.num_rows
+    stream.flush()
+    return rows
+
+
+def read_stream(stream: IO[bytes]) -> pa.RecordBatchStreamReader:
+    """Open an Arrow IPC stream; the schema is available before any batch."""
+    return pa.ipc.open_stream(stream)
+
+
+def nested_to_json(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """Replace struct, list and map columns by their values as JSON text."""
+    if not any(pa.types.is_nested(field.type) for field in batch.schema):
+        return batch
+    arrays = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_nested(field.type):
+            column = pa.array(
+                [
+                    None if value is None else orjson.dumps(value).decode()
+                    for value in column.to_pylist()
+                ],
+                pa.string(),
+            )
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+class NestedAsJson:
+    """Wrap a record batch reader, converting nested columns with `nested_to_json`."""
+
+    def __init__(self, reader: pa.RecordBatchReader):
+        self.reader = reader
+        self.schema = pa.schema(
+            [
+                (
+                    pa.field(field.name, pa.string(), field.nullable)
+                    if pa.types.is_nested(field.type)
+                    else field
+                )
+                for field in reader.schema
+            ]
+        )
+
+    def __iter__(self):
+        return (nested_to_json(batch) for batch in self.reader)
+
+
+def string_values(array: pa.StringArray) -> memoryview:
+    """The UTF-8 bytes of all values of a string array, back to back."""
+    _, offsets, data = array.buffers()
+    offsets = memoryview(offsets).cast("i")
+    return memoryview(data)[offsets[array.offset] : offsets[array.offset + len(array)]]
+
+
+def jsonl_lines(batch: pa.RecordBatch) -> Optional[pa.StringArray]:
+    """Serialize a batch of non-null string columns to JSON lines, vectorized.
+
+    Each line is assembled by concatenating the escaped columns between the
+    quoted keys, so no Python object is built per row. Returns None for
+    batches this does not apply to: other types, nulls or control characters.
+    """
+    parts = []
+    for index, (field, column) in enumerate(zip(batch.schema, batch.columns)):
+        if column.type != pa.string() or column.null_count:
+            return None
+        escaped = string_values(column).tobytes().translate(None, UNESCAPED_CHARACTERS)
+        if escaped.translate(None, b'"\\'):
+            return None
+        if escaped:
+            column = pc.replace_substring(column, "\\", "\\\\")
+            column = pc.replace_substring(column, '"', '\\"')
+        key = orjson.dumps(field.name).decode()
+        parts += ["{" if index == 0 else ",", f'{key}:"', column, '"']
+    if not parts:
+        return pa.array(["{}\n"] * batch.num_rows)
+    parts.append("}\n")
+    return pc.binary_join_element_wise(*parts, "")
+
+
+def write_jsonl(stream: IO[bytes], batches: Iterable[pa.RecordBatch]) -> int:
+    """Write record batches to a binary stream as JSON lines.
+
+    The output matches `JsonlWriter`. Returns the number of rows written.
+    """
+    rows = 0
+    with JsonlWriter(stream) as writer:
+        for batch in batches:
+            lines = jsonl_lines(batch)
+            if lines is None:
+                writer.write_many(batch.to_pylist())
+            else:
+                writer.flush()
+                stream.write(string_values(lines))
+            rows += batch.num_rows
+    return rows
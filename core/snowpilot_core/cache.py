@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union, get_args, get_origin
+
+from pydantic import AwareDatetime, BaseModel, create_model
+
+from snowpilot_core.models import Schema
+
+TYPE_NAMES: Dict[type, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    date: "date",
+    datetime: "datetime",
+    AwareDatetime: "aware_datetime",
+    dict: "object",
+}
+TYPES_BY_NAME = {name: type_ for type_, name in TYPE_NAMES.items()}
+
+# Bytes read from each end of a file to fingerprint its content
+FINGERPRINT_BYTES = 1 << 16
+
+
+def default_cache_dir() -> Path:
+    if "SNOWPILOT_CACHE_DIR" in os.environ:
+        return Path(os.environ["SNOWPILOT_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "snowpilot"
+
+
+def unwrap_optional(annotation: Any) -> Tuple[type, bool]:
+    """Split `Optional[T]` into `T` and whether it was optional."""
+    args = get_args(annotation)
+    if get_origin(annotation) is Union and type(None) in args:
+        (inner,) = [arg for arg in args if arg is not type(None)]
+        return inner, True
+    return annotation, False
+
+
+def serialize_schema(schema: Schema) -> Dict[str, Any]:
+    """Describe a flat pydantic model as plain JSON, field by field."""
+    fields = []
+    for name, field in schema.model_fields.items():
+        annotation, nullable = unwrap_optional(field.annotation)
+        fields.append(
+            {
+                "name": name,
+                "type": TYPE_NAMES[annotation],
+                "nullable": nullable,
+                "required": field.is_required(),
+            }
+        )
+    return {"name": schema.__name__, "fields": fields}
+
+
+def deserialize_schema(data: Dict[str, Any]) -> Schema:
+    """Rebuild a model produced by `serialize_schema`."""
+    definitions = {}
+    for field in data["fields"]:
+        annotation = TYPES_BY_NAME[field["type"]]
+        if field["nullable"]:
+            annotation = Optional[annotation]
+        default = ... if field["required"] else None
+        definitions[field["name"]] = (annotation, default)
+    return create_model(data["name"], **definitions)
+
+
+def file_fingerprint(path: str) -> Dict[str, Any]:
+    """Identify a version of a file without reading all of it.
+
+    Combines the size and modification time with a hash of the first and last
+    bytes, so a rewrite that preserves the mtime is still noticed.
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if stat.st_size > FINGERPRINT_BYTES:
+            f.seek(max(stat.st_size - FINGERPRINT_BYTES, FINGERPRINT_BYTES))
+            digest.update(f.read())
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": digest.hexdigest(),
+    }
+
+
+def cache_key(config: BaseModel, fingerprint: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"config": config.model_dump(mode="json"), "fingerprint": fingerprint},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SchemaCache:
+    """On-disk cache of discovered schemas, one JSON file per key.
+
+    Entries older than `ttl` seconds are ignored. Without a `ttl`, entries stay
+    valid until their key changes.
+    """
+
+    def __init__(self, directory: Union[str, Path], ttl: Optional[float] = None):
+        self.directory = Path(directory)
+        self.ttl = ttl
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Schema]]:
+        try:
+            with open(self.path(key), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl is not None and time.time() - entry["created_at"] > self.ttl:
+            return None
+        return {
+            collection_id: deserialize_schema(schema)
+            for collection_id, schema in entry["schemas"].items()
+        }
+
+    def set(self, key: str, schemas: Dict[str, Schema]):
+        entry = {
+            "created_at": time.time(),
+            "schemas": {
+                collection_id: serialize_schema(schema)
+                for collection_id, schema in schemas.items()
+            },
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path(key))
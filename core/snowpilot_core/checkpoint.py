@@ -0,0 +1,195 @@
+"""Durable progress of a load, so that a failed load can be resumed.
+
+A checkpoint file records how many records of the input a load has committed
+to its target: its offset, counted in records read from the input. A load
+started with `--resume` skips that many records and goes on from there, so
+the input must be the same, in the same order, as in the failed run. Work
+done after the last commit is redone, making loads at-least-once unless the
+target can discard it, as CSV appends do.
+
+The file is replaced atomically on each commit, so a crash leaves either the
+previous or the new offset, never a partial file.
+"""
+
+import json
+import os
+from itertools import islice
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import typer
+
+from snowpilot_core.metrics import metrics
+from snowpilot_core.state import write_json
+
+T = TypeVar("T")
+
+# Input records between two checkpoints of a concurrent load
+DEFAULT_MARK_INTERVAL = 1000
+
+
+class Mark(NamedTuple):
+    """Follows the records of the input up to `offset` in a record stream."""
+
+    offset: int
+
+
+class Checkpoint:
+    """The committed offset of a load, and target-specific `state` with it.
+
+    `scope` identifies the load (connector, collection, operation...): a
+    checkpoint written for another scope cannot be resumed.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        scope: Dict[str, Any],
+        offset: int = 0,
+        state: Optional[Dict[str, Any]] = None,
+    ):
+        self.path = Path(path)
+        self.scope = scope
+        self.offset = offset
+        self.state = state or {}
+
+    @classmethod
+    def open(
+        cls,
+        path: Union[str, Path],
+        scope: Dict[str, Any],
+        resume: bool = False,
+        **state: Any,
+    ) -> "Checkpoint":
+        """Read the checkpoint to resume from, or start a new one with `state`.
+
+        Resuming without a checkpoint file starts from the beginning.
+        """
+        if resume and os.path.exists(path):
+            with open(path, "r") as f:
+                saved = json.load(f)
+            if saved["scope"] != scope:
+                raise typer.BadParameter(
+                    f"The checkpoint {path} is for another load: {saved['scope']}"
+                )
+            return cls(path, scope, saved["offset"], saved["state"])
+
+        checkpoint = cls(path, scope)
+        checkpoint.commit(0, **state)
+        return checkpoint
+
+    def commit(self, offset: int, **state: Any):
+        """Record that the first `offset` input records are committed."""
+        self.offset = offset
+        self.state.update(state)
+        with metrics.stage("checkpoint"):
+            write_json(
+                self.path, {"scope": self.scope, "offset": offset, "state": self.state}
+            )
+
+    def chunks(self, records: Iterable[T], size: int) -> Iterator[Tuple[int, List[T]]]:
+        """Skip the committed records, then group the rest into lists.
+
+        Yields each list with the input offset after its last record, to be
+        committed once the list is.
+        """
+        iterator = iter(records)
+        offset = self.offset
+        for _ in islice(iterator, offset):
+            pass
+        while chunk := list(islice(iterator, size)):
+            offset += len(chunk)
+            yield offset, chunk
+
+    def marked(
+        self,
+        records: Iterable[T],
+        transform: Optional[Callable[[List[T]], List[T]]] = None,
+        interval: int = DEFAULT_MARK_INTERVAL,
+    ) -> Iterator[Union[T, Mark]]:
+        """Skip the committed records, then follow every `interval` with a `Mark`.
+
+        `transform` maps each group of input records to the records to load,
+        such as the valid ones; marks still count input records.
+        """
+        for offset, chunk in self.chunks(records, interval):
+            yield from transform(chunk) if transform else chunk
+            yield Mark(offset)
+
+
+def segments(
+    records: Iterable[Union[T, Mark]], size: int
+) -> Iterator[Tuple[List[T], Optional[Mark]]]:
+    """Group a marked stream into lists of at most `size` records.
+
+    Each list is yielded with the mark that ended it, if any, to be committed
+    once its records are. A mark may come with an empty list.
+    """
+    batch: List[T] = []
+    for record in records:
+        if isinstance(record, Mark):
+            yield batch, record
+            batch = []
+            continue
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch, None
+            batch = []
+    if batch:
+        yield batch, None
+
+
+class Acknowledgements:
+    """Commits marks in input order while the batches holding them finish in any.
+
+    Each batch is registered in input order with the last mark seen by the
+    time it was cut, and acknowledged when its records are committed. A mark
+    is committed once its batch and every earlier one are acknowledged.
+    """
+
+    def __init__(self, checkpoint: Checkpoint):
+        self.checkpoint = checkpoint
+        self.marks: Dict[int, Optional[Mark]] = {}
+        self.acknowledged: set = set()
+        self.registered = 0
+        self.committed = 0
+
+    def register(self, mark: Optional[Mark]) -> int:
+        """Register the next batch, returning its ticket."""
+        ticket = self.registered
+        self.marks[ticket] = mark
+        self.registered += 1
+        return ticket
+
+    def acknowledge(self, ticket: int):
+        self.acknowledged.add(ticket)
+        latest = None
+        while self.committed in self.acknowledged:
+            self.acknowledged.remove(self.committed)
+            latest = self.marks.pop(self.committed) or latest
+            self.committed += 1
+        if latest is not None:
+            self.checkpoint.commit(latest.offset)
+
+
+def open_checkpoint(
+    path: Optional[Path], scope: Dict[str, Any], resume: bool, **state: Any
+) -> Optional[Checkpoint]:
+    """Open the checkpoint of `--checkpoint`, if given, for a load command."""
+    if path is None:
+        if resume:
+            raise typer.BadParameter("--resume requires --checkpoint")
+        return None
+    return Checkpoint.open(path, scope, resume, **state)
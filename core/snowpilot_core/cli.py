@@ -0,0 +1,164 @@
+import re
+import sys
+from enum import Enum
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
+
+import typer
+from typing_extensions import Annotated
+
+from snowpilot_core.startup import FAST_START
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+# Heavy modules (rich, pydantic, jsonc) are imported by the functions using
+# them, so that `--help` and argument errors stay fast.
+
+ConfigT = TypeVar("ConfigT", bound="BaseModel")
+
+MARKUP_TAG = re.compile(r"\[/?[a-z][a-z ]*\]")
+
+
+class Console:
+    """Writes messages like `rich.console.Console`, importing rich on first use.
+
+    In fast-start mode rich is never imported: markup tags are stripped and
+    messages are written as plain text.
+    """
+
+    def __init__(self, stderr: bool = False):
+        self.stderr = stderr
+        self._console = None
+
+    def print(self, *objects: Any, style: Optional[str] = None, markup: bool = True):
+        if FAST_START:
+            stream = sys.stderr if self.stderr else sys.stdout
+            text = " ".join(str(obj) for obj in objects)
+            stream.write((MARKUP_TAG.sub("", text) if markup else text) + "\n")
+            return
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console(stderr=self.stderr)
+        self._console.print(*objects, style=style, markup=markup)
+
+
+console = Console()
+err_console = Console(stderr=True)
+
+
+class DataFormat(str, Enum):
+    """Wire format of the records passed between `extract` and `load`."""
+
+    jsonl = "jsonl"
+    # Arrow IPC stream of record batches, requires pyarrow
+    arrow = "arrow"
+
+
+def load_config(config_file: typer.FileText, model: Type[ConfigT]) -> ConfigT:
+    """Parse a JSON/JSONC config file, exiting with the errors if it is invalid."""
+    import jsonc
+    from pydantic import ValidationError
+
+    raw_config = jsonc.load(config_file)
+    try:
+        return model.model_validate(raw_config)
+    except ValidationError as e:
+        err_console.print("[bold red]Error in configuration file:[/bold red]")
+        err_console.print(e, markup=False)
+        raise typer.Exit(code=1)
+
+
+# Seconds between two progress messages of `--metrics`
+METRICS_INTERVAL = 10.0
+
+
+def instrument_command(
+    ctx: typer.Context,
+    metrics: Optional[str],
+    metrics_interval: float,
+    profile: Optional[Path],
+    command: Optional[str] = None,
+):
+    """Report metrics and profile until the command of `ctx` ends, if asked to."""
+    if metrics is None and profile is None:
+        return
+    from snowpilot_core.metrics import instrument
+
+    ctx.call_on_close(instrument(metrics, metrics_interval, profile, command))
+
+
+def config_callback(
+    model: Union[Type["BaseModel"], Callable[[], Type["BaseModel"]]],
+    state: Dict[str, Any],
+) -> Callable[..., None]:
+    """Build the app callback that loads the `--config` file into `state`.
+
+    `model` is the config model, or a function returning it, so that the
+    module defining it is only imported once a command runs.
+
+    Usage: `app.callback()(config_callback(Config, state))`
+    """
+
+    def config(
+        ctx: typer.Context,
+        config_file: Annotated[
+            typer.FileText,
+            typer.Option("--config", "-f", help="Path to the configuration file"),
+        ],
+        metrics: Annotated[
+            Optional[str],
+            typer.Option(
+                "--metrics",
+                help="File to append JSON progress and metrics to, - for stderr",
+            ),
+        ] = None,
+        metrics_interval: Annotated[
+            float,
+            typer.Option(
+                "--metrics-interval", min=0.1, help="Seconds between progress messages"
+            ),
+        ] = METRICS_INTERVAL,
+        profile: Annotated[
+            Optional[Path],
+            typer.Option(
+                "--profile", help="File to write cProfile stats of the run to"
+            ),
+        ] = None,
+    ):
+        """Provide the path to the configuration file."""
+        config_model = model if isinstance(model, type) else model()
+        state["config"] = load_config(config_file, config_model)
+        instrument_command(
+            ctx, metrics, metrics_interval, profile, ctx.invoked_subcommand
+        )
+
+    return config
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated `--fields` value into field names."""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def warn_invalid_line(line: bytes):
+    """Report a JSONL input line that could not be decoded."""
+    text = line.decode(errors="replace").strip()
+    err_console.print(
+        f"Warning: Skipping invalid JSON line: {text}",
+        style="bold yellow",
+        markup=False,
+    )
@@ -0,0 +1,135 @@
+from itertools import islice
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import orjson
+
+from snowpilot_core.metrics import metrics
+
+# Number of encoded bytes buffered before they are written to the stream.
+DEFAULT_CHUNK_SIZE = 1 << 16
+# Number of bytes read from the stream at a time.
+DEFAULT_READ_SIZE = 1 << 20
+
+
+class JsonlReader:
+    """Decode JSONL records from a binary stream.
+
+    The stream is read in blocks of `read_size` bytes. Lines are decoded with
+    orjson directly from a `memoryview` of the block, so a line is neither
+    copied nor decoded to `str` before parsing; only a line that straddles two
+    blocks is joined. Lines that are not valid JSON are passed to `on_error`
+    and skipped.
+    """
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        read_size: int = DEFAULT_READ_SIZE,
+        on_error: Optional[Callable[[bytes], None]] = None,
+    ):
+        self.stream = stream
+        self.read_size = read_size
+        self.on_error = on_error
+        # Offset in the stream just past the last line yielded
+        self.offset = 0
+
+    def invalid(self, line: bytes):
+        # Blank lines are skipped silently
+        if line.strip() and self.on_error is not None:
+            self.on_error(line)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(metrics.timed("decode", self.records()))
+
+    def records(self) -> Iterator[Any]:
+        loads = orjson.loads
+        pending = b""
+        while block := self.stream.read(self.read_size):
+            metrics.count("bytes_in", len(block))
+            if pending:
+                block = pending + block
+            view = memoryview(block)
+            start = 0
+            rows = 0
+            while (end := block.find(b"\n", start)) != -1:
+                line = view[start:end]
+                self.offset += end + 1 - start
+                start = end + 1
+                if not line.nbytes:
+                    continue
+                try:
+                    record = loads(line)
+                except orjson.JSONDecodeError:
+                    self.invalid(line.tobytes())
+                    continue
+                rows += 1
+                yield record
+            metrics.count("rows_in", rows)
+            pending = block[start:]
+
+        # The last line may lack a trailing newline
+        if pending:
+            self.offset += len(pending)
+            try:
+                record = loads(pending)
+            except orjson.JSONDecodeError:
+                self.invalid(pending)
+                return
+            metrics.count("rows_in")
+            yield record
+
+    def batches(self, batch_size: int) -> Iterator[List[Any]]:
+        """Group decoded records into lists of at most `batch_size` items."""
+        iterator = iter(self)
+        while batch := list(islice(iterator, batch_size)):
+            yield batch
+
+
+class JsonlWriter:
+    """Serialize records as JSONL and write them to a binary stream in chunks."""
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        default: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        # Called by orjson for values it cannot serialize natively
+        self.default = default
+        self.count = 0
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._flushed = 0
+
+    def write(self, record: Dict[str, Any]):
+        line = orjson.dumps(
+            record, default=self.default, option=orjson.OPT_APPEND_NEWLINE
+        )
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.count += 1
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        with metrics.stage("write"):
+            if self._buffer:
+                self.stream.write(b"".join(self._buffer))
+                metrics.count("rows_out", self.count - self._flushed)
+                metrics.count("bytes_out", self._buffered)
+                self._buffer.clear()
+                self._buffered = 0
+                self._flushed = self.count
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
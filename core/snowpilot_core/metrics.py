@@ -0,0 +1,306 @@
+"""Counters, latency histograms and stage timings of a connector run.
+
+Connectors report to the shared `metrics` registry: rows and bytes in and out,
+the latency of each batch or request, retries, and the time spent in each
+stage of the pipeline (decoding, validating, sending...). The registry is
+disabled unless a command is run with `--metrics`; until then, reporting to it
+costs a flag check.
+
+Stage times are exclusive, and kept per thread: when a stage runs inside
+another one, such as the decoding of input records pulled while a batch is
+being encoded, the outer stage is paused meanwhile. The times of one thread
+therefore add up to at most the wall time.
+
+With `--metrics <file>` (`-` for stderr), a JSON line of type `progress` is
+written every `--metrics-interval` seconds, and one of type `summary` once the
+command ends. `--profile <file>` runs the command under cProfile, on every
+thread it starts, and writes the merged stats for `pstats`.
+"""
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+
+# Upper bounds of the latency buckets, in seconds: 1ms to about a minute
+LATENCY_BUCKETS = tuple(0.001 * 2**i for i in range(17))
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets."""
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = list(bounds)
+        # The last bucket holds the values above every bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip([*self.bounds, "inf"], self.counts)
+                if count
+            },
+        }
+
+
+class Metrics:
+    """Registry of the counters, histograms and stage times of a run."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counters: Dict[str, float] = defaultdict(int)
+        self.histograms: Dict[str, Histogram] = {}
+        # Stage times of each thread, only written by that thread
+        self._stage_times: List[Dict[str, float]] = []
+        self._local = threading.local()
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+        """Add a value, such as a latency in seconds, to a histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def _stack(self) -> list:
+        local = self._local
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+            local.times = defaultdict(float)
+            with self._lock:
+                self._stage_times.append(local.times)
+        return stack
+
+    def _enter(self, name: str):
+        stack = self._stack()
+        now = time.perf_counter()
+        if stack:
+            # The enclosing stage is paused until this one exits
+            outer = stack[-1]
+            self._local.times[outer[0]] += now - outer[1]
+        stack.append([name, now])
+
+    def _exit(self):
+        stack = self._local.stack
+        now = time.perf_counter()
+        name, started = stack.pop()
+        self._local.times[name] += now - started
+        if stack:
+            stack[-1][1] = now
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the body of a `with` block as stage `name`."""
+        if not self.enabled:
+            yield
+            return
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterable[T]:
+        """Time the production of each item of `iterable` as stage `name`."""
+        if not self.enabled:
+            return iterable
+        return self._timed(name, iter(iterable))
+
+    def _timed(self, name: str, iterator: Iterator[T]) -> Iterator[T]:
+        try:
+            while True:
+                self._enter(name)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._exit()
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages: Dict[str, float] = defaultdict(float)
+            for times in self._stage_times:
+                for name, seconds in list(times.items()):
+                    stages[name] += seconds
+            return {
+                "elapsed": time.monotonic() - self.started,
+                "counters": dict(self.counters),
+                "stages": dict(stages),
+                "histograms": {
+                    name: histogram.snapshot()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+metrics = Metrics()
+
+
+class Reporter:
+    """Writes the metrics as JSON lines, periodically and when closed."""
+
+    def __init__(
+        self,
+        registry: Metrics,
+        stream: IO[str],
+        interval: float,
+        command: Optional[str] = None,
+    ):
+        self.registry = registry
+        self.stream = stream
+        self.interval = interval
+        self.command = command
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="snowpilot-metrics", daemon=True
+        )
+
+    def report(self, type: str):
+        message = {"type": type, "command": self.command, **self.registry.snapshot()}
+        self.stream.write(json.dumps(message) + "\n")
+        self.stream.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report("progress")
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.report("summary")
+
+
+class Profiler:
+    """cProfile of the calling thread and of every thread started meanwhile.
+
+    From Python 3.12 on, cProfile is built on `sys.monitoring`, which sees
+    every thread and admits a single profiler: one profile covers them all.
+    Before that, each thread needs a profile of its own, merged when stopped.
+    """
+
+    def __init__(self):
+        self.profiles: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, *args):
+        # Installed by `threading.setprofile`, so it runs first in new threads
+        import cProfile
+
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._profile_thread)
+        self._profile_thread()
+
+    def stop(self, path: Union[str, Path]):
+        import pstats
+
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self.profiles[0].disable()
+        # Threads still running are profiled up to this point
+        pstats.Stats(*self.profiles).dump_stats(path)
+
+
+def instrument(
+    metrics_path: Optional[str],
+    interval: float,
+    profile_path: Optional[Path] = None,
+    command: Optional[str] = None,
+) -> Callable[[], None]:
+    """Start reporting metrics and profiling, returning the function that ends them."""
+    reporter = None
+    stream = None
+    if metrics_path is not None:
+        metrics.reset()
+        metrics.enabled = True
+        stream = sys.stderr if metrics_path == "-" else open(metrics_path, "a")
+        reporter = Reporter(metrics, stream, interval, command)
+        reporter.start()
+    profiler = None
+    if profile_path is not None:
+        profiler = Profiler()
+        profiler.start()
+
+    def finish():
+        if profiler is not None:
+            profiler.stop(profile_path)
+        if reporter is not None:
+            reporter.close()
+            metrics.enabled = False
+            if stream is not sys.stderr:
+                stream.close()
+
+    return finish
@@ -0,0 +1,28 @@
+from typing import Optional, Type
+
+from pydantic import BaseModel, field_serializer
+
+# should this be Type[BaseModel] or Type[Dict[str, Any]]?
+Schema = Type[BaseModel]
+
+
+class CollectionMetadata(BaseModel):
+    id: str
+    label: str
+    row: Optional[Schema] = None
+    insert: Optional[Schema] = None
+    update: Optional[Schema] = None
+    upsert: Optional[Schema] = None
+    delete: Optional[Schema] = None
+
+    @field_serializer(
+        "row", "insert", "update", "upsert", "delete", when_used="json-unless-none"
+    )
+    def serialize_schema(value: Optional[Schema]):
+        if value is None:
+            return None
+        return value.model_json_schema()
+
+
+class Catalog(BaseModel):
+    collections: list[CollectionMetadata]
@@ -0,0 +1,96 @@
+"""Input read ahead of its consumer, on a thread of its own.
+
+A `Producer` iterates over its items on a separate thread and puts them into a
+bounded queue, blocking once it is full: a slow consumer holds back the
+reading of the input instead of letting it pile up in memory. `snowpilot run`
+extracts records this way while loading them, and the Iterable connector
+encodes request bodies while sending them.
+"""
+
+import queue
+import threading
+from typing import Any, Generic, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Seconds between checks for a stopped producer while the queue is full
+POLL_INTERVAL = 0.1
+
+
+class _Done:
+    """Ends the queue of items, carrying the error that ended them."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+# Returned by `Producer.get` once every item is
+END: Any = object()
+
+
+class Producer(Generic[T]):
+    """Reads `items` on a thread of its own, at most `queue_size` ahead.
+
+    An error raised by the items is raised again by `get`. Once stopped, the
+    producer gives up on the item it is putting, if any, and closes `items`.
+    """
+
+    def __init__(
+        self, items: Iterable[T], queue_size: int, name: str = "snowpilot-producer"
+    ):
+        self.items = items
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _put(self, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        iterator = iter(self.items)
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+            self._put(_Done())
+        except BaseException as e:
+            self._put(_Done(e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def start(self):
+        self._thread.start()
+
+    def get(self) -> T:
+        """Wait for the next item, returning `END` after the last one."""
+        item = self._queue.get()
+        if isinstance(item, _Done):
+            if item.error is not None:
+                raise item.error
+            return END
+        return item
+
+    def stop(self):
+        """Stop reading the items, and wait for the thread to end."""
+        self._stop.set()
+        self._thread.join()
+        # Wakes up a consumer still waiting, such as one on another thread
+        try:
+            self._queue.put_nowait(_Done())
+        except queue.Full:
+            pass
+
+    def __enter__(self) -> "Producer[T]":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
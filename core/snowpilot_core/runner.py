@@ -0,0 +1,350 @@
+"""Run an extract and a load in one process, without the stdin/stdout hop.
+
+`snowpilot run` imports two connectors as libraries and passes the records
+yielded by the source's `extract_records` straight to the target's
+`load_records`. Extraction runs on a producer thread that fills a bounded
+queue with batches; loading consumes them on the main thread, so both sides
+overlap, and a slow target holds back the source instead of letting records
+pile up in memory.
+
+Every connector is a package named `src`, which it imports itself by that
+name. Each one is therefore loaded under an alias of its own, with `src`
+imports inside it remapped to the alias, so that several connectors can be
+imported side by side. Worker processes started by spawn or forkserver do
+not inherit the aliases: connectors start them with `process_pool`, which
+registers the alias in each worker first.
+"""
+
+import builtins
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import inspect
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from pathlib import Path
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+)
+
+import typer
+from typing_extensions import Annotated
+
+from snowpilot_core.cli import (
+    METRICS_INTERVAL,
+    console,
+    err_console,
+    instrument_command,
+    load_config,
+    parse_fields,
+)
+
+T = TypeVar("T")
+
+CONNECTOR_PACKAGE = "src"
+ALIAS_PREFIX = "snowpilot_connector_"
+
+DEFAULT_BATCH_SIZE = 1000
+# Batches extracted ahead of the load
+DEFAULT_QUEUE_SIZE = 8
+
+
+def remapped_import(alias: str) -> Callable[..., ModuleType]:
+    """Build an `__import__` that resolves absolute `src` imports to `alias`."""
+
+    def __import__(name, globals=None, locals=None, fromlist=(), level=0):
+        if level == 0 and (
+            name == CONNECTOR_PACKAGE or name.startswith(CONNECTOR_PACKAGE + ".")
+        ):
+            name = alias + name[len(CONNECTOR_PACKAGE) :]
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    return __import__
+
+
+class RemappingLoader(importlib.abc.Loader):
+    """Executes a module of a connector with `src` imports remapped."""
+
+    def __init__(self, loader: importlib.abc.Loader, module_builtins: Dict):
+        self.loader = loader
+        self.module_builtins = module_builtins
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType):
+        # Functions look up `__import__` in the builtins of their globals,
+        # so this also covers the imports deferred to command functions
+        module.__dict__["__builtins__"] = self.module_builtins
+        self.loader.exec_module(module)
+
+
+class ConnectorFinder(importlib.abc.MetaPathFinder):
+    """Finds the submodules of a connector loaded under `alias`."""
+
+    def __init__(self, alias: str, module_builtins: Dict):
+        self.alias = alias
+        self.module_builtins = module_builtins
+
+    def find_spec(self, fullname, path, target=None):
+        if not fullname.startswith(self.alias + "."):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is not None and spec.loader is not None:
+            spec.loader = RemappingLoader(spec.loader, self.module_builtins)
+        return spec
+
+
+def connector_dir(connector: str) -> Path:
+    """Find a connector by directory, or by name next to this package."""
+    path = Path(connector)
+    if not (path / CONNECTOR_PACKAGE).is_dir():
+        path = Path(__file__).resolve().parent.parent.parent / connector
+    if not (path / CONNECTOR_PACKAGE).is_dir():
+        raise typer.BadParameter(f"No connector found at {connector}")
+    return path.resolve()
+
+
+def register_connector(path: Path) -> str:
+    """Make the connector in directory `path` importable under its alias.
+
+    Returns the alias. Only the package itself is imported.
+    """
+    alias = ALIAS_PREFIX + path.name.replace("-", "_")
+    if alias in sys.modules:
+        return alias
+
+    module_builtins = dict(builtins.__dict__)
+    module_builtins["__import__"] = remapped_import(alias)
+    sys.meta_path.insert(0, ConnectorFinder(alias, module_builtins))
+
+    package_dir = path / CONNECTOR_PACKAGE
+    spec = importlib.util.spec_from_file_location(
+        alias,
+        package_dir / "__init__.py",
+        submodule_search_locations=[str(package_dir)],
+    )
+    spec.loader = RemappingLoader(spec.loader, module_builtins)
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[alias] = package
+    try:
+        spec.loader.exec_module(package)
+    except BaseException:
+        del sys.modules[alias]
+        raise
+    return alias
+
+
+def load_connector(connector: str) -> ModuleType:
+    """Import the `main` module of a connector, given its name or directory."""
+    path = connector_dir(connector)
+    alias = ALIAS_PREFIX + path.name.replace("-", "_")
+    if alias + ".main" in sys.modules:
+        return sys.modules[alias + ".main"]
+
+    register_connector(path)
+    try:
+        return importlib.import_module(alias + ".main")
+    except BaseException:
+        del sys.modules[alias]
+        raise
+
+
+def process_pool(
+    workers: int, module: str, mp_context: Optional[BaseContext] = None
+) -> ProcessPoolExecutor:
+    """Process pool whose workers can run the functions of connector `module`.
+
+    `module` is the `__name__` of the calling module. When the connector was
+    loaded under an alias, each worker registers it before running anything,
+    as workers started by spawn or forkserver import every module afresh.
+    """
+    package = sys.modules[module.partition(".")[0]]
+    if not package.__name__.startswith(ALIAS_PREFIX):
+        return ProcessPoolExecutor(workers, mp_context)
+    return ProcessPoolExecutor(
+        workers,
+        mp_context,
+        initializer=register_connector,
+        initargs=(Path(package.__path__[0]).parent,),
+    )
+
+
+def batched(records: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_pipeline(
+    records: Iterable[T],
+    load: Callable[[Iterator[T]], Any],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Any:
+    """Feed `records` to `load` through a bounded queue, returning its result.
+
+    `records` is read on a producer thread, in batches of `batch_size`, while
+    `load` runs on the calling thread. The producer blocks once `queue_size`
+    batches are waiting. An error raised while extracting is raised again by
+    the iterator `load` consumes; if `load` returns or fails early, the
+    producer stops and `records` is closed.
+    """
+    from snowpilot_core.metrics import metrics
+    from snowpilot_core.producer import END, Producer
+
+    def extract() -> Iterator[List[T]]:
+        iterator = iter(records)
+        try:
+            for batch in metrics.timed("extract", batched(iterator, batch_size)):
+                metrics.count("batches")
+                yield batch
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def consume(producer: Producer[List[T]]) -> Iterator[T]:
+        while True:
+            # Time the load spends waiting for the source
+            with metrics.stage("queue_wait"):
+                batch = producer.get()
+            if batch is END:
+                return
+            yield from batch
+
+    with Producer(extract(), queue_size, "snowpilot-extract") as producer:
+        return load(consume(producer))
+
+
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    ctx: typer.Context,
+    source: Annotated[
+        str, typer.Option(help="Name or directory of the connector to extract from")
+    ],
+    source_config: Annotated[
+        typer.FileText, typer.Option(help="Configuration file of the source")
+    ],
+    target: Annotated[
+        str, typer.Option(help="Name or directory of the connector to load into")
+    ],
+    target_config: Annotated[
+        typer.FileText, typer.Option(help="Configuration file of the target")
+    ],
+    source_collection: Annotated[Optional[str], typer.Option()] = None,
+    fields: Annotated[
+        Optional[str],
+        typer.Option(help="Comma-separated list of fields to extract"),
+    ] = None,
+    state: Annotated[
+        Optional[Path],
+        typer.Option(
+            help="File with the cursor to extract from, updated once the records are loaded"
+        ),
+    ] = None,
+    target_collection: Annotated[Optional[str], typer.Option()] = None,
+    operation: Annotated[Optional[str], typer.Option("--operation", "-o")] = None,
+    key: Annotated[
+        Optional[str],
+        typer.Option(help="Comma-separated key columns, for targets that take them"),
+    ] = None,
+    checkpoint: Annotated[
+        Optional[Path],
+        typer.Option(help="File recording how much of the input is loaded"),
+    ] = None,
+    resume: Annotated[
+        bool,
+        typer.Option(help="Skip the records loaded according to --checkpoint"),
+    ] = False,
+    batch_size: Annotated[
+        int,
+        typer.Option(min=1, help="Records passed from the source at a time"),
+    ] = DEFAULT_BATCH_SIZE,
+    queue_size: Annotated[
+        int,
+        typer.Option(min=1, help="Batches extracted ahead of the load"),
+    ] = DEFAULT_QUEUE_SIZE,
+    metrics: Annotated[
+        Optional[str],
+        typer.Option(help="File to append JSON progress and metrics to, - for stderr"),
+    ] = None,
+    metrics_interval: Annotated[
+        float, typer.Option(min=0.1, help="Seconds between progress messages")
+    ] = METRICS_INTERVAL,
+    profile: Annotated[
+        Optional[Path],
+        typer.Option(help="File to write cProfile stats of the run to"),
+    ] = None,
+):
+    """Extract records from a source and load them into a target, in-process."""
+    instrument_command(ctx, metrics, metrics_interval, profile, "run")
+    source_main = load_connector(source)
+    target_main = load_connector(target)
+    source_settings = load_config(source_config, source_main.config_model())
+    target_settings = load_config(target_config, target_main.config_model())
+
+    extract_kwargs = {}
+    extract_state = None
+    if state is not None:
+        from snowpilot_core.state import ExtractState
+
+        parameters = inspect.signature(source_main.extract_records).parameters
+        if "state" not in parameters:
+            raise typer.BadParameter(f"--state is not supported by {source}")
+        extract_state = ExtractState.read(state)
+        extract_kwargs["state"] = extract_state
+    records = source_main.extract_records(
+        source_settings, source_collection, parse_fields(fields), **extract_kwargs
+    )
+    # Options only some targets take, passed on when set
+    options = {
+        "--key": ("keys", parse_fields(key)),
+        "--checkpoint": ("checkpoint", checkpoint),
+        "--resume": ("resume", resume),
+    }
+    parameters = inspect.signature(target_main.load_records).parameters
+    kwargs = {}
+    for option, (name, value) in options.items():
+        if not value:
+            continue
+        if name not in parameters:
+            raise typer.BadParameter(f"{option} is not supported by {target}")
+        kwargs[name] = value
+    loaded = run_pipeline(
+        records,
+        lambda stream: target_main.load_records(
+            target_settings, stream, target_collection, operation, **kwargs
+        ),
+        batch_size=batch_size,
+        queue_size=queue_size,
+    )
+    # Saved after the load, so records that failed to load are extracted again
+    if extract_state is not None:
+        extract_state.save()
+
+    if not loaded:
+        err_console.print("[bold yellow]Warning: No records were loaded.[/bold yellow]")
+        return
+    console.print(f"[green]Successfully loaded {loaded} records[/green]")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,23 @@
+"""Fast-start mode, for orchestrators that spawn many connector processes.
+
+Set `SNOWPILOT_FAST_START=1` to enable it. Output is then written as plain
+text, and rich is hidden from typer, which otherwise imports it (and renders
+help and errors with it) at a cost larger than the rest of the startup.
+
+Hiding rich only works if this module is imported before typer, so connectors
+import it from their package `__init__`.
+"""
+
+import os
+import sys
+
+FAST_START = os.environ.get("SNOWPILOT_FAST_START", "").lower() not in (
+    "",
+    "0",
+    "false",
+)
+
+if FAST_START:
+    # An import of a module set to None raises ImportError, which typer
+    # handles by falling back to plain click output
+    sys.modules.setdefault("rich", None)
@@ -0,0 +1,62 @@
+"""Cursors of incremental extracts, kept in a local JSON state file.
+
+`extract --state <file>` reads the cursor of the collection from the file,
+extracts only the records after it, then writes the cursor of the records
+just extracted back to the file. What a cursor holds is up to the connector:
+a watermark, a byte offset... The file maps collection ids to cursors, so use
+one file per source.
+
+The cursor is only saved once every record has been written out, so a failed
+extract is simply run again. Records are extracted at least once.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+
+def write_json(path: Union[str, Path], data: Any):
+    """Replace a JSON file atomically, synced to disk."""
+    directory = Path(path).parent
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ExtractState:
+    """The cursor of each collection extracted from a source."""
+
+    def __init__(
+        self, path: Union[str, Path], cursors: Optional[Dict[str, Any]] = None
+    ):
+        self.path = Path(path)
+        self.cursors = cursors or {}
+
+    @classmethod
+    def read(cls, path: Union[str, Path]) -> "ExtractState":
+        """Read a state file, which may not exist yet."""
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r") as f:
+            return cls(path, json.load(f)["cursors"])
+
+    def cursor(self, collection_id: str) -> Any:
+        """The cursor to extract from, None for a full extract."""
+        return self.cursors.get(collection_id)
+
+    def advance(self, collection_id: str, cursor: Any):
+        """Set the cursor of a collection once its records are extracted."""
+        self.cursors[collection_id] = cursor
+
+    def save(self):
+        write_json(self.path, {"cursors": self.cursors})
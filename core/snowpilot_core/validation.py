@@ -0,0 +1,67 @@
+from collections import defaultdict
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
+from snowpilot_core.metrics import metrics
+from snowpilot_core.models import Schema
+
+DEFAULT_VALIDATION_BATCH_SIZE = 1000
+
+
+class RecordValidator:
+    """Validate records against an operation schema, a batch at a time.
+
+    The schema is compiled once into a `TypeAdapter` over lists, so a batch is
+    validated by a single call into pydantic-core. Valid records are passed on
+    unchanged; invalid ones are written with their errors to `dead_letter`, if
+    given, and counted in `invalid_count`.
+    """
+
+    def __init__(self, schema: Schema, dead_letter: Optional[IO[bytes]] = None):
+        self.adapter = TypeAdapter(List[schema])
+        self.dead_letter = dead_letter
+        self.invalid_count = 0
+
+    def validate(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with metrics.stage("validate"):
+            return self._validate(batch)
+
+    def _validate(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        try:
+            self.adapter.validate_python(batch)
+            return batch
+        except ValidationError as e:
+            errors = defaultdict(list)
+            for error in e.errors(include_url=False):
+                index, *loc = error["loc"]
+                errors[index].append(
+                    {"loc": loc, "msg": error["msg"], "type": error["type"]}
+                )
+
+        self.invalid_count += len(errors)
+        metrics.count("rows_invalid", len(errors))
+        if self.dead_letter is not None:
+            self.dead_letter.write(
+                b"".join(
+                    orjson.dumps(
+                        {"record": batch[index], "errors": record_errors},
+                        default=str,
+                        option=orjson.OPT_APPEND_NEWLINE,
+                    )
+                    for index, record_errors in errors.items()
+                )
+            )
+        return [record for index, record in enumerate(batch) if index not in errors]
+
+    def filter(
+        self,
+        records: Iterable[Dict[str, Any]],
+        batch_size: int = DEFAULT_VALIDATION_BATCH_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """Lazily yield the valid records of a stream."""
+        iterator = iter(records)
+        while batch := list(islice(iterator, batch_size)):
+            yield from self.validate(batch)
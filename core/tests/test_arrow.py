@@ -0,0 +1,87 @@
+import io
+from datetime import date, datetime
+from typing import Optional
+
+import orjson
+import pyarrow as pa
+from pydantic import AwareDatetime, create_model
+
+from snowpilot_core.arrow import (
+    arrow_schema,
+    conform_batch,
+    naive_timestamps,
+    nested_to_json,
+    rows_to_batch,
+    write_jsonl,
+)
+from snowpilot_core.jsonl import JsonlWriter
+
+
+def test_arrow_schema_follows_discover_schema():
+    schema = create_model("users", id=(int, ...), joined=(Optional[date], None))
+
+    assert arrow_schema(schema, ["joined", "id"]) == pa.schema(
+        [pa.field("joined", pa.date32()), pa.field("id", pa.int64(), False)]
+    )
+
+
+def test_arrow_schema_keeps_zoned_timestamps_in_utc():
+    schema = create_model("events", at=(datetime, ...), sent=(AwareDatetime, ...))
+
+    assert arrow_schema(schema) == pa.schema(
+        [
+            pa.field("at", pa.timestamp("us"), False),
+            pa.field("sent", pa.timestamp("us", "UTC"), False),
+        ]
+    )
+
+
+def test_naive_timestamps_converts_zoned_values_to_utc():
+    column = pa.array(
+        ["2024-01-01T10:00:00+01:30", "2024-01-01 11:30", "", "2024-01-02"]
+    )
+
+    assert naive_timestamps(column).to_pylist() == [
+        datetime(2024, 1, 1, 8, 30),
+        datetime(2024, 1, 1, 11, 30),
+        None,
+        datetime(2024, 1, 2),
+    ]
+
+
+def test_conform_batch_reorders_casts_and_fills_missing_columns():
+    target = pa.schema([("id", pa.int64()), ("name", pa.string())])
+    batch = rows_to_batch([("2",), ("3",)], pa.schema([("id", pa.string())]))
+
+    conformed = conform_batch(batch, target)
+
+    assert conformed.schema == target
+    assert conformed.to_pylist() == [{"id": 2, "name": None}, {"id": 3, "name": None}]
+
+
+def test_write_jsonl_matches_jsonl_writer():
+    rows = [
+        {"name": 'say "hi" \\ bye', "city": "Zürich/CH"},
+        {"name": "", "city": "line\nbreak"},
+        {"name": "plain", "city": "x"},
+    ]
+    expected = io.BytesIO()
+    with JsonlWriter(expected) as writer:
+        writer.write_many(rows)
+
+    for batch_rows in ([rows[0], rows[2]], rows):
+        stream = io.BytesIO()
+        write_jsonl(stream, [pa.RecordBatch.from_pylist(batch_rows)])
+        assert stream.getvalue().splitlines() == [
+            line
+            for line in expected.getvalue().splitlines()
+            if orjson.loads(line) in batch_rows
+        ]
+
+
+def test_nested_to_json():
+    batch = pa.RecordBatch.from_pylist([{"id": 1, "tags": ["a"], "meta": {"k": 2}}])
+
+    assert nested_to_json(batch).to_pylist() == [
+        {"id": 1, "tags": '["a"]', "meta": '{"k":2}'}
+    ]
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+import typer
+
+from snowpilot_core.checkpoint import Acknowledgements, Checkpoint, Mark, segments
+
+SCOPE = {"connector": "test", "collection": "users"}
+
+
+def test_resume_skips_committed_records(tmp_path):
+    path = tmp_path / "load.checkpoint"
+    checkpoint = Checkpoint.open(path, SCOPE, size=10)
+    checkpoint.commit(4, size=20)
+
+    resumed = Checkpoint.open(path, SCOPE, resume=True)
+
+    assert resumed.offset == 4
+    assert resumed.state == {"size": 20}
+    assert list(resumed.chunks(range(10), 4)) == [(8, [4, 5, 6, 7]), (10, [8, 9])]
+
+
+def test_resume_rejects_other_scope(tmp_path):
+    path = tmp_path / "load.checkpoint"
+    Checkpoint.open(path, SCOPE).commit(3)
+
+    with pytest.raises(typer.BadParameter):
+        Checkpoint.open(path, {**SCOPE, "collection": "events"}, resume=True)
+    assert json.loads(path.read_text())["offset"] == 3
+
+
+def test_marks_count_input_records(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "load.checkpoint", SCOPE, offset=1)
+    odd = lambda chunk: [i for i in chunk if i % 2]  # noqa: E731
+
+    stream = list(checkpoint.marked(range(7), odd, interval=3))
+
+    assert stream == [1, 3, Mark(4), 5, Mark(7)]
+    assert list(segments(stream, 1)) == [
+        ([1], None),
+        ([3], None),
+        ([], Mark(4)),
+        ([5], None),
+        ([], Mark(7)),
+    ]
+
+
+def test_acknowledgements_commit_in_input_order(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "load.checkpoint", SCOPE)
+    acknowledgements = Acknowledgements(checkpoint)
+    tickets = [
+        acknowledgements.register(mark) for mark in (Mark(2), None, Mark(5), Mark(9))
+    ]
+
+    acknowledgements.acknowledge(tickets[2])
+    acknowledgements.acknowledge(tickets[1])
+    assert checkpoint.offset == 0
+
+    acknowledgements.acknowledge(tickets[0])
+    assert checkpoint.offset == 5
+
+    acknowledgements.acknowledge(tickets[3])
+    assert json.loads(checkpoint.path.read_text())["offset"] == 9
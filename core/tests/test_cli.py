@@ -0,0 +1,12 @@
+from snowpilot_core import cli
+
+
+def test_console_writes_plain_text_in_fast_start(monkeypatch, capsys):
+    monkeypatch.setattr(cli, "FAST_START", True)
+
+    cli.err_console.print("[bold yellow]Warning: 2 records skipped[/bold yellow]")
+    cli.console.print('{"fields": ["[a]"]}', markup=False)
+
+    captured = capsys.readouterr()
+    assert captured.err == "Warning: 2 records skipped\n"
+    assert captured.out == '{"fields": ["[a]"]}\n'
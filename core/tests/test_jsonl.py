@@ -0,0 +1,42 @@
+import io
+
+from snowpilot_core.jsonl import JsonlReader, JsonlWriter
+
+
+def test_reader_handles_lines_split_across_blocks():
+    data = b"".join(b'{"id": %d, "name": "user %d"}\n' % (i, i) for i in range(50))
+    reader = JsonlReader(io.BytesIO(data), read_size=7)
+
+    records = list(reader)
+
+    assert [record["id"] for record in records] == list(range(50))
+    assert reader.offset == len(data)
+
+
+def test_reader_skips_invalid_and_blank_lines():
+    data = b'{"id": 1}\nnot json\n\n{"id": 2}'
+    invalid = []
+
+    records = list(JsonlReader(io.BytesIO(data), on_error=invalid.append))
+
+    assert records == [{"id": 1}, {"id": 2}]
+    assert invalid == [b"not json"]
+
+
+def test_reader_batches():
+    data = b"".join(b'{"id": %d}\n' % i for i in range(5))
+
+    batches = list(JsonlReader(io.BytesIO(data)).batches(2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_writer_round_trips_through_reader():
+    records = [{"id": i, "tags": ["a", "b"], "note": None} for i in range(100)]
+    out = io.BytesIO()
+
+    with JsonlWriter(out, chunk_size=64) as writer:
+        writer.write_many(records)
+
+    assert writer.count == 100
+    assert list(JsonlReader(io.BytesIO(out.getvalue()))) == records
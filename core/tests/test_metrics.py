@@ -0,0 +1,123 @@
+import json
+import pstats
+import threading
+import time
+
+import pytest
+
+from snowpilot_core.metrics import Histogram, Metrics, Profiler, instrument, metrics
+
+
+@pytest.fixture
+def registry():
+    registry = Metrics()
+    registry.enabled = True
+    return registry
+
+
+def test_disabled_registry_passes_iterables_through():
+    registry = Metrics()
+    records = iter([1, 2])
+
+    assert registry.timed("decode", records) is records
+    registry.count("rows_in", 2)
+    assert registry.snapshot()["counters"] == {}
+
+
+def test_nested_stages_are_exclusive(registry):
+    def decoded():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    with registry.stage("encode"):
+        time.sleep(0.02)
+        assert list(registry.timed("decode", decoded())) == [0, 1, 2]
+
+    stages = registry.snapshot()["stages"]
+    assert stages["decode"] == pytest.approx(0.03, abs=0.015)
+    assert stages["encode"] == pytest.approx(0.02, abs=0.015)
+
+
+def test_stage_times_add_up_across_threads(registry):
+    def work():
+        with registry.stage("send"):
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.snapshot()["stages"]["send"] == pytest.approx(0.06, abs=0.03)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram([0.01, 0.1, 1.0])
+    for value in [0.005] * 90 + [0.05] * 9 + [5.0]:
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 100
+    assert snapshot["p50"] == 0.01
+    assert snapshot["p99"] == 0.1
+    assert snapshot["max"] == 5.0
+    assert snapshot["buckets"] == {"0.01": 90, "0.1": 9, "inf": 1}
+
+
+def test_instrument_reports_progress_and_profile(tmp_path):
+    metrics_path = tmp_path / "metrics.jsonl"
+    profile_path = tmp_path / "run.prof"
+
+    finish = instrument(str(metrics_path), 0.05, profile_path, "load")
+    try:
+        metrics.count("rows_out", 10)
+        metrics.observe("batch_latency", 0.2)
+        thread = threading.Thread(target=sum, args=(range(1000),))
+        thread.start()
+        thread.join()
+        time.sleep(0.12)
+    finally:
+        finish()
+
+    messages = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert {message["type"] for message in messages[:-1]} == {"progress"}
+    summary = messages[-1]
+    assert summary["type"] == "summary"
+    assert summary["command"] == "load"
+    assert summary["counters"] == {"rows_out": 10}
+    assert summary["histograms"]["batch_latency"]["count"] == 1
+    assert not metrics.enabled
+    # Functions run on other threads are profiled too
+    stats = pstats.Stats(str(profile_path))
+    assert any("builtins.sum" in name for _, _, name in stats.stats)
+
+
+def test_profiler_covers_threads_running_when_stopped(tmp_path):
+    profile_path = tmp_path / "run.prof"
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        sum(range(1000))
+        started.set()
+        release.wait()
+
+    profiler = Profiler()
+    profiler.start()
+    thread = threading.Thread(target=work)
+    thread.start()
+    try:
+        assert started.wait(timeout=5)
+        profiler.stop(profile_path)
+    finally:
+        release.set()
+        thread.join()
+
+    stats = pstats.Stats(str(profile_path))
+    assert any("builtins.sum" in name for _, _, name in stats.stats)
+    # A later profile can start once this one is stopped
+    profiler = Profiler()
+    profiler.start()
+    profiler.stop(profile_path)
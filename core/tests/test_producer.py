@@ -0,0 +1,36 @@
+import threading
+import time
+
+from snowpilot_core.producer import END, Producer
+
+
+def test_producer_returns_items_then_end():
+    with Producer(range(5), queue_size=2) as producer:
+        items = []
+        while (item := producer.get()) is not END:
+            items.append(item)
+
+    assert items == [0, 1, 2, 3, 4]
+
+
+def test_stop_wakes_up_a_waiting_consumer():
+    release = threading.Event()
+
+    def items():
+        release.wait()
+        yield 1
+
+    producer = Producer(items(), queue_size=1)
+    producer.start()
+    got = []
+    consumer = threading.Thread(target=lambda: got.append(producer.get()), daemon=True)
+    consumer.start()
+    stopper = threading.Thread(target=producer.stop)
+    stopper.start()
+    time.sleep(0.05)
+    # Stopped meanwhile, the producer drops the item instead of putting it
+    release.set()
+    stopper.join()
+    consumer.join(timeout=5)
+
+    assert got == [END]
@@ -0,0 +1,157 @@
+import json
+import multiprocessing
+import sys
+import threading
+
+import pytest
+from typer.testing import CliRunner
+
+from snowpilot_core import runner
+
+
+def test_pipeline_keeps_order():
+    loaded = runner.run_pipeline(range(10), list, batch_size=3, queue_size=1)
+
+    assert loaded == list(range(10))
+
+
+def test_pipeline_bounds_extracted_batches():
+    extracted = []
+    release = threading.Event()
+
+    def records():
+        for i in range(100):
+            extracted.append(i)
+            yield i
+
+    def load(stream):
+        first = next(stream)
+        # The producer fills the queue, and holds one more batch, then blocks
+        release.wait(0.5)
+        assert len(extracted) <= 4 * 10
+        return [first, *stream]
+
+    assert runner.run_pipeline(records(), load, batch_size=10, queue_size=2) == list(
+        range(100)
+    )
+
+
+def test_pipeline_raises_extract_errors():
+    def records():
+        yield 1
+        raise ValueError("broken source")
+
+    with pytest.raises(ValueError, match="broken source"):
+        runner.run_pipeline(records(), list, batch_size=1)
+
+
+def test_pipeline_closes_source_when_load_stops():
+    closed = threading.Event()
+
+    def records():
+        try:
+            for i in range(10**6):
+                yield i
+        finally:
+            closed.set()
+
+    assert runner.run_pipeline(records(), next, batch_size=10, queue_size=1) == 0
+    assert closed.is_set()
+
+
+def test_run_csv_to_csv(tmp_path):
+    source_path = tmp_path / "users.csv"
+    source_path.write_text('id,name\n1,Alice\n2,"Bob, Jr."\n3,Cy\n')
+    target_path = tmp_path / "copy.csv"
+    configs = []
+    for name, path in [("source", source_path), ("target", target_path)]:
+        config_path = tmp_path / f"{name}.json"
+        config_path.write_text(json.dumps({"csv_path": str(path), "workers": 1}))
+        configs.append(str(config_path))
+
+    result = CliRunner().invoke(
+        runner.app,
+        ["--source", "csv", "--source-config", configs[0]]
+        + ["--target", "csv", "--target-config", configs[1]]
+        + ["--fields", "name,id", "--batch-size", "2"],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert target_path.read_text() == 'name,id\nAlice,1\n"Bob, Jr.",2\nCy,3\n'
+    # The connector is imported under its alias, leaving `src` free
+    assert "src" not in sys.modules
+
+
+def test_run_reports_metrics(tmp_path):
+    source_path = tmp_path / "users.csv"
+    source_path.write_text("id\n1\n2\n3\n")
+    configs = []
+    for name, path in [("source", source_path), ("target", tmp_path / "copy.csv")]:
+        config_path = tmp_path / f"{name}.json"
+        config_path.write_text(json.dumps({"csv_path": str(path), "workers": 1}))
+        configs.append(str(config_path))
+    metrics_path = tmp_path / "metrics.jsonl"
+
+    result = CliRunner().invoke(
+        runner.app,
+        ["--source", "csv", "--source-config", configs[0]]
+        + ["--target", "csv", "--target-config", configs[1]]
+        + ["--batch-size", "2", "--metrics", str(metrics_path)],
+    )
+
+    assert result.exit_code == 0, result.output
+    (summary,) = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert summary["type"] == "summary"
+    assert summary["command"] == "run"
+    assert summary["counters"]["batches"] == 2
+    assert summary["counters"]["rows_out"] == 3
+    assert {"extract", "write", "queue_wait"} <= set(summary["stages"])
+
+
+def test_run_rejects_unsupported_key(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"csv_path": str(tmp_path / "users.csv")}))
+    (tmp_path / "users.csv").write_text("id\n1\n")
+
+    result = CliRunner().invoke(
+        runner.app,
+        ["--source", "csv", "--source-config", str(config_path)]
+        + ["--target", "csv", "--target-config", str(config_path), "--key", "id"],
+    )
+
+    assert result.exit_code != 0
+
+
+def test_run_with_state_moves_new_rows(tmp_path):
+    source_path = tmp_path / "users.csv"
+    source_path.write_text("id\n1\n2\n")
+    target_path = tmp_path / "copy.csv"
+    configs = []
+    for name, path in [("source", source_path), ("target", target_path)]:
+        config_path = tmp_path / f"{name}.json"
+        config_path.write_text(json.dumps({"csv_path": str(path), "workers": 1}))
+        configs.append(str(config_path))
+    args = ["--source", "csv", "--source-config", configs[0]]
+    args += ["--target", "csv", "--target-config", configs[1]]
+    args += ["--state", str(tmp_path / "state.json")]
+
+    first = CliRunner().invoke(runner.app, args)
+    with open(source_path, "a") as f:
+        f.write("3\n")
+    second = CliRunner().invoke(runner.app, args)
+
+    assert first.exit_code == 0, first.output
+    assert second.exit_code == 0, second.output
+    assert target_path.read_text() == "id\n1\n2\n3\n"
+
+
+@pytest.mark.parametrize("start_method", ["spawn", "forkserver"])
+def test_process_pool_imports_connector_aliases(tmp_path, start_method):
+    main = runner.load_connector("csv")
+    path = tmp_path / "users.csv"
+    path.write_text("id,name\n1,Alice\n")
+    context = multiprocessing.get_context(start_method)
+
+    with runner.process_pool(1, main.__name__, context) as pool:
+        # Pickled by reference to the alias, unknown to a fresh interpreter
+        assert pool.submit(main.read_header, str(path)).result() == ["id", "name"]
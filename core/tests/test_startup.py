@@ -0,0 +1,74 @@
+"""
+Tests for the startup cost of each connector's CLI in fast-start mode.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPOSITORY_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Cumulative time to import `src.main`, as reported by `python -X importtime`
+IMPORT_TIME_BUDGET = 0.15
+# Modules only the commands themselves may import: those of every connector,
+# and the heavier dependencies of each connector
+SHARED_HEAVY_MODULES = ["rich", "pydantic", "jsonc", "orjson"]
+HEAVY_MODULES = {
+    "csv": SHARED_HEAVY_MODULES + ["pyarrow"],
+    "iterable": SHARED_HEAVY_MODULES + ["httpx"],
+    "snowflake": SHARED_HEAVY_MODULES + ["snowflake"],
+}
+
+connectors = pytest.mark.parametrize("connector", sorted(HEAVY_MODULES))
+
+
+def run_python(connector: str, *args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "SNOWPILOT_FAST_START": "1"}
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=REPOSITORY_DIR / connector,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_time(connector: str, module: str) -> float:
+    result = run_python(connector, "-X", "importtime", "-c", f"import {module}")
+    # The module itself is reported last: `import time: self | cumulative | name`
+    last = [line for line in result.stderr.splitlines() if line.endswith(module)][-1]
+    return int(last.split("|")[1]) / 1_000_000
+
+
+@connectors
+def test_fast_start_defers_heavy_imports(connector):
+    """Test that importing the CLI loads none of the heavy dependencies."""
+    result = run_python(
+        connector,
+        "-c",
+        "import sys, src.main; "
+        f"print([m for m in {HEAVY_MODULES[connector]!r} if sys.modules.get(m)])",
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+@connectors
+def test_import_time_budget(connector):
+    """Test that the CLI imports within budget, taking the best of a few runs."""
+    assert (
+        min(import_time(connector, "src.main") for _ in range(3)) < IMPORT_TIME_BUDGET
+    )
+
+
+@connectors
+def test_fast_start_help(connector):
+    """Test that help is rendered without rich."""
+    result = run_python(connector, "-c", "from src.main import app; app()", "--help")
+
+    assert "Usage:" in result.stdout
+    assert "extract" in result.stdout
@@ -0,0 +1,64 @@
+import glob
+import os
+import re
+from typing import Dict, List, NamedTuple
+
+# `orders.part-0001.csv`, `orders_part_2.csv`, `orders-part3.csv`: numbered parts
+# of the `orders` collection
+PART_NAME = re.compile(r"(?P<name>.+?)[._-]part[._-]?(?P<index>\d+)", re.IGNORECASE)
+GLOB_CHARACTERS = re.compile(r"[*?\[]")
+
+
+class CsvCollection(NamedTuple):
+    id: str
+    # The files of the collection, in order; each starts with the same header
+    paths: List[str]
+
+
+def is_glob(csv_path: str) -> bool:
+    return GLOB_CHARACTERS.search(csv_path) is not None
+
+
+def natural_key(path: str) -> List:
+    """Sort `part-2` before `part-10`."""
+    return [int(text) if text.isdigit() else text for text in re.split(r"(\d+)", path)]
+
+
+def collection_id_of(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = PART_NAME.fullmatch(stem)
+    return match.group("name") if match else stem
+
+
+def find_collections(csv_path: str) -> Dict[str, CsvCollection]:
+    """Resolve `csv_path` to the collections it holds.
+
+    `csv_path` is a CSV file, a directory or a glob pattern. Each file is a
+    collection named after it, except that numbered parts (`orders.part-1.csv`,
+    `orders.part-2.csv`) form a single collection, and so do the CSV files of a
+    subdirectory of a directory, which is named after the subdirectory.
+    """
+    if is_glob(csv_path):
+        files = [path for path in glob.glob(csv_path) if os.path.isfile(path)]
+        subdirectories: List[str] = []
+    elif os.path.isdir(csv_path):
+        entries = [os.path.join(csv_path, name) for name in os.listdir(csv_path)]
+        files = [path for path in entries if os.path.isfile(path)]
+        subdirectories = [path for path in entries if os.path.isdir(path)]
+    else:
+        collection_id = collection_id_of(csv_path)
+        return {collection_id: CsvCollection(collection_id, [csv_path])}
+
+    paths: Dict[str, List[str]] = {}
+    for path in files:
+        if path.lower().endswith(".csv"):
+            paths.setdefault(collection_id_of(path), []).append(path)
+    for directory in subdirectories:
+        parts = glob.glob(os.path.join(glob.escape(directory), "*.csv"))
+        if parts:
+            paths.setdefault(os.path.basename(directory), []).extend(parts)
+
+    return {
+        collection_id: CsvCollection(collection_id, sorted(parts, key=natural_key))
+        for collection_id, parts in sorted(paths.items())
+    }
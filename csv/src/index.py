@@ -0,0 +1,386 @@
+"""Keyed upserts and deletes on append-only CSV files.
+
+A sidecar SQLite index (`<file>.csv.idx`) maps each primary key to the byte
+range of its current row. An upsert appends the new row and repoints its key;
+a delete only drops the key. Rows that are no longer current stay in the file,
+their offsets recorded as dead so that `extract` skips them, until `compact`
+rewrites the file without them.
+
+The index remembers the size of the file it covers. Rows appended by plain
+inserts are indexed when it is next opened, a later row superseding an earlier
+one with the same key, so only the new part of the file is ever scanned.
+"""
+
+import csv
+import io
+import os
+import sqlite3
+from collections import deque
+from itertools import islice
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+OPERATIONS = ["insert", "upsert", "delete"]
+KEYED_OPERATIONS = ["upsert", "delete"]
+
+# Keys looked up in the index per query, below the SQLite variable limit
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS rows (
+    key TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead (offset INTEGER PRIMARY KEY);
+"""
+
+
+def index_path(csv_path: str) -> str:
+    return csv_path + ".idx"
+
+
+def key_text(value: Any) -> str:
+    """Format a key the way `csv.writer` writes it."""
+    return "" if value is None else str(value)
+
+
+def scan_records(f: IO[bytes], start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """Yield the offset and raw bytes of each record from `start` on.
+
+    Lines are joined while a quoted field is open, that is while the record
+    holds an odd number of quotes.
+    """
+    f.seek(start)
+    offset = start
+    pending: List[bytes] = []
+    quoted = False
+    for line in f:
+        pending.append(line)
+        quoted ^= line.count(b'"') % 2 == 1
+        if not quoted:
+            record = b"".join(pending)
+            yield offset, record
+            offset += len(record)
+            pending = []
+    if pending:
+        yield offset, b"".join(pending)
+
+
+def parse_records(
+    records: Iterable[Tuple[int, bytes]],
+) -> Iterator[Tuple[int, int, List[str]]]:
+    """Parse raw records into (offset, length, row) tuples."""
+    positions: Deque[Tuple[int, int]] = deque()
+
+    def lines():
+        for offset, record in records:
+            positions.append((offset, len(record)))
+            yield record.decode()
+
+    for row in csv.reader(lines()):
+        offset, length = positions.popleft()
+        yield offset, length, row
+
+
+class KeyIndex:
+    """Index of the current row of each key of a CSV file."""
+
+    def __init__(self, csv_path: str, key: str):
+        self.csv_path = csv_path
+        self.key = key
+        self.db = sqlite3.connect(index_path(csv_path), isolation_level=None)
+        self.db.executescript(SCHEMA)
+        self.header: Optional[List[str]] = None
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> "KeyIndex":
+        self.refresh()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_meta(self, name: str) -> Any:
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,))
+        value = row.fetchone()
+        return value[0] if value else None
+
+    def set_meta(self, **values: Any):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            values.items(),
+        )
+
+    @property
+    def dead_count(self) -> int:
+        return self.db.execute("SELECT count(*) FROM dead").fetchone()[0]
+
+    def dead_offsets(self) -> Set[int]:
+        return {offset for (offset,) in self.db.execute("SELECT offset FROM dead")}
+
+    def refresh(self):
+        """Index the rows appended since the index was last updated.
+
+        The index is rebuilt if the file was replaced or truncated, or if it
+        was built for another key. Deletes recorded in a discarded index are
+        lost, so files are only replaced by `compact`, which writes a new
+        index along with them.
+        """
+        if not os.path.exists(self.csv_path):
+            self.reset(0)
+            return
+
+        stat = os.stat(self.csv_path)
+        indexed_size = self.get_meta("size") or 0
+        if (
+            self.get_meta("key") != self.key
+            or self.get_meta("inode") != stat.st_ino
+            or indexed_size > stat.st_size
+        ):
+            self.reset(stat.st_ino)
+            indexed_size = 0
+
+        with open(self.csv_path, "rb") as f:
+            records = scan_records(f, indexed_size)
+            if indexed_size == 0:
+                header_record = next(records, None)
+                if header_record is None:
+                    return
+                (self.header,) = csv.reader([header_record[1].decode()])
+                self.check_header()
+                self.set_meta(header_size=len(header_record[1]))
+            else:
+                self.header = self.read_header(f)
+            self.index_rows(parse_records(records), stat.st_size)
+
+    def reset(self, inode: int):
+        self.db.execute("BEGIN")
+        self.db.execute("DELETE FROM rows")
+        self.db.execute("DELETE FROM dead")
+        self.db.execute("DELETE FROM meta")
+        self.set_meta(key=self.key, inode=inode, size=0)
+        self.db.execute("COMMIT")
+
+    def read_header(self, f: IO[bytes]) -> List[str]:
+        f.seek(0)
+        (header,) = csv.reader([f.read(self.get_meta("header_size")).decode()])
+        return header
+
+    def check_header(self):
+        if self.key not in self.header:
+            raise ValueError(
+                f"The primary key {self.key} is not a column of {self.csv_path}"
+            )
+
+    def index_rows(self, rows: Iterable[Tuple[int, int, List[str]]], size: int):
+        """Point the keys of rows read from the file at them, in one transaction."""
+        column = self.header.index(self.key)
+        self.db.execute("BEGIN")
+        for offset, length, row in rows:
+            if len(row) <= column:
+                continue
+            self.put(row[column], offset, length)
+        self.set_meta(size=size)
+        self.db.execute("COMMIT")
+
+    def put(self, key: str, offset: int, length: int):
+        self.db.execute(
+            "INSERT INTO dead SELECT offset FROM rows WHERE key = ?", (key,)
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO rows (key, offset, length) VALUES (?, ?, ?)",
+            (key, offset, length),
+        )
+
+    def remove(self, key: str) -> bool:
+        cursor = self.db.execute(
+            "INSERT INTO dead SELECT offset FROM rows WHERE key = ?", (key,)
+        )
+        self.db.execute("DELETE FROM rows WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def lookup(self, keys: List[str]) -> Dict[str, Tuple[int, int]]:
+        found = {}
+        iterator = iter(keys)
+        while batch := list(islice(iterator, LOOKUP_BATCH_SIZE)):
+            placeholders = ",".join("?" * len(batch))
+            for key, offset, length in self.db.execute(
+                f"SELECT key, offset, length FROM rows WHERE key IN ({placeholders})",
+                batch,
+            ):
+                found[key] = (offset, length)
+        return found
+
+    def upsert(self, records: List[Dict[str, Any]]) -> int:
+        """Append the records, replacing the rows with the same keys.
+
+        Columns missing from a record keep the values of the row it replaces.
+        Returns the number of records written.
+        """
+        if not records:
+            return 0
+        new_file = self.header is None
+        if new_file:
+            self.header = list(records[0].keys())
+            self.check_header()
+
+        keys = [key_text(record.get(self.key)) for record in records]
+        existing = self.lookup(keys)
+        with open(self.csv_path, "a+b") as f:
+            # Seek explicitly, the position of a file opened to append is
+            # platform dependent until the first write
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            if offset and not self.ends_with_newline(f, offset):
+                f.write(b"\n")
+                offset += 1
+
+            lines = []
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=self.header)
+            if new_file:
+                writer.writeheader()
+                header_size = len(buffer.getvalue().encode())
+                self.db.execute("BEGIN")
+                self.set_meta(header_size=header_size)
+                self.db.execute("COMMIT")
+                lines.append(buffer.getvalue().encode())
+                offset += header_size
+
+            positions = []
+            # Rows of this batch are not in the file yet: a key repeated
+            # within the batch merges with its earlier record instead
+            written: Dict[str, Dict[str, Any]] = {}
+            for key, record in zip(keys, records):
+                if not self.header_covered(record):
+                    if key in written:
+                        record = {**written[key], **record}
+                    elif key in existing:
+                        record = {**self.read_row(f, *existing[key]), **record}
+                written[key] = record
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(record)
+                line = buffer.getvalue().encode()
+                lines.append(line)
+                positions.append((key, offset, len(line)))
+                offset += len(line)
+
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # The rows are written before the index points at them: if this fails,
+        # the next refresh indexes them from the file instead
+        self.db.execute("BEGIN")
+        for key, row_offset, length in positions:
+            self.put(key, row_offset, length)
+        self.set_meta(size=offset, inode=os.stat(self.csv_path).st_ino)
+        self.db.execute("COMMIT")
+        return len(records)
+
+    def delete(self, records: List[Dict[str, Any]]) -> int:
+        """Drop the rows with the keys of the records, returning how many."""
+        self.db.execute("BEGIN")
+        deleted = sum(self.remove(key_text(record[self.key])) for record in records)
+        self.db.execute("COMMIT")
+        return deleted
+
+    def header_covered(self, record: Dict[str, Any]) -> bool:
+        return all(column in record for column in self.header)
+
+    def read_row(self, f: IO[bytes], offset: int, length: int) -> Dict[str, str]:
+        f.seek(offset)
+        (row,) = csv.reader([f.read(length).decode()])
+        return dict(zip(self.header, row))
+
+    @staticmethod
+    def ends_with_newline(f: IO[bytes], size: int) -> bool:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+    def compact(self) -> int:
+        """Rewrite the file without its dead rows, returning how many were dropped.
+
+        The new file and index are written next to the old ones and moved over
+        them, the file first: an index left behind by a crash in between no
+        longer matches the file, so it is rebuilt from the compacted rows.
+        """
+        dead = self.dead_offsets()
+        if not dead:
+            return 0
+
+        temp_csv = self.csv_path + ".compact"
+        for path in (temp_csv, index_path(temp_csv)):
+            if os.path.exists(path):
+                os.remove(path)
+
+        compacted = KeyIndex(temp_csv, self.key)
+        try:
+            with open(self.csv_path, "rb") as source, open(temp_csv, "wb") as target:
+                records = scan_records(source)
+                header_record = next(records)[1]
+                target.write(header_record)
+                offset = len(header_record)
+
+                def live() -> Iterator[Tuple[int, bytes]]:
+                    # Rows are indexed as they are copied, one at a time
+                    nonlocal offset
+                    for record_offset, record in records:
+                        if record_offset in dead:
+                            continue
+                        target.write(record)
+                        yield offset, record
+                        offset += len(record)
+
+                compacted.header = self.header
+                compacted.reset(os.fstat(target.fileno()).st_ino)
+                compacted.db.execute("BEGIN")
+                compacted.set_meta(header_size=len(header_record))
+                compacted.db.execute("COMMIT")
+                compacted.index_rows(parse_records(live()), 0)
+                # Only known once every row is copied. Until the files are
+                # moved over the old ones, a crash leaves nothing to resume.
+                compacted.set_meta(size=offset)
+                target.flush()
+                os.fsync(target.fileno())
+        finally:
+            compacted.close()
+
+        os.replace(temp_csv, self.csv_path)
+        self.db.close()
+        os.replace(index_path(temp_csv), index_path(self.csv_path))
+        self.db = sqlite3.connect(index_path(self.csv_path), isolation_level=None)
+        return len(dead)
+
+
+def open_index(csv_path: str) -> Optional[KeyIndex]:
+    """Open the existing index of a file with the key it was built for."""
+    if not os.path.exists(index_path(csv_path)):
+        return None
+    with sqlite3.connect(index_path(csv_path)) as db:
+        row = db.execute("SELECT value FROM meta WHERE name = 'key'").fetchone()
+    return KeyIndex(csv_path, row[0]) if row else None
+
+
+def live_rows(
+    csv_path: str,
+    dead: Set[int],
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> Iterator[List[str]]:
+    """Read the rows of a file, skipping dead ones.
+
+    Rows are read from `start` to `end` if given, from the row after the
+    header to the end of the file otherwise.
+    """
+    with open(csv_path, "rb") as f:
+        records = scan_records(f, start or 0)
+        if start is None:
+            next(records, None)
+        for offset, _, row in parse_records(records):
+            if end is not None and offset >= end:
+                return
+            if offset not in dead:
+                yield row
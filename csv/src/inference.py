@@ -0,0 +1,231 @@
+import csv
+import math
+import random
+import re
+from datetime import date, datetime
+from itertools import chain, count, islice, product
+from typing import (
+    Any,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    get_args,
+)
+
+from pydantic import AwareDatetime, BeforeValidator, create_model
+from typing_extensions import Annotated
+
+from src.models import SampleMethod, Schema
+
+# Classifies a value in a single match: it is of the kind of the first
+# alternative it matches, the most specific one
+VALUE_PATTERN = re.compile(
+    r"(?P<bool>(?i:true|false))"
+    r"|(?P<int>[+-]?\d+)"
+    r"|(?P<float>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<date>\d{4}-\d{2}-\d{2})"
+    r"|(?P<datetime>\d{4}-\d{2}-\d{2}[T ](?:[01]\d|2[0-3]):[0-5]\d"
+    r"(?::[0-5]\d(?:\.\d+)?)?(?P<offset>Z|[+-]\d{2}:?\d{2})?)"
+)
+
+# Candidate types, from most to least specific, with the kinds of values each
+# one holds. A column gets the first type that holds every kind it has.
+COLUMN_TYPES: List[Tuple[type, FrozenSet[str]]] = [
+    (bool, frozenset({"bool"})),
+    (int, frozenset({"int"})),
+    (float, frozenset({"int", "float"})),
+    (date, frozenset({"date"})),
+    (datetime, frozenset({"date", "datetime"})),
+]
+
+
+def spellings(word: str) -> List[str]:
+    """Every way of writing `word` in any case, as `VALUE_PATTERN` accepts."""
+    return ["".join(letters) for letters in product(*zip(word.lower(), word.upper()))]
+
+
+def head_sample(rows: Iterable[List[str]], size: int) -> List[List[str]]:
+    """Take the first `size` rows."""
+    return list(islice(rows, size))
+
+
+def reservoir_sample(
+    rows: Iterable[List[str]], size: int, rng: Optional[random.Random] = None
+) -> List[List[str]]:
+    """Take a uniform sample of `size` rows across the whole input.
+
+    Uses Algorithm L, which computes how many rows to skip between replacements
+    instead of drawing a random number for every row.
+    """
+    rng = rng or random.Random()
+    iterator = iter(rows)
+    reservoir = list(islice(iterator, size))
+    if len(reservoir) < size:
+        return reservoir
+
+    weight = math.exp(math.log(rng.random()) / size)
+    while True:
+        skip = math.floor(math.log(rng.random()) / math.log(1 - weight))
+        row = next(islice(iterator, skip, skip + 1), None)
+        if row is None:
+            return reservoir
+        reservoir[rng.randrange(size)] = row
+        weight *= math.exp(math.log(rng.random()) / size)
+
+
+def infer_column_type(values: Sequence[str]) -> Tuple[type, bool]:
+    """Infer the narrowest type of a column and whether it contains empty values."""
+    present = [value for value in values if value != ""]
+    nullable = len(present) < len(values)
+    if not present:
+        return str, nullable
+
+    kinds = set()
+    zoned = True
+    for value in present:
+        match = VALUE_PATTERN.fullmatch(value)
+        if match is None:
+            return str, nullable
+        kind = match.lastgroup
+        if kind in ("date", "datetime"):
+            try:
+                date.fromisoformat(value[:10])
+            except ValueError:
+                # Shaped like a date, but not one, such as 2024-13-45
+                return str, nullable
+        kinds.add(kind)
+        zoned = zoned and match["offset"] is not None
+
+    for candidate, holds in COLUMN_TYPES:
+        if kinds <= holds:
+            if candidate is datetime and zoned:
+                # Zoned timestamps are told apart from naive ones in Arrow
+                return AwareDatetime, nullable
+            return candidate, nullable
+    return str, nullable
+
+
+def infer_types(headers: List[str], rows: List[List[str]]) -> Iterator[Tuple[str, Any]]:
+    """Yield a (name, field definition) pair per column of the sampled rows."""
+    # Transpose once so each column is checked as a whole
+    columns = list(zip(*rows)) if rows else [() for _ in headers]
+    for header, values in zip(headers, columns):
+        if not values:
+            yield header, (str, ...)
+            continue
+        column_type, nullable = infer_column_type(values)
+        if nullable:
+            yield header, (Optional[column_type], None)
+        else:
+            yield header, (column_type, ...)
+
+
+class FileSample(NamedTuple):
+    headers: List[str]
+    rows: List[List[str]]
+    # Rows in the whole file, or the rows read if sampling stopped early
+    total: int
+
+
+def sample_file(
+    csv_path: str,
+    sample_size: int = 1000,
+    sample_method: SampleMethod = SampleMethod.head,
+) -> FileSample:
+    """Read the header of a CSV file and sample its rows."""
+    with open(csv_path, "r", newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        headers = next(reader, [])
+        # Ignore ragged rows rather than shifting values between columns
+        rows = (row for row in reader if len(row) == len(headers))
+        if sample_method == SampleMethod.reservoir:
+            counter = count()
+            counted = (row for row, _ in zip(rows, counter))
+            sample = reservoir_sample(counted, sample_size)
+            return FileSample(headers, sample, next(counter))
+        sample = head_sample(rows, sample_size)
+        return FileSample(headers, sample, len(sample))
+
+
+def merge_samples(
+    samples: Sequence[FileSample],
+    sample_size: int = 1000,
+    sample_method: SampleMethod = SampleMethod.head,
+    rng: Optional[random.Random] = None,
+) -> List[List[str]]:
+    """Combine the samples of the parts of a collection into one sample.
+
+    Head samples are concatenated in order. Reservoir samples contribute rows in
+    proportion to the size of their part, so the result stays uniform across
+    the whole collection.
+    """
+    if sample_method == SampleMethod.head:
+        return head_sample(chain.from_iterable(s.rows for s in samples), sample_size)
+
+    rng = rng or random.Random()
+    total = sum(s.total for s in samples)
+    if total <= sample_size:
+        return [row for s in samples for row in s.rows]
+    merged = []
+    for s in samples:
+        share = min(len(s.rows), round(sample_size * s.total / total))
+        merged.extend(rng.sample(s.rows, share))
+    return merged
+
+
+def infer_collection_schema(
+    collection_id: str,
+    samples: Sequence[FileSample],
+    sample_size: int = 1000,
+    sample_method: SampleMethod = SampleMethod.head,
+) -> Schema:
+    """Infer the schema of a collection from the samples of its files."""
+    headers = samples[0].headers if samples else []
+    for s in samples[1:]:
+        if s.headers != headers:
+            raise ValueError(
+                f"Files of collection {collection_id} have different headers"
+            )
+    rows = merge_samples(samples, sample_size, sample_method)
+    return create_model(f"{collection_id}_schema", **dict(infer_types(headers, rows)))
+
+
+def infer_schema(
+    csv_path: str,
+    collection_id: str,
+    sample_size: int = 1000,
+    sample_method: SampleMethod = SampleMethod.head,
+) -> Schema:
+    """Infer the schema of the CSV file from a sample of its rows."""
+    sample = sample_file(csv_path, sample_size, sample_method)
+    return infer_collection_schema(collection_id, [sample], sample_size, sample_method)
+
+
+def empty_as_none(value: Any) -> Any:
+    return None if value == "" else value
+
+
+def load_schema(schema: Schema, partial_key: Optional[str] = None) -> Schema:
+    """Derive the schema records loaded into a collection are validated against.
+
+    Empty cells are extracted as `""`, so nullable columns accept it as null.
+    With a `partial_key`, as for upserts, records only need that column: the
+    others are taken from the row they replace.
+    """
+    fields = {}
+    for name, field in schema.model_fields.items():
+        annotation = field.annotation
+        if type(None) in get_args(annotation):
+            fields[name] = (Annotated[annotation, BeforeValidator(empty_as_none)], None)
+        elif partial_key is not None and name != partial_key:
+            # Defaults are not validated: the column may be left out, but a
+            # value given for it must still fit
+            fields[name] = (annotation, None)
+        else:
+            fields[name] = (annotation, ...)
+    return create_model(schema.__name__, **fields)
@@ -1,132 +1,977 @@
 import csv
-import json
 import os
 import sys
-from typing import Dict, Optional
+from contextlib import ExitStack
+from enum import Enum
+from itertools import chain
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
-import jsonc
 import typer
-from pydantic import ValidationError, create_model
-from rich import print
-from rich.console import Console
+from snowpilot_core.cli import (
+    DataFormat,
+    config_callback,
+    console,
+    err_console,
+    parse_fields,
+    warn_invalid_line,
+)
 from typing_extensions import Annotated
 
-from src.models import (
-    CollectionMetadata,
-    Config,
-    Discovery,
-    Schema,
-)
+if TYPE_CHECKING:
+    from snowpilot_core.checkpoint import Mark
+    from snowpilot_core.state import ExtractState
+
+    from src.files import CsvCollection
+    from src.inference import FileSample
+    from src.models import Config, Schema
+    from src.parallel import ParseTask
+
+# Modules that import pydantic, orjson or pyarrow are imported by the commands
+# using them, so that starting the CLI stays cheap.
 
-err_console = Console(stderr=True)
 app = typer.Typer()
-state: Dict[str, Optional[Config]] = {"config": None}
+state: Dict[str, Optional["Config"]] = {"config": None}
 
+# Number of records buffered in memory before they are written to the target.
+DEFAULT_BATCH_SIZE = 10_000
+
+# Bytes of CSV or JSONL parsed into one batch by the columnar engine; larger
+# batches amortize the per-batch overhead of the vectorized serialization
+COLUMNAR_BLOCK_SIZE = 16 << 20
 
-def infer_schema(csv_path: str, collection_id: str) -> Schema:
-    """Infer the schema of the CSV file."""
-    with open(csv_path, "r") as csvfile:
-        headers = next(csv.reader(csvfile))
-        schema = create_model(
-            f"{collection_id}_schema",
-            **{header: (str, ...) for header in headers},
-        )
 
-    return schema
+class Engine(str, Enum):
+    """How JSONL records are converted from and to CSV rows."""
+
+    # A dict per row, with the csv module
+    python = "python"
+    # Whole blocks of rows at a time with pyarrow, requires pyarrow
+    columnar = "columnar"
 
 
 # OPEN Q: Should we have a `meta` command to get the schema of the config file?
 
 
-@app.callback()
-def config(
-    config_file: Annotated[
-        typer.FileText,
-        typer.Option("--config", "-f", help="Path to the configuration file"),
-    ],
-):
-    """Provide the path to the configuration file."""
-    raw_config = jsonc.load(config_file)
-    try:
-        validated_config = Config.model_validate(raw_config)
-        state["config"] = validated_config
-    except ValidationError as e:
-        err_console.print("[bold red]Error in configuration file:[/bold red]")
-        err_console.print(e)
-        raise typer.Exit(code=1)
+def config_model():
+    from src.models import Config
+
+    return Config
+
+
+app.callback()(config_callback(config_model, state))
+
+
+def sample_files(config: "Config", paths: List[str]) -> List["FileSample"]:
+    """Sample each file, on several processes when there are several files."""
+    from functools import partial
+
+    from src import inference
+    from src.parallel import default_workers
+
+    sample = partial(
+        inference.sample_file,
+        sample_size=config.sample_size,
+        sample_method=config.sample_method,
+    )
+    workers = min(config.workers or default_workers(), len(paths))
+    if workers <= 1:
+        return [sample(path) for path in paths]
+
+    from snowpilot_core.runner import process_pool
+
+    with process_pool(workers, __name__) as executor:
+        return list(executor.map(sample, paths))
+
+
+def discover_schemas(config: "Config", use_cache: bool = True) -> Dict[str, "Schema"]:
+    """Infer the schema of each collection, reusing cached schemas if possible."""
+    from snowpilot_core.cache import (
+        SchemaCache,
+        cache_key,
+        default_cache_dir,
+        file_fingerprint,
+    )
+
+    from src import inference
+    from src.files import find_collections
+
+    collections = find_collections(config.csv_path)
+    paths = [path for collection in collections.values() for path in collection.paths]
+
+    # The key changes whenever the config or any of the files changes
+    cache = SchemaCache(default_cache_dir() / "csv")
+    key = cache_key(config, {path: file_fingerprint(path) for path in paths})
+    schemas = cache.get(key) if use_cache else None
+    if schemas is None:
+        samples = dict(zip(paths, sample_files(config, paths)))
+        try:
+            schemas = {
+                collection.id: inference.infer_collection_schema(
+                    collection.id,
+                    [samples[path] for path in collection.paths],
+                    config.sample_size,
+                    config.sample_method,
+                )
+                for collection in collections.values()
+            }
+        except ValueError as e:
+            err_console.print(f"[bold red]Error: {e}[/bold red]")
+            raise typer.Exit(code=1)
+        cache.set(key, schemas)
+    return schemas
+
+
+def resolve_collection(
+    config: "Config", collection_id: Optional[str]
+) -> "CsvCollection":
+    """Find an existing collection, which may be omitted if it is the only one."""
+    from src.files import find_collections
+
+    collections = find_collections(config.csv_path)
+    if collection_id is None:
+        if len(collections) == 1:
+            return next(iter(collections.values()))
+        raise typer.BadParameter(
+            f"--collection is required, choose one of: {', '.join(collections)}"
+        )
+    if collection_id not in collections:
+        raise typer.BadParameter(
+            f"Unknown collection {collection_id}, "
+            f"choose one of: {', '.join(collections)}"
+        )
+    return collections[collection_id]
 
 
 @app.command()
-def discover():
+def discover(
+    use_cache: Annotated[
+        bool,
+        typer.Option("--cache/--no-cache", help="Reuse schemas from earlier runs"),
+    ] = True,
+):
     """Discover available collections and their schemas."""
-    csv_path = state["config"].csv_path
-    filename = os.path.basename(csv_path)[:-4]
-    schema = infer_schema(csv_path, filename)
-    discovery = Discovery(
+    from src.models import Catalog, CollectionMetadata
+
+    schemas = discover_schemas(state["config"], use_cache)
+    catalog = Catalog(
         collections=[
-            CollectionMetadata(id=filename, label=filename, row=schema, insert=schema)
+            CollectionMetadata(
+                id=collection_id, label=collection_id, row=schema, insert=schema
+            )
+            for collection_id, schema in schemas.items()
         ]
     )
-    print(discovery.model_dump_json(indent=2))
+    console.print(catalog.model_dump_json(indent=2), markup=False)
+
+
+def check_fields(headers: List[str], fields: Optional[List[str]]):
+    missing = [field for field in fields or [] if field not in headers]
+    if missing:
+        raise typer.BadParameter(f"Unknown fields: {', '.join(missing)}")
+
+
+def dead_rows(csv_path: str) -> FrozenSet[int]:
+    """Offsets of the rows of a file replaced or deleted by keyed loads."""
+    from src.index import open_index
+
+    index = open_index(csv_path)
+    if index is None:
+        return frozenset()
+    try:
+        with index:
+            return frozenset(index.dead_offsets())
+    except ValueError as e:
+        err_console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+
+def require_compacted(collection: "CsvCollection"):
+    # pyarrow parses whole blocks, so rows cannot be skipped by offset
+    if any(dead_rows(path) for path in collection.paths):
+        err_console.print(
+            "[bold red]Error: The collection has replaced or deleted rows, "
+            "run `compact` before reading it with pyarrow[/bold red]"
+        )
+        raise typer.Exit(code=1)
+
+
+def extract_columnar(collection: "CsvCollection", fields: Optional[List[str]]):
+    """Stream the collection as JSONL, converting blocks of rows at a time.
+
+    Values are read as strings, like the python engine, and each block is
+    serialized by `snowpilot_core.arrow.write_jsonl` without a dict per row.
+    """
+    import pyarrow
+    import pyarrow.csv
+
+    from snowpilot_core import arrow
+
+    require_compacted(collection)
+    headers = {path: read_header(path) for path in collection.paths}
+    for header in headers.values():
+        check_fields(header or [], fields)
+
+    def batches():
+        for path, header in headers.items():
+            if header is None:
+                continue
+            convert_options = pyarrow.csv.ConvertOptions(
+                column_types={name: pyarrow.string() for name in header},
+                include_columns=fields or header,
+                strings_can_be_null=False,
+            )
+            yield from pyarrow.csv.open_csv(
+                path,
+                read_options=pyarrow.csv.ReadOptions(block_size=COLUMNAR_BLOCK_SIZE),
+                convert_options=convert_options,
+            )
+
+    try:
+        arrow.write_jsonl(sys.stdout.buffer, batches())
+    except pyarrow.ArrowInvalid as e:
+        # e.g. ragged rows, which the python engine tolerates
+        err_console.print(
+            f"[bold red]Error: Could not parse the collection: {e}[/bold red]"
+        )
+        raise typer.Exit(code=1)
+
+
+def extract_arrow(
+    config: "Config", collection: "CsvCollection", fields: Optional[List[str]]
+):
+    """Stream the collection as Arrow record batches typed by the discovered schema.
+
+    Rows are parsed and converted column by column by the pyarrow CSV reader,
+    so no record is ever materialized as a Python object.
+    """
+    import pyarrow
+    import pyarrow.csv
+
+    from snowpilot_core import arrow
+
+    from src.inference import spellings
+
+    require_compacted(collection)
+    schema = discover_schemas(config)[collection.id]
+    check_fields(list(schema.model_fields), fields)
+    target = arrow.arrow_schema(schema, fields)
+    # Naive timestamp columns may hold zoned values too: they are read as
+    # strings and parsed by `naive_timestamps`
+    naive = {field.name for field in target if field.type == pyarrow.timestamp("us")}
+    convert_options = pyarrow.csv.ConvertOptions(
+        column_types={
+            field.name: pyarrow.string() if field.name in naive else field.type
+            for field in target
+        },
+        include_columns=target.names,
+        # Booleans are inferred in any case
+        true_values=spellings("true"),
+        false_values=spellings("false"),
+    )
+
+    def parse(batch: pyarrow.RecordBatch) -> pyarrow.RecordBatch:
+        arrays = [
+            arrow.naive_timestamps(column) if name in naive else column
+            for name, column in zip(batch.schema.names, batch.columns)
+        ]
+        return pyarrow.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+    def batches():
+        for path in collection.paths:
+            for batch in pyarrow.csv.open_csv(path, convert_options=convert_options):
+                yield arrow.conform_batch(parse(batch), target)
+
+    try:
+        arrow.write_stream(sys.stdout.buffer, target, batches())
+    except pyarrow.ArrowInvalid as e:
+        # The schema is inferred from a sample, later rows may not match it
+        err_console.print(
+            f"[bold red]Error: Data does not match the discovered schema: {e}[/bold red]"
+        )
+        raise typer.Exit(code=1)
 
 
 @app.command()
-def extract():
+def extract(
+    collection_id: Annotated[
+        Optional[str],
+        typer.Option(
+            "--collection",
+            "-c",
+            help="Collection to extract, required if there are several",
+        ),
+    ] = None,
+    fields: Annotated[
+        Optional[str],
+        typer.Option("--fields", help="Comma-separated list of fields to extract"),
+    ] = None,
+    data_format: Annotated[
+        DataFormat, typer.Option("--format", help="Format of the extracted records")
+    ] = DataFormat.jsonl,
+    engine: Annotated[
+        Engine, typer.Option("--engine", help="How JSONL records are built")
+    ] = Engine.python,
+    state_file: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--state",
+            help="File with the offset of each file to extract from, updated after",
+        ),
+    ] = None,
+):
     """Extract data from the specified collection."""
-    csv_path = state["config"].csv_path
-    with open(csv_path, "r") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            print(row)
+    config = state["config"]
+    collection = resolve_collection(config, collection_id)
+    if state_file and (data_format == DataFormat.arrow or engine == Engine.columnar):
+        raise typer.BadParameter(
+            "--state is not supported with arrow output or the columnar engine"
+        )
+    if data_format == DataFormat.arrow:
+        extract_arrow(config, collection, parse_fields(fields))
+        return
+    if engine == Engine.columnar:
+        extract_columnar(collection, parse_fields(fields))
+        return
+
+    from snowpilot_core.state import ExtractState
+
+    from src.parallel import default_workers, extract_parallel, split_file
+
+    fields = parse_fields(fields)
+    extract_state = ExtractState.read(state_file) if state_file else None
+    tasks, advance = plan_extract(collection, fields, extract_state)
+    workers = config.workers or default_workers()
+    if workers > 1:
+        # Large files are split into ranges of whole records, and every range
+        # is parsed concurrently; the records are still written out in order.
+        # Files with dead rows are read whole, tracking the offset of each row.
+        tasks = [
+            chunk
+            for task in tasks
+            for chunk in (
+                [task]
+                if task.dead
+                else split_file(
+                    task.path, task.headers, config.chunk_size, task.start, task.end
+                )
+            )
+        ]
+
+    if workers > 1 and len(tasks) > 1:
+        extract_parallel(tasks, fields, sys.stdout.buffer, min(workers, len(tasks)))
+    else:
+        from snowpilot_core.jsonl import JsonlWriter
+        from snowpilot_core.metrics import metrics
+
+        with JsonlWriter(sys.stdout.buffer) as writer:
+            writer.write_many(metrics.timed("parse", read_tasks(tasks, fields)))
+
+    advance()
+    if extract_state is not None:
+        extract_state.save()
+
+
+def parse_tasks(
+    collection: "CsvCollection", fields: Optional[List[str]]
+) -> List["ParseTask"]:
+    """Read the header of each file of a collection, checking the fields."""
+    from src.parallel import ParseTask
+
+    tasks = [
+        ParseTask(path, read_header(path) or [], dead=dead_rows(path))
+        for path in collection.paths
+    ]
+    for task in tasks:
+        check_fields(task.headers, fields)
+    return tasks
+
+
+def plan_extract(
+    collection: "CsvCollection",
+    fields: Optional[List[str]],
+    state: Optional["ExtractState"] = None,
+) -> Tuple[List["ParseTask"], Callable[[], None]]:
+    """Return the tasks reading a collection, and the function to call once
+    they are read, which advances the cursor of `state`."""
+    tasks = parse_tasks(collection, fields)
+    if state is None:
+        return tasks, lambda: None
+
+    tasks, cursor = incremental_tasks(tasks, state.cursor(collection.id))
+    return tasks, lambda: state.advance(collection.id, cursor)
+
+
+def incremental_tasks(
+    tasks: List["ParseTask"], cursor: Optional[Dict[str, Any]]
+) -> Tuple[List["ParseTask"], Dict[str, Any]]:
+    """Restrict tasks to the rows after the cursor, returning the next cursor.
+
+    The cursor holds the offset after the last row read from each file. A
+    file replaced since, by `compact` for instance, is read again in full.
+    Rows still being written at the end of a file are left for the next run.
+    """
+    from src.parallel import complete_range
+
+    saved = (cursor or {}).get("files", {})
+    files = {}
+    incremental = []
+    for task in tasks:
+        path = os.path.abspath(task.path)
+        stat = os.stat(task.path)
+        offset = None
+        if path in saved and saved[path]["inode"] == stat.st_ino:
+            offset = saved[path]["offset"]
+            if offset > stat.st_size:
+                offset = None
+        start, end = complete_range(task.path, offset)
+        if start < end:
+            incremental.append(task._replace(start=start, end=end))
+        # Until a row is read, the rows still start after the header
+        if offset is not None or start < end:
+            files[path] = {"inode": stat.st_ino, "offset": end}
+    return incremental, {"files": files}
+
+
+def read_tasks(
+    tasks: List["ParseTask"], fields: Optional[List[str]]
+) -> Iterator[Dict[str, str]]:
+    from src.parallel import read_records
+
+    for task in tasks:
+        yield from read_records(task, fields)
+
+
+def extract_records(
+    config: "Config",
+    collection_id: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    state: Optional["ExtractState"] = None,
+) -> Iterator[Dict[str, str]]:
+    """Read the records of a collection, for running the connector in-process.
+
+    Arguments are checked before this returns, the files are read lazily.
+    With a `state`, only the rows after its cursor are read, and the cursor is
+    advanced once they all are; saving it is up to the caller.
+    """
+    tasks, advance = plan_extract(
+        resolve_collection(config, collection_id), fields, state
+    )
+
+    def records() -> Iterator[Dict[str, str]]:
+        yield from read_tasks(tasks, fields)
+        advance()
+
+    return records()
+
+
+def read_header(csv_path: str) -> Optional[List[str]]:
+    """Return the header row of an existing CSV file, or None if it is empty."""
+    if not os.path.exists(csv_path):
+        return None
+    with open(csv_path, "r", newline="") as csvfile:
+        return next(csv.reader(csvfile), None)
+
+
+def ends_with_newline(csv_path: str) -> bool:
+    """Check the last byte of the file with a single seek from the end."""
+    with open(csv_path, "rb") as csvfile:
+        csvfile.seek(-1, os.SEEK_END)
+        return csvfile.read(1) == b"\n"
+
+
+def write_records(
+    csv_path: str,
+    records: Iterable[Any],
+    batch_size: int,
+    on_commit: Optional[Callable[["Mark"], None]] = None,
+) -> int:
+    """Append records to the CSV file in bounded batches.
+
+    Memory use is proportional to `batch_size`, regardless of the size of the
+    input or of the existing file. Checkpoint marks among the records are
+    passed to `on_commit` once the rows before them are synced to disk.
+    Returns the number of records written.
+    """
+    from snowpilot_core.checkpoint import Mark, segments
+    from snowpilot_core.metrics import metrics
+
+    records = iter(records)
+    first = next(records, None)
+    # Marks before any record have nothing to write
+    while isinstance(first, Mark):
+        on_commit(first)
+        first = next(records, None)
+    if first is None:
+        return 0
+
+    header = read_header(csv_path)
+    fieldnames = header or list(first.keys())
+    count = 0
+    size = file_size(csv_path)
+    with open(csv_path, "a", newline="") as csvfile:
+        if header is not None and not ends_with_newline(csv_path):
+            csvfile.write("\n")
+
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        # Write header if file is empty
+        if header is None:
+            writer.writeheader()
+
+        for batch, mark in segments(chain([first], records), batch_size):
+            with metrics.stage("write"):
+                writer.writerows(batch)
+            count += len(batch)
+            metrics.count("rows_out", len(batch))
+            if mark is not None:
+                with metrics.stage("sync"):
+                    csvfile.flush()
+                    os.fsync(csvfile.fileno())
+                on_commit(mark)
+
+    metrics.count("bytes_out", file_size(csv_path) - size)
+    return count
+
+
+def write_batches(
+    csv_path: str, reader: Iterable, target_schema: Optional[Any] = None
+) -> int:
+    """Append Arrow record batches to the CSV file.
+
+    Columns follow the header of an existing file, or the stream schema for a
+    new one. With `target_schema` each batch is also cast to it, which raises
+    `pyarrow.ArrowInvalid` for values that do not fit. Returns the number of
+    rows written.
+    """
+    import pyarrow
+    import pyarrow.csv
+
+    from snowpilot_core import arrow
+    from snowpilot_core.metrics import metrics
+
+    header = read_header(csv_path)
+    schema = reader.schema
+    if target_schema is None:
+        fields = {field.name: field for field in schema}
+        target_schema = pyarrow.schema(
+            [
+                fields.get(name, pyarrow.field(name, pyarrow.string()))
+                for name in header or schema.names
+            ]
+        )
+
+    count = 0
+    writer = None
+    with open(csv_path, "ab") as csvfile:
+        for batch in reader:
+            if not batch.num_rows:
+                continue
+            if writer is None:
+                if header is not None and not ends_with_newline(csv_path):
+                    csvfile.write(b"\n")
+                writer = pyarrow.csv.CSVWriter(
+                    csvfile,
+                    target_schema,
+                    write_options=pyarrow.csv.WriteOptions(
+                        include_header=header is None
+                    ),
+                )
+            with metrics.stage("write"):
+                writer.write_batch(arrow.conform_batch(batch, target_schema))
+            count += batch.num_rows
+            metrics.count("rows_out", batch.num_rows)
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def load_target(config: "Config", collection_id: Optional[str]) -> Tuple[str, str]:
+    """Find the collection to load into and the file to append to.
+
+    Records are appended to the last file of an existing collection. In a
+    directory, a new collection is created as `<collection>.csv`.
+    """
+    if collection_id is not None and os.path.isdir(config.csv_path):
+        from src.files import find_collections
+
+        if collection_id not in find_collections(config.csv_path):
+            return collection_id, os.path.join(config.csv_path, f"{collection_id}.csv")
+    collection = resolve_collection(config, collection_id)
+    return collection.id, collection.paths[-1]
+
+
+def check_keyed_load(
+    config: "Config", collection_id: str, operation: str, columnar: bool
+):
+    from src.files import find_collections
+
+    if not config.primary_key:
+        raise typer.BadParameter(
+            f"The {operation} operation requires primary_key in the configuration"
+        )
+    if columnar:
+        raise typer.BadParameter(
+            f"The {operation} operation requires jsonl input and the python engine"
+        )
+    collection = find_collections(config.csv_path).get(collection_id)
+    if collection is not None and len(collection.paths) > 1:
+        raise typer.BadParameter(
+            f"The {operation} operation requires a collection stored in one file"
+        )
+
+
+def write_keyed(
+    csv_path: str,
+    key: str,
+    operation: str,
+    records: Iterable[Any],
+    batch_size: int,
+    on_commit: Optional[Callable[["Mark"], None]] = None,
+) -> int:
+    """Upsert or delete records by key through the sidecar index of the file.
+
+    Each batch costs about its own size, whatever the size of the file.
+    Checkpoint marks are passed to `on_commit` as for `write_records`.
+    Returns the number of records written or deleted.
+    """
+    from snowpilot_core.checkpoint import Mark, segments
+    from snowpilot_core.metrics import metrics
+
+    from src.index import KeyIndex
+
+    missing_key = 0
+
+    def keyed(records: Iterable[Any]) -> Iterator[Any]:
+        nonlocal missing_key
+        for record in records:
+            if isinstance(record, Mark):
+                yield record
+            elif record.get(key) is None:
+                missing_key += 1
+            else:
+                yield record
+
+    count = 0
+    try:
+        with KeyIndex(csv_path, key) as index:
+            apply = index.delete if operation == "delete" else index.upsert
+            for batch, mark in segments(keyed(records), batch_size):
+                with metrics.stage("write"):
+                    written = apply(batch)
+                count += written
+                metrics.count("rows_out", written)
+                # Upserts are synced, and deletes committed, by `apply`
+                if mark is not None:
+                    on_commit(mark)
+    except ValueError as e:
+        err_console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+    if missing_key:
+        err_console.print(
+            f"[bold yellow]Warning: Skipped {missing_key} records without {key}[/bold yellow]"
+        )
+    return count
+
+
+def load_arrow(
+    config: "Config",
+    collection_id: str,
+    csv_path: str,
+    validate: bool,
+    data_format: DataFormat,
+) -> int:
+    """Append record batches read from stdin, an Arrow stream or JSONL."""
+    import pyarrow
+    import pyarrow.json
+
+    from snowpilot_core import arrow
+
+    target_schema = None
+    header = read_header(csv_path)
+    # A new file has no schema yet, so there is nothing to validate against
+    if validate and header is not None:
+        schema = discover_schemas(config)[collection_id]
+        target_schema = arrow.arrow_schema(schema, header)
+    try:
+        if data_format == DataFormat.arrow:
+            reader = arrow.read_stream(sys.stdin.buffer)
+        else:
+            read_options = pyarrow.json.ReadOptions(block_size=COLUMNAR_BLOCK_SIZE)
+            reader = arrow.NestedAsJson(
+                pyarrow.json.open_json(sys.stdin.buffer, read_options=read_options)
+            )
+        return write_batches(csv_path, reader, target_schema)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError) as e:
+        err_console.print(
+            f"[bold red]Error: Could not load {data_format.value} input into {csv_path}: {e}[/bold red]"
+        )
+        raise typer.Exit(code=1)
+
+
+def file_size(csv_path: str) -> int:
+    return os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+
+
+def discard_uncommitted(csv_path: str, committed_size: int):
+    """Truncate rows appended after the last checkpoint of an insert.
+
+    They are written again when the load resumes, so each row is only
+    appended once.
+    """
+    size = file_size(csv_path)
+    if size < committed_size:
+        err_console.print(
+            f"[bold red]Error: {csv_path} is smaller than when it was checkpointed[/bold red]"
+        )
+        raise typer.Exit(code=1)
+    if size > committed_size:
+        err_console.print(
+            f"[bold yellow]Warning: Discarding {size - committed_size} bytes written to {csv_path} after the last checkpoint[/bold yellow]"
+        )
+        os.truncate(csv_path, committed_size)
+
+
+def load_records(
+    config: "Config",
+    records: Iterable[Dict[str, Any]],
+    collection_id: Optional[str] = None,
+    operation: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    validate: bool = True,
+    dead_letter: Optional[Path] = None,
+    checkpoint: Optional[Path] = None,
+    resume: bool = False,
+) -> int:
+    """Write records to a collection, returning how many were written or deleted.
+
+    `operation` defaults to insert. With a `checkpoint` file, the input offset
+    of each batch synced to disk is committed to it, and `resume` skips the
+    records before it. Used by `load`, and to run the connector in-process.
+    """
+    from snowpilot_core.checkpoint import open_checkpoint
+    from snowpilot_core.validation import RecordValidator
+
+    from src.index import KEYED_OPERATIONS, OPERATIONS, index_path
+
+    operation = operation or "insert"
+    if operation not in OPERATIONS:
+        raise typer.BadParameter(f"Unsupported operation, use one of {OPERATIONS}")
+    collection_id, csv_path = load_target(config, collection_id)
+    if operation in KEYED_OPERATIONS:
+        check_keyed_load(config, collection_id, operation, columnar=False)
+
+    progress = open_checkpoint(
+        checkpoint,
+        {"connector": "csv", "collection": collection_id, "operation": operation},
+        resume,
+        size=file_size(csv_path),
+    )
+    on_commit = None
+    if progress is not None:
+        # Rows appended again to an indexed file supersede their copies instead
+        if (
+            resume
+            and operation == "insert"
+            and not os.path.exists(index_path(csv_path))
+        ):
+            discard_uncommitted(csv_path, progress.state["size"])
+
+        def on_commit(mark: "Mark"):
+            progress.commit(mark.offset, size=file_size(csv_path))
+
+    with ExitStack() as stack:
+        validator = None
+        # A new file has no schema yet, so there is nothing to validate against,
+        # and deletes only need the key of each record
+        if validate and operation != "delete" and read_header(csv_path) is not None:
+            from src.inference import load_schema
+
+            schema = load_schema(
+                discover_schemas(config)[collection_id],
+                config.primary_key if operation == "upsert" else None,
+            )
+            dead_letter_file = (
+                stack.enter_context(open(dead_letter, "ab")) if dead_letter else None
+            )
+            validator = RecordValidator(schema, dead_letter_file)
+
+        if progress is not None:
+            records = progress.marked(
+                records, validator.validate if validator else None, batch_size
+            )
+        elif validator is not None:
+            records = validator.filter(records)
+
+        if operation in KEYED_OPERATIONS:
+            count = write_keyed(
+                csv_path, config.primary_key, operation, records, batch_size, on_commit
+            )
+        else:
+            count = write_records(csv_path, records, batch_size, on_commit)
+
+    if validator is not None and validator.invalid_count:
+        err_console.print(
+            f"[bold yellow]Warning: Skipped {validator.invalid_count} invalid records[/bold yellow]"
+        )
+    return count
 
 
 @app.command()
-def load():
+def load(
+    collection_id: Annotated[
+        Optional[str],
+        typer.Option(
+            "--collection",
+            "-c",
+            help="Collection to load into, required if there are several",
+        ),
+    ] = None,
+    batch_size: Annotated[
+        int,
+        typer.Option("--batch-size", help="Number of records to write at a time"),
+    ] = DEFAULT_BATCH_SIZE,
+    validate: Annotated[
+        bool,
+        typer.Option(
+            "--validate/--no-validate",
+            help="Check records against the schema of the target file",
+        ),
+    ] = True,
+    dead_letter: Annotated[
+        Optional[Path],
+        typer.Option("--dead-letter", help="File to append invalid records to"),
+    ] = None,
+    data_format: Annotated[
+        DataFormat, typer.Option("--format", help="Format of the input records")
+    ] = DataFormat.jsonl,
+    operation: Annotated[
+        str,
+        typer.Option(
+            "--operation",
+            "-o",
+            help="insert appends records; upsert and delete match them on the primary_key",
+        ),
+    ] = "insert",
+    engine: Annotated[
+        Engine, typer.Option("--engine", help="How JSONL records are written")
+    ] = Engine.python,
+    checkpoint: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--checkpoint", help="File recording how much of the input is loaded"
+        ),
+    ] = None,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume", help="Skip the input records loaded according to --checkpoint"
+        ),
+    ] = False,
+):
     """Load data into the specified collection."""
     config = state["config"]
     if not config:
         err_console.print("[bold red]Error: Configuration not loaded.[/bold red]")
         raise typer.Exit(code=1)
 
-    csv_path = config.csv_path
-    records: list[Dict] = []
+    from src.index import KEYED_OPERATIONS, OPERATIONS
 
-    # Read JSONL from stdin
-    for line in sys.stdin:
-        try:
-            record = json.loads(line.strip())
-            records.append(record)
-        except json.JSONDecodeError:
+    if operation not in OPERATIONS:
+        raise typer.BadParameter(f"Unsupported operation, use one of {OPERATIONS}")
+    collection_id, csv_path = load_target(config, collection_id)
+    columnar = data_format == DataFormat.arrow or engine == Engine.columnar
+    if operation in KEYED_OPERATIONS:
+        check_keyed_load(config, collection_id, operation, columnar)
+
+    if columnar:
+        # Batches are cast as a whole, so invalid rows cannot be set aside
+        if dead_letter:
+            raise typer.BadParameter(
+                "--dead-letter is not supported with arrow input or the columnar engine"
+            )
+        if checkpoint or resume:
+            raise typer.BadParameter(
+                "--checkpoint is not supported with arrow input or the columnar engine"
+            )
+        count = load_arrow(config, collection_id, csv_path, validate, data_format)
+        if count:
+            console.print(
+                f"[green]Successfully loaded {count} records into {csv_path}[/green]"
+            )
+        else:
             err_console.print(
-                f"[bold yellow]Warning: Skipping invalid JSON line: {line.strip()}[/bold yellow]"
+                "[bold yellow]Warning: No records found in input.[/bold yellow]"
             )
+        return
 
-    if not records:
+    from snowpilot_core.jsonl import JsonlReader
+
+    # Read JSONL from stdin, writing each batch as soon as it is complete
+    count = load_records(
+        config,
+        JsonlReader(sys.stdin.buffer, on_error=warn_invalid_line),
+        collection_id,
+        operation,
+        batch_size=batch_size,
+        validate=validate,
+        dead_letter=dead_letter,
+        checkpoint=checkpoint,
+        resume=resume,
+    )
+
+    if not count:
         err_console.print(
             "[bold yellow]Warning: No valid records found in input.[/bold yellow]"
         )
         return
 
-    # Write records to CSV
-    fieldnames = records[0].keys()
-    with open(csv_path, "a+", newline="") as csvfile:
-        # Check if file is empty
-        csvfile.seek(0, 2)
-        is_empty = csvfile.tell() == 0
-        # If not empty, check if last character is newline
-        if not is_empty:
-            csvfile.seek(0)
-            content = csvfile.read()
-            if content and content[-1] != "\n":
-                csvfile.write("\n")
+    if operation == "delete":
+        console.print(
+            f"[green]Successfully deleted {count} records from {csv_path}[/green]"
+        )
+    else:
+        console.print(
+            f"[green]Successfully loaded {count} records into {csv_path}[/green]"
+        )
 
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-        # Write header if file is empty
-        if is_empty:
-            writer.writeheader()
-
-        for record in records:
-            writer.writerow(record)
+@app.command()
+def compact(
+    collection_id: Annotated[
+        Optional[str],
+        typer.Option(
+            "--collection",
+            "-c",
+            help="Collection to compact, required if there are several",
+        ),
+    ] = None,
+):
+    """Rewrite a collection without the rows replaced or deleted by keyed loads."""
+    from src.index import open_index
 
-    print(f"[green]Successfully loaded {len(records)} records into {csv_path}[/green]")
+    collection = resolve_collection(state["config"], collection_id)
+    dropped = 0
+    for path in collection.paths:
+        index = open_index(path)
+        if index is None:
+            continue
+        try:
+            with index:
+                dropped += index.compact()
+        except ValueError as e:
+            err_console.print(f"[bold red]Error: {e}[/bold red]")
+            raise typer.Exit(code=1)
+    console.print(f"[green]Removed {dropped} rows from {collection.id}[/green]")
@@ -1,42 +1,34 @@
-import json
-from typing import Any, Dict, Optional, Type
+import os
+from enum import Enum
+from typing import Optional
 
-from pydantic import BaseModel, field_serializer, field_validator
-from typing_extensions import Literal
+from pydantic import BaseModel, PositiveInt, field_validator
+# Re-exported, so the connector imports every model from `src.models`
+from snowpilot_core.models import Catalog, CollectionMetadata, Schema  # noqa: F401
+
+from src.files import is_glob
+from src.parallel import DEFAULT_CHUNK_SIZE
+
+
+class SampleMethod(str, Enum):
+    head = "head"
+    reservoir = "reservoir"
 
 
 class Config(BaseModel):
     csv_path: str
+    # Number of rows sampled by `discover` to infer column types
+    sample_size: int = 1000
+    sample_method: SampleMethod = SampleMethod.head
+    # Processes parsing files in parallel, defaults to the number of CPUs
+    workers: Optional[int] = None
+    # Bytes of a file parsed by one worker, larger files are split into ranges
+    chunk_size: PositiveInt = DEFAULT_CHUNK_SIZE
+    # Column matching records for the upsert and delete load operations
+    primary_key: Optional[str] = None
 
     @field_validator("csv_path")
-    def validate_csv_extension(cls, v):
-        if not v.lower().endswith(".csv"):
-            raise ValueError("csv_path must end with .csv")
+    def validate_csv_path(cls, v):
+        if not (v.lower().endswith(".csv") or os.path.isdir(v) or is_glob(v)):
+            raise ValueError("csv_path must be a .csv file, a directory or a glob")
         return v
-
-
-# TODO: types below are not specific to CSV, but are used for all connectors
-# we should extract this out into a package.
-
-# should this be Type[BaseModel] or Type[Dict[str, Any]]?
-Schema = Type[BaseModel]
-
-
-class CollectionMetadata(BaseModel):
-    id: str
-    label: str
-    row: Optional[Schema] = None
-    insert: Optional[Schema] = None
-    update: Optional[Schema] = None
-    upsert: Optional[Schema] = None
-    delete: Optional[Schema] = None
-
-    @field_serializer("row", "insert", "update", "upsert", "delete", when_used="json")
-    def serialize_schema(value: Optional[Schema]):
-        if value is None:
-            return None
-        return value.model_json_schema()
-
-
-class Discovery(BaseModel):
-    collections: list[CollectionMetadata]
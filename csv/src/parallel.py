@@ -0,0 +1,233 @@
+"""Parse CSV files on several processes, keeping the output in order.
+
+Each task, a file or a byte range of one, is parsed by a worker process into a
+JSONL spool file, which the parent copies to the output once every earlier
+task has been copied. At most `workers` tasks are in flight, so the spooled
+data stays bounded however many files a collection has, and however large.
+"""
+
+import csv
+import mmap
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import (
+    IO,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# Bytes copied at a time from a spool file to the output
+COPY_SIZE = 1 << 20
+# Bytes of a file parsed by one task; larger files are split into ranges
+DEFAULT_CHUNK_SIZE = 64 << 20
+
+
+class ParseTask(NamedTuple):
+    path: str
+    # Column names of the file, from its header row
+    headers: List[str]
+    # Byte range of the rows to parse, the whole file after the header if unset
+    start: Optional[int] = None
+    end: Optional[int] = None
+    # Offsets of rows superseded or deleted by keyed loads, see src.index
+    dead: FrozenSet[int] = frozenset()
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def count_quotes(mm: mmap.mmap, start: int, end: int) -> int:
+    """Count the quotes from `start` to `end`, copying a block at a time."""
+    return sum(
+        mm[block : min(block + COPY_SIZE, end)].count(b'"')
+        for block in range(start, end, COPY_SIZE)
+    )
+
+
+def record_end(mm: mmap.mmap, position: int, quoted: bool = False) -> int:
+    """Find the end of the record containing `position`.
+
+    `quoted` tells whether `position` is inside a quoted field. A newline ends
+    a record unless an odd number of quotes precede it in the record: quotes
+    escaped by doubling them do not change the parity. Returns the offset
+    after the newline, or the size of the file.
+    """
+    while True:
+        newline = mm.find(b"\n", position)
+        if newline == -1:
+            return len(mm)
+        quoted ^= mm[position:newline].count(b'"') % 2 == 1
+        if not quoted:
+            return newline + 1
+        position = newline + 1
+
+
+def split_file(
+    path: str,
+    headers: List[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> List[ParseTask]:
+    """Split the rows of a file into tasks of about `chunk_size` bytes.
+
+    Only the rows from `start` to `end` are split if given, both on record
+    boundaries. Ranges end on record boundaries, so each one parses on its
+    own. This relies on quotes only enclosing fields, as in files written by
+    the csv module, rather than appearing inside unquoted values.
+    """
+    size = os.path.getsize(path) if end is None else end
+    if size - (start or 0) <= chunk_size:
+        return [ParseTask(path, headers, start, end)]
+
+    tasks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = record_end(mm, 0) if start is None else start
+        end = len(mm) if end is None else end
+        while start < end:
+            target = min(start + chunk_size, end)
+            quoted = count_quotes(mm, start, target) % 2 == 1
+            chunk_end = record_end(mm, target, quoted) if target < end else target
+            tasks.append(ParseTask(path, headers, start, chunk_end))
+            start = chunk_end
+    return tasks
+
+
+def complete_range(path: str, start: Optional[int] = None) -> Tuple[int, int]:
+    """Find the byte range of the complete records from `start` on.
+
+    `start` defaults to the first row after the header. The range ends after
+    the last newline outside a quoted field, leaving out a last record that
+    may still be being written.
+    """
+    if os.path.getsize(path) == 0:
+        return 0, 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = record_end(mm, 0) if start is None else start
+        end = mm.rfind(b"\n", start) + 1
+        quotes = count_quotes(mm, start, end)
+        while end > start and quotes % 2 == 1:
+            previous = mm.rfind(b"\n", start, end - 1) + 1
+            quotes -= mm[previous:end].count(b'"')
+            end = previous
+        return start, max(start, end)
+
+
+def range_lines(f: IO[bytes], size: int) -> Iterator[str]:
+    """Decode the lines of the next `size` bytes of `f`, one at a time."""
+    while size > 0:
+        line = f.readline(size)
+        if not line:
+            return
+        size -= len(line)
+        # Lines end with a newline, so they never split a UTF-8 sequence
+        yield line.decode()
+
+
+def read_rows(task: ParseTask) -> Iterator[List[str]]:
+    if task.dead:
+        from src.index import live_rows
+
+        yield from live_rows(task.path, task.dead, task.start, task.end)
+        return
+
+    if task.start is None:
+        with open(task.path, "r", newline="") as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)
+            yield from reader
+        return
+
+    # Read as a stream: the range after a cursor can be most of the file
+    with open(task.path, "rb") as f:
+        f.seek(task.start)
+        yield from csv.reader(range_lines(f, task.end - task.start))
+
+
+def read_records(
+    task: ParseTask, fields: Optional[List[str]]
+) -> Iterator[Dict[str, str]]:
+    """Build records holding only the requested columns of each row of a task.
+
+    The fields must have been checked against the header of the file. As with
+    `csv.DictReader`, blank lines are skipped and missing trailing values are
+    None.
+    """
+    width = len(task.headers)
+    rows = (
+        row if len(row) >= width else row + [None] * (width - len(row))
+        for row in read_rows(task)
+        if row
+    )
+    if fields is None:
+        for row in rows:
+            yield dict(zip(task.headers, row))
+        return
+
+    indexes = [task.headers.index(field) for field in fields]
+    for row in rows:
+        yield {field: row[index] for field, index in zip(fields, indexes)}
+
+
+def spool_task(
+    task: ParseTask, fields: Optional[List[str]], spool_path: str
+) -> Tuple[str, int]:
+    """Write the records of a task as JSONL to `spool_path`; runs in a worker.
+
+    Returns the path with the number of records written.
+    """
+    from snowpilot_core.jsonl import JsonlWriter
+
+    with open(spool_path, "wb") as spool, JsonlWriter(spool) as writer:
+        writer.write_many(read_records(task, fields))
+    return spool_path, writer.count
+
+
+def copy_spool(future: Future, out: IO[bytes]):
+    from snowpilot_core.metrics import metrics
+
+    # Workers report nothing themselves: the time spent waiting for them is
+    # the parsing not overlapped with copying
+    with metrics.stage("parse_wait"):
+        spool_path, rows = future.result()
+    try:
+        with metrics.stage("write"), open(spool_path, "rb") as spool:
+            shutil.copyfileobj(spool, out, COPY_SIZE)
+            metrics.count("bytes_out", spool.tell())
+        metrics.count("rows_out", rows)
+    finally:
+        os.unlink(spool_path)
+
+
+def extract_parallel(
+    tasks: Sequence[ParseTask],
+    fields: Optional[List[str]],
+    out: IO[bytes],
+    workers: int,
+    executor: Optional[Executor] = None,
+):
+    """Write the records of all tasks as JSONL to `out`, in task order."""
+    from snowpilot_core.runner import process_pool
+
+    with tempfile.TemporaryDirectory(prefix="snowpilot-csv-") as spool_dir:
+        with executor or process_pool(workers, __name__) as pool:
+            pending: Deque[Future] = deque()
+            for index, task in enumerate(tasks):
+                if len(pending) >= workers:
+                    copy_spool(pending.popleft(), out)
+                spool_path = os.path.join(spool_dir, f"{index}.jsonl")
+                pending.append(pool.submit(spool_task, task, fields, spool_path))
+            while pending:
+                copy_spool(pending.popleft(), out)
+        out.flush()
@@ -0,0 +1,25 @@
+import itertools
+import json
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep schema caches written by tests out of the user's cache directory."""
+    monkeypatch.setenv("SNOWPILOT_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def write_config(tmp_path):
+    """Return a function writing a configuration for `csv_path` and `options`,
+    to a new file in `tmp_path`, and returning its path."""
+    numbers = itertools.count()
+
+    def write(csv_path, **options):
+        config_path = tmp_path / f"config_{next(numbers)}.json"
+        config_path.write_text(json.dumps({"csv_path": str(csv_path), **options}))
+        return config_path
+
+    return write
@@ -0,0 +1,105 @@
+"""
+Tests for the Arrow IPC format of extract and load.
+"""
+
+import io
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.ipc
+from typer.testing import CliRunner
+
+from src.main import app
+
+runner = CliRunner()
+
+
+def extract_arrow(config_path, *args):
+    result = runner.invoke(
+        app, ["--config", str(config_path), "extract", "--format", "arrow", *args]
+    )
+    assert result.exit_code == 0, result.output
+    return result.stdout_bytes
+
+
+def test_extract_arrow_uses_discovered_types(tmp_path, write_config):
+    """Test that extract streams batches typed by the discovered schema."""
+    csv_path = tmp_path / "customers.csv"
+    csv_path.write_text(
+        "id,name,active,joined\n1,Alice,true,2024-01-02\n2,Bob,false,\n"
+    )
+
+    data = extract_arrow(write_config(csv_path), "--fields", "joined,id")
+
+    table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+    assert table.schema.names == ["joined", "id"]
+    assert table.schema.field("id").type == pa.int64()
+    assert table.schema.field("joined").type == pa.date32()
+    assert table.column("id").to_pylist() == [1, 2]
+    assert table.column("joined").null_count == 1
+
+
+def test_extract_arrow_accepts_what_inference_accepts(tmp_path, write_config):
+    """Test that zoned timestamps and booleans in any case convert to Arrow."""
+    csv_path = tmp_path / "events.csv"
+    csv_path.write_text(
+        "sent,seen,flag\n"
+        "2024-01-01T10:00:00Z,2024-01-01T10:00:00+01:00,tRuE\n"
+        "2024-01-02T10:00:00-05:00,2024-01-02 11:30,FALSE\n"
+    )
+
+    data = extract_arrow(write_config(csv_path))
+
+    table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+    # Zoned columns keep their zone, columns mixing zoned and naive values
+    # have the zoned ones converted to UTC
+    assert table.schema.field("sent").type == pa.timestamp("us", "UTC")
+    assert table.column("sent").to_pylist() == [
+        datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+        datetime(2024, 1, 2, 15, tzinfo=timezone.utc),
+    ]
+    assert table.schema.field("seen").type == pa.timestamp("us")
+    assert table.column("seen").to_pylist() == [
+        datetime(2024, 1, 1, 9),
+        datetime(2024, 1, 2, 11, 30),
+    ]
+    assert table.column("flag").to_pylist() == [True, False]
+
+
+def test_arrow_round_trip(tmp_path, write_config):
+    """Test that extract output loads into another file through Arrow."""
+    source = tmp_path / "source.csv"
+    source.write_text("id,name,score\n1,Alice,1.5\n2,Bob,\n")
+    target = tmp_path / "target.csv"
+    target.write_text("name,id,score\nCarol,3,2.0\n")
+
+    data = extract_arrow(write_config(source))
+    result = runner.invoke(
+        app,
+        ["--config", str(write_config(target)), "load", "--format", "arrow"],
+        input=data,
+    )
+
+    assert result.exit_code == 0, result.output
+    lines = target.read_text().splitlines()
+    # Columns follow the existing header; nulls are written as empty fields
+    assert lines == ["name,id,score", "Carol,3,2.0", '"Alice",1,1.5', '"Bob",2,']
+
+
+def test_load_arrow_rejects_mismatched_types(tmp_path, write_config):
+    """Test that validation fails batches that cannot be cast to the file schema."""
+    target = tmp_path / "target.csv"
+    target.write_text("id,name\n1,Alice\n")
+    table = pa.table({"id": ["not a number"], "name": ["Bob"]})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    result = runner.invoke(
+        app,
+        ["--config", str(write_config(target)), "load", "--format", "arrow"],
+        input=sink.getvalue(),
+    )
+
+    assert result.exit_code == 1
+    assert target.read_text() == "id,name\n1,Alice\n"
@@ -0,0 +1,78 @@
+"""
+Tests for the on-disk schema cache.
+"""
+
+import os
+from datetime import date
+from typing import Optional
+
+from pydantic import create_model
+from typer.testing import CliRunner
+
+from snowpilot_core.cache import SchemaCache, cache_key, file_fingerprint
+from src import inference
+from src.main import app
+from src.models import Config
+
+runner = CliRunner()
+
+
+def test_schema_round_trip(tmp_path):
+    """Test that cached models produce the same JSON schema as the originals."""
+    schema = create_model(
+        "orders_schema",
+        order_id=(int, ...),
+        price=(float, ...),
+        shipped_on=(Optional[date], None),
+    )
+    cache = SchemaCache(tmp_path)
+
+    cache.set("key", {"orders": schema})
+    cached = cache.get("key")
+
+    assert cached["orders"].model_json_schema() == schema.model_json_schema()
+
+
+def test_expired_entries_are_ignored(tmp_path):
+    """Test that entries older than the TTL are treated as missing."""
+    schema = create_model("users_schema", email=(str, ...))
+    SchemaCache(tmp_path).set("key", {"users": schema})
+
+    assert SchemaCache(tmp_path, ttl=3600).get("key") is not None
+    assert SchemaCache(tmp_path, ttl=-1).get("key") is None
+
+
+def test_key_changes_with_file(tmp_path):
+    """Test that modifying the file invalidates the key."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name\n1,Alice\n")
+    config = Config(csv_path=str(csv_path))
+    before = cache_key(config, file_fingerprint(str(csv_path)))
+
+    csv_path.write_text("id,name\n1,Alice\n2,Bob\n")
+
+    assert cache_key(config, file_fingerprint(str(csv_path))) != before
+
+
+def test_discover_uses_cache(tmp_path, monkeypatch, write_config):
+    """Test that a repeated discover does not infer the schema again."""
+    monkeypatch.setenv("SNOWPILOT_CACHE_DIR", str(tmp_path / "cache"))
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name\n1,Alice\n")
+    config_path = write_config(csv_path)
+    calls = []
+
+    def infer_collection_schema(*args):
+        calls.append(args)
+        return create_model("contacts_schema", id=(int, ...), name=(str, ...))
+
+    monkeypatch.setattr(inference, "infer_collection_schema", infer_collection_schema)
+
+    first = runner.invoke(app, ["--config", str(config_path), "discover"])
+    second = runner.invoke(app, ["--config", str(config_path), "discover"])
+    runner.invoke(app, ["--config", str(config_path), "discover", "--no-cache"])
+
+    assert first.exit_code == 0, first.output
+    assert first.stdout == second.stdout
+    assert len(calls) == 2
+    assert os.listdir(tmp_path / "cache" / "csv")
@@ -0,0 +1,112 @@
+"""
+Tests for directories and globs of CSV files.
+"""
+
+import json
+
+from typer.testing import CliRunner
+
+from src.files import find_collections
+from src.main import app
+
+runner = CliRunner()
+
+
+def write_parts(directory, name, parts):
+    """Write numbered parts of `name`, each holding `rows` (id, name) rows."""
+    directory.mkdir(exist_ok=True)
+    next_id = 1
+    for index, rows in enumerate(parts, start=1):
+        lines = ["id,name"]
+        for _ in range(rows):
+            lines.append(f"{next_id},user{next_id}")
+            next_id += 1
+        (directory / f"{name}.part-{index}.csv").write_text("\n".join(lines) + "\n")
+
+
+def test_find_collections_groups_parts(tmp_path):
+    """Test that numbered parts and subdirectories each form one collection."""
+    data = tmp_path / "data"
+    write_parts(data, "users", [1] * 11)
+    (data / "orders.csv").write_text("id\n1\n")
+    (data / "notes.txt").write_text("ignored")
+    write_parts(data / "events", "events", [1, 1])
+
+    collections = find_collections(str(data))
+
+    assert list(collections) == ["events", "orders", "users"]
+    assert [path.rsplit("-", 1)[1] for path in collections["users"].paths] == [
+        f"{index}.csv" for index in range(1, 12)
+    ]
+
+
+def test_discover_lists_collections(tmp_path, write_config):
+    """Test that discover infers one schema per collection of a directory."""
+    data = tmp_path / "data"
+    write_parts(data, "users", [2, 3])
+    (data / "orders.csv").write_text("order_id,total\n1,9.5\n")
+    config_path = write_config(data)
+
+    result = runner.invoke(app, ["--config", str(config_path), "discover"])
+
+    assert result.exit_code == 0, result.output
+    catalog = json.loads(result.stdout)
+    schemas = {c["id"]: c["row"]["properties"] for c in catalog["collections"]}
+    assert schemas["orders"]["total"]["type"] == "number"
+    assert schemas["users"]["id"]["type"] == "integer"
+
+
+def test_extract_keeps_part_order(tmp_path, write_config):
+    """Test that parts parsed in parallel are written out in order."""
+    data = tmp_path / "data"
+    write_parts(data, "users", [50, 1, 0, 200, 3])
+    config_path = write_config(data, workers=3)
+
+    result = runner.invoke(
+        app, ["--config", str(config_path), "extract", "-c", "users", "--fields", "id"]
+    )
+
+    assert result.exit_code == 0, result.output
+    ids = [json.loads(line)["id"] for line in result.stdout.splitlines()]
+    assert ids == [str(i) for i in range(1, 255)]
+
+
+def test_extract_requires_collection(tmp_path, write_config):
+    """Test that extract asks which collection to read when there are several."""
+    data = tmp_path / "data"
+    write_parts(data, "users", [1])
+    (data / "orders.csv").write_text("id\n1\n")
+    config_path = write_config(data)
+
+    result = runner.invoke(app, ["--config", str(config_path), "extract"])
+
+    assert result.exit_code != 0
+    assert "orders, users" in result.output
+
+
+def test_glob_config(tmp_path, write_config):
+    """Test that a glob selects the files of a collection."""
+    write_parts(tmp_path, "users", [2, 2])
+    (tmp_path / "orders.csv").write_text("id\n1\n")
+    config_path = write_config(tmp_path / "users.part-*.csv")
+
+    result = runner.invoke(app, ["--config", str(config_path), "extract"])
+
+    assert result.exit_code == 0, result.output
+    assert len(result.stdout.splitlines()) == 4
+
+
+def test_load_creates_collection_in_directory(tmp_path, write_config):
+    """Test that loading a new collection into a directory creates its file."""
+    data = tmp_path / "data"
+    write_parts(data, "users", [1])
+    config_path = write_config(data)
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "-c", "orders"],
+        input='{"id": 1}\n',
+    )
+
+    assert result.exit_code == 0, result.output
+    assert (data / "orders.csv").read_text() == "id\n1\n"
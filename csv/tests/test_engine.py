@@ -0,0 +1,74 @@
+"""
+Tests for the columnar engine of extract and load.
+"""
+
+import csv
+import json
+
+from typer.testing import CliRunner
+
+from src.main import app
+
+runner = CliRunner()
+
+
+def test_columnar_extract_matches_python(tmp_path, write_config):
+    """Test that both engines write the same JSONL."""
+    csv_path = tmp_path / "notes.csv"
+    with open(csv_path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, lineterminator="\n")
+        writer.writerow(["id", "note", "city"])
+        for i in range(100):
+            writer.writerow([i, 'a "quoted" \\ note' if i % 2 else "", "Zürich/CH"])
+        writer.writerow([100, "two\nlines", ""])
+    config_path = write_config(csv_path, workers=1)
+
+    outputs = [
+        runner.invoke(
+            app,
+            ["--config", str(config_path), "extract", "--engine", engine]
+            + ["--fields", "note,id"],
+        )
+        for engine in ("python", "columnar")
+    ]
+
+    assert outputs[0].exit_code == 0, outputs[0].output
+    assert outputs[1].exit_code == 0, outputs[1].output
+    assert outputs[0].stdout == outputs[1].stdout
+
+
+def test_columnar_load_writes_rows(tmp_path, write_config):
+    """Test that the columnar engine appends rows, nested values as JSON."""
+    csv_path = tmp_path / "users.csv"
+    config_path = write_config(csv_path, workers=1)
+    records = [
+        {"id": 1, "name": "Alice", "tags": ["a", "b"]},
+        {"id": 2, "name": None, "tags": []},
+    ]
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "--engine", "columnar"],
+        input="".join(json.dumps(record) + "\n" for record in records),
+    )
+
+    assert result.exit_code == 0, result.output
+    with open(csv_path, newline="") as csvfile:
+        assert list(csv.DictReader(csvfile)) == [
+            {"id": "1", "name": "Alice", "tags": '["a","b"]'},
+            {"id": "2", "name": "", "tags": "[]"},
+        ]
+
+
+def test_columnar_load_rejects_dead_letter(tmp_path, write_config):
+    """Test that invalid records cannot be set aside by the columnar engine."""
+    config_path = write_config(tmp_path / "users.csv", workers=1)
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "--engine", "columnar"]
+        + ["--dead-letter", str(tmp_path / "invalid.jsonl")],
+        input="",
+    )
+
+    assert result.exit_code != 0
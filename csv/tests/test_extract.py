@@ -0,0 +1,86 @@
+"""
+Tests for the CSV extract command.
+"""
+
+import io
+import json
+
+from typer.testing import CliRunner
+
+from snowpilot_core.jsonl import JsonlWriter
+from src.main import app
+
+runner = CliRunner()
+
+
+def test_extract_emits_jsonl(tmp_path, write_config):
+    """Test that extract writes one JSON object per row."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text('id,name\n1,Alice\n2,"Bob ""B"" Jones"\n')
+    config_path = write_config(csv_path)
+
+    result = runner.invoke(app, ["--config", str(config_path), "extract"])
+
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert records == [
+        {"id": "1", "name": "Alice"},
+        {"id": "2", "name": 'Bob "B" Jones'},
+    ]
+
+
+def test_jsonl_writer_flushes_in_chunks():
+    """Test that the writer buffers until the chunk size is reached."""
+    stream = io.BytesIO()
+    writer = JsonlWriter(stream, chunk_size=32)
+
+    writer.write({"id": "1"})
+    assert stream.getvalue() == b""
+
+    writer.write_many([{"id": str(i)} for i in range(2, 6)])
+    assert stream.getvalue().count(b"\n") >= 3
+
+    writer.flush()
+    assert stream.getvalue().count(b"\n") == 5
+    assert writer.count == 5
+
+
+def test_extract_projects_fields(tmp_path, write_config):
+    """Test that only the requested columns are emitted, in the requested order."""
+    csv_path = tmp_path / "customers.csv"
+    csv_path.write_text("customer_id,first_name,last_name,age\n1001,John,Doe,30\n")
+    config_path = write_config(csv_path)
+
+    result = runner.invoke(
+        app, ["--config", str(config_path), "extract", "--fields", "age,customer_id"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines() == ['{"age":"30","customer_id":"1001"}']
+
+
+def test_extract_skips_blank_lines_and_pads_short_rows(tmp_path, write_config):
+    """Test that blank lines and ragged rows are read as csv.DictReader would."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name\n1,Alice\n\n2\n")
+    config_path = write_config(csv_path)
+
+    for fields in ([], ["--fields", "name,id"]):
+        result = runner.invoke(app, ["--config", str(config_path), "extract", *fields])
+
+        assert result.exit_code == 0, result.output
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        assert records == [{"id": "1", "name": "Alice"}, {"id": "2", "name": None}]
+
+
+def test_extract_unknown_field(tmp_path, write_config):
+    """Test that requesting a missing column fails."""
+    csv_path = tmp_path / "customers.csv"
+    csv_path.write_text("customer_id,first_name\n1001,John\n")
+    config_path = write_config(csv_path)
+
+    result = runner.invoke(
+        app, ["--config", str(config_path), "extract", "--fields", "email"]
+    )
+
+    assert result.exit_code != 0
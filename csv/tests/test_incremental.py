@@ -0,0 +1,92 @@
+"""
+Tests for incremental extracts with a state file.
+"""
+
+import json
+import tracemalloc
+
+from typer.testing import CliRunner
+
+from snowpilot_core.state import ExtractState
+
+from src.main import app, extract_records
+from src.models import Config
+from src.parallel import complete_range
+
+runner = CliRunner()
+
+
+def extract(config_path, state_path):
+    result = runner.invoke(
+        app, ["--config", str(config_path), "extract", "--state", str(state_path)]
+    )
+    assert result.exit_code == 0, result.output
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def test_extract_continues_after_appended_rows(tmp_path, write_config):
+    """Test that each extract only reads the rows appended since the last one."""
+    csv_path = tmp_path / "notes.csv"
+    csv_path.write_text('id,note\n1,"first\nnote"\n2,b\n')
+    config_path = write_config(csv_path, workers=2, chunk_size=8)
+    state_path = tmp_path / "state.json"
+
+    assert [record["id"] for record in extract(config_path, state_path)] == ["1", "2"]
+    assert extract(config_path, state_path) == []
+
+    with open(csv_path, "a") as csvfile:
+        csvfile.write('3,c\n4,"still\nbeing written')
+
+    assert extract(config_path, state_path) == [{"id": "3", "note": "c"}]
+
+    with open(csv_path, "a") as csvfile:
+        csvfile.write('"\n')
+
+    assert extract(config_path, state_path) == [
+        {"id": "4", "note": "still\nbeing written"}
+    ]
+
+
+def test_replaced_file_is_read_again(tmp_path, write_config):
+    """Test that the cursor of a file replaced by another is discarded."""
+    csv_path = tmp_path / "notes.csv"
+    csv_path.write_text("id\n1\n2\n3\n")
+    config_path = write_config(csv_path, workers=1)
+    state_path = tmp_path / "state.json"
+    extract(config_path, state_path)
+
+    csv_path.unlink()
+    csv_path.write_text("id\n7\n")
+
+    assert extract(config_path, state_path) == [{"id": "7"}]
+
+
+def test_complete_range_skips_header_and_partial_record(tmp_path):
+    csv_path = tmp_path / "notes.csv"
+    csv_path.write_bytes(b'id,note\n1,a\n2,"b\n')
+
+    assert complete_range(str(csv_path)) == (8, 12)
+    assert complete_range(str(csv_path), 12) == (12, 12)
+
+
+def test_incremental_remainder_is_streamed(tmp_path):
+    """Test that reading the rows after a cursor does not load them all at once."""
+    csv_path = tmp_path / "notes.csv"
+    with open(csv_path, "w") as csvfile:
+        csvfile.write("id,note\n")
+        for i in range(200_000):
+            csvfile.write(f"{i},{'x' * 40}\n")
+    state = ExtractState.read(tmp_path / "state.json")
+
+    tracemalloc.start()
+    try:
+        records = extract_records(
+            Config(csv_path=str(csv_path), workers=1), state=state
+        )
+        assert sum(1 for _ in records) == 200_000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # The remainder is about 9 MB
+    assert peak < 2_000_000
@@ -0,0 +1,91 @@
+"""
+Tests for sampling-based schema inference.
+"""
+
+import random
+from datetime import date, datetime
+
+from pydantic import AwareDatetime
+
+from src.inference import (
+    head_sample,
+    infer_column_type,
+    infer_schema,
+    reservoir_sample,
+)
+from src.models import SampleMethod
+
+
+def test_infer_schema_types(tmp_path):
+    """Test that column types and nullability are inferred from the values."""
+    csv_path = tmp_path / "orders.csv"
+    csv_path.write_text(
+        "order_id,product_name,quantity,price,shipped,ordered_on,updated_at,note\n"
+        "5001,Widget A,10,2.99,true,2024-01-02,2024-01-02T10:00:00Z,\n"
+        "5002,Widget B,5,3,False,2024-01-03,2024-01-03 11:30,fragile\n"
+    )
+
+    schema = infer_schema(str(csv_path), "orders").model_json_schema()
+    properties = schema["properties"]
+
+    assert properties["order_id"]["type"] == "integer"
+    assert properties["product_name"]["type"] == "string"
+    assert properties["quantity"]["type"] == "integer"
+    assert properties["price"]["type"] == "number"
+    assert properties["shipped"]["type"] == "boolean"
+    assert properties["ordered_on"]["format"] == "date"
+    assert properties["updated_at"]["format"] == "date-time"
+    assert {"type": "string"} in properties["note"]["anyOf"]
+    assert {"type": "null"} in properties["note"]["anyOf"]
+    assert "note" not in schema["required"]
+
+
+def test_infer_zoned_timestamps():
+    """Test that timestamps are zoned only if every one of them has an offset."""
+    zoned = ["2024-01-02T10:00:00Z", "2024-01-03T11:30+01:00", ""]
+
+    assert infer_column_type(zoned) == (AwareDatetime, True)
+    assert infer_column_type(zoned[:2] + ["2024-01-03 11:30"]) == (datetime, False)
+
+
+def test_infer_column_type_widens_to_the_values():
+    """Test that a column gets the narrowest type holding every value."""
+    assert infer_column_type(["1", "-2"]) == (int, False)
+    assert infer_column_type(["1", "2.5", "1e3"]) == (float, False)
+    assert infer_column_type(["2024-01-02", "2024-01-03"]) == (date, False)
+    assert infer_column_type(["2024-01-02", "2024-01-03 11:30"]) == (datetime, False)
+    assert infer_column_type(["true", "1"]) == (str, False)
+
+
+def test_infer_column_type_rejects_impossible_dates():
+    """Test that values shaped like dates must be real dates to be typed as such."""
+    assert infer_column_type(["2024-01-02", "2024-13-45"]) == (str, False)
+    assert infer_column_type(["2023-02-29T10:00:00"]) == (str, False)
+    assert infer_column_type(["2024-02-29T24:00:00"]) == (str, False)
+
+
+def test_infer_schema_header_only(tmp_path):
+    """Test that columns without sampled values fall back to strings."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name\n")
+
+    schema = infer_schema(
+        str(csv_path), "contacts", sample_method=SampleMethod.reservoir
+    )
+
+    properties = schema.model_json_schema()["properties"]
+    assert properties["id"]["type"] == "string"
+    assert properties["name"]["type"] == "string"
+
+
+def test_samples_are_bounded():
+    """Test that both sampling methods return at most the requested rows."""
+    rows = [[str(i)] for i in range(10_000)]
+
+    assert head_sample(iter(rows), 100) == rows[:100]
+
+    sample = reservoir_sample(iter(rows), 100, random.Random(42))
+    assert len(sample) == 100
+    assert len({row[0] for row in sample}) == 100
+    # A uniform sample should reach well past the head of the input
+    assert max(int(row[0]) for row in sample) > 5000
@@ -0,0 +1,136 @@
+"""
+Tests for the streaming CSV load command.
+"""
+
+import json
+
+from typer.testing import CliRunner
+
+from src.main import app
+
+runner = CliRunner()
+
+
+def to_jsonl(records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def test_load_into_new_file(tmp_path, write_config):
+    """Test that loading into a missing file writes a header and all rows."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path)
+    records = [{"id": str(i), "name": f"name-{i}"} for i in range(25)]
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "--batch-size", "4"],
+        input=to_jsonl(records),
+    )
+
+    assert result.exit_code == 0, result.output
+    lines = csv_path.read_text().splitlines()
+    assert lines[0] == "id,name"
+    assert len(lines) == 26
+    assert lines[-1] == "24,name-24"
+
+
+def test_load_appends_missing_newline(tmp_path, write_config):
+    """Test that a target without a trailing newline is repaired before appending."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name\n1,Alice")
+    config_path = write_config(csv_path)
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load"],
+        input=to_jsonl([{"name": "Bob", "id": "2"}]),
+    )
+
+    assert result.exit_code == 0, result.output
+    # Columns follow the existing header, not the key order of the record
+    assert csv_path.read_text() == "id,name\n1,Alice\n2,Bob\n"
+
+
+def test_load_skips_invalid_lines(tmp_path, write_config):
+    """Test that invalid JSON lines are skipped and an empty input writes nothing."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path)
+
+    result = runner.invoke(
+        app, ["--config", str(config_path), "load"], input="not json\n\n"
+    )
+
+    assert result.exit_code == 0, result.output
+    assert not csv_path.exists()
+
+
+def test_load_sends_invalid_records_to_dead_letter(tmp_path, write_config):
+    """Test that records not matching the file's schema are set aside."""
+    csv_path = tmp_path / "customers.csv"
+    csv_path.write_text("customer_id,name,age\n1001,John,30\n1002,Jane,25\n")
+    config_path = write_config(csv_path)
+    dead_letter = tmp_path / "dead_letter.jsonl"
+    records = [
+        {"customer_id": 1003, "name": "Ann", "age": 41},
+        {"customer_id": 1004, "name": "Bill", "age": "unknown"},
+        {"customer_id": 1005, "age": 12},
+    ]
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "--dead-letter", str(dead_letter)],
+        input=to_jsonl(records),
+    )
+
+    assert result.exit_code == 0, result.output
+    assert csv_path.read_text().splitlines()[-1] == "1003,Ann,41"
+    assert len(csv_path.read_text().splitlines()) == 4
+    rejected = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [entry["record"] for entry in rejected] == records[1:]
+    assert rejected[0]["errors"][0]["loc"] == ["age"]
+    assert rejected[1]["errors"][0]["loc"] == ["name"]
+
+
+def test_load_accepts_extracted_empty_cells(tmp_path, write_config):
+    """Test that empty cells, extracted as "", load into nullable columns."""
+    source_path = tmp_path / "people.csv"
+    source_path.write_text("id,age\n1,30\n2,\n")
+    target_path = tmp_path / "copy.csv"
+    target_path.write_text("id,age\n0,40\n3,\n")
+    extracted = runner.invoke(
+        app, ["--config", str(write_config(source_path)), "extract"]
+    )
+
+    result = runner.invoke(
+        app,
+        ["--config", str(write_config(target_path)), "load"],
+        input=extracted.stdout,
+    )
+
+    assert result.exit_code == 0, result.output
+    assert target_path.read_text() == "id,age\n0,40\n3,\n1,30\n2,\n"
+
+
+def test_resume_discards_uncommitted_rows(tmp_path, write_config):
+    """Test that a resumed insert appends each record once."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path)
+    checkpoint = tmp_path / "load.checkpoint"
+    records = [{"id": str(i), "name": f"name-{i}"} for i in range(5)]
+    args = ["--config", str(config_path), "load", "--batch-size", "2"]
+    args += ["--checkpoint", str(checkpoint)]
+
+    result = runner.invoke(app, args, input=to_jsonl(records[:3]))
+    assert result.exit_code == 0, result.output
+    assert json.loads(checkpoint.read_text())["offset"] == 3
+    # Rows written by a load that failed before its next checkpoint
+    with open(csv_path, "a") as csvfile:
+        csvfile.write("3,name-3\n4,na")
+
+    result = runner.invoke(app, args + ["--resume"], input=to_jsonl(records))
+
+    assert result.exit_code == 0, result.output
+    assert "Discarding" in result.output
+    lines = csv_path.read_text().splitlines()
+    assert lines == ["id,name"] + [f"{i},name-{i}" for i in range(5)]
+    assert json.loads(checkpoint.read_text())["offset"] == 5
@@ -0,0 +1,70 @@
+"""
+Tests for parsing byte ranges of a CSV file in parallel.
+"""
+
+import csv
+import json
+
+from typer.testing import CliRunner
+
+from src.main import app
+from src.parallel import read_rows, split_file
+
+runner = CliRunner()
+
+
+def write_tricky_csv(csv_path, rows):
+    """Write rows whose values hold quotes, commas and newlines."""
+    with open(csv_path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, lineterminator="\n")
+        writer.writerow(["id", "note"])
+        for i in range(rows):
+            writer.writerow([i, f'line one\n"quoted", line {i}\n\nend' * (i % 3)])
+
+
+def test_ranges_align_on_records(tmp_path):
+    """Test that ranges split inside quoted newlines still parse every row."""
+    csv_path = tmp_path / "notes.csv"
+    write_tricky_csv(csv_path, 300)
+    with open(csv_path, newline="") as csvfile:
+        expected = list(csv.reader(csvfile))[1:]
+
+    tasks = split_file(str(csv_path), ["id", "note"], chunk_size=97)
+
+    assert len(tasks) > 10
+    assert [task.start for task in tasks[1:]] == [task.end for task in tasks[:-1]]
+    assert [row for task in tasks for row in read_rows(task)] == expected
+
+
+def test_small_file_is_one_task(tmp_path):
+    """Test that files below the chunk size are parsed whole."""
+    csv_path = tmp_path / "notes.csv"
+    write_tricky_csv(csv_path, 3)
+
+    (task,) = split_file(str(csv_path), ["id", "note"])
+
+    assert task.start is None
+
+
+def test_parallel_extract_matches_sequential(tmp_path):
+    """Test that extracting ranges on several workers keeps the row order."""
+    csv_path = tmp_path / "notes.csv"
+    write_tricky_csv(csv_path, 500)
+    outputs = []
+    for workers, chunk_size in [(1, 1 << 20), (4, 512)]:
+        config_path = tmp_path / f"config{workers}.json"
+        config_path.write_text(
+            json.dumps(
+                {
+                    "csv_path": str(csv_path),
+                    "workers": workers,
+                    "chunk_size": chunk_size,
+                }
+            )
+        )
+        result = runner.invoke(app, ["--config", str(config_path), "extract"])
+        assert result.exit_code == 0, result.output
+        outputs.append(result.stdout)
+
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0].splitlines()) == 500
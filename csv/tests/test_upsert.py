@@ -0,0 +1,143 @@
+"""
+Tests for keyed upserts and deletes, and compaction.
+"""
+
+import json
+import os
+
+from typer.testing import CliRunner
+
+from src.index import KeyIndex, index_path
+from src.main import app
+
+runner = CliRunner()
+
+
+def jsonl(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def extract(config_path):
+    result = runner.invoke(app, ["--config", str(config_path), "extract"])
+    assert result.exit_code == 0, result.output
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def load(config_path, operation, *records):
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "-o", operation, "--no-validate"],
+        input=jsonl(*records),
+    )
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def test_upsert_replaces_rows(tmp_path, write_config):
+    """Test that upserts replace rows by key and insert new keys."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text('id,name,email\n1,Alice,a@x.com\n2,"Bob\nB",b@x.com\n')
+    config_path = write_config(csv_path, primary_key="id")
+
+    load(config_path, "upsert", {"id": 2, "name": "Bob"}, {"id": 3, "name": "Cy"})
+
+    assert extract(config_path) == [
+        {"id": "1", "name": "Alice", "email": "a@x.com"},
+        {"id": "2", "name": "Bob", "email": "b@x.com"},
+        {"id": "3", "name": "Cy", "email": ""},
+    ]
+
+
+def test_upsert_merges_keys_repeated_in_a_batch(tmp_path, write_config):
+    """Test that a partial record merges with an earlier one of the same batch."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name,email\n1,A0,a@x\n")
+    config_path = write_config(csv_path, primary_key="id")
+
+    load(
+        config_path,
+        "upsert",
+        {"id": "1", "name": "A", "email": "a@y"},
+        {"id": "1", "name": "B"},
+    )
+
+    assert extract(config_path) == [{"id": "1", "name": "B", "email": "a@y"}]
+
+
+def test_validated_upsert_accepts_partial_records(tmp_path, write_config):
+    """Test that upserts are validated without requiring every column."""
+    csv_path = tmp_path / "contacts.csv"
+    csv_path.write_text("id,name,age\n1,Alice,30\n")
+    config_path = write_config(csv_path, primary_key="id")
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "-o", "upsert"],
+        input=jsonl({"id": 1, "age": 31}, {"id": 2, "age": "old"}),
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Skipped 1 invalid records" in result.output
+    assert extract(config_path) == [{"id": "1", "name": "Alice", "age": "31"}]
+
+
+def test_delete_and_compact(tmp_path, write_config):
+    """Test that deleted rows are hidden, then removed by compact."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path, primary_key="id")
+    load(config_path, "upsert", *({"id": i, "name": f"n{i}"} for i in range(5)))
+    load(config_path, "delete", {"id": 1}, {"id": 3}, {"id": 9})
+    load(config_path, "upsert", {"id": 0, "name": "zero"})
+    expected = [
+        {"id": "2", "name": "n2"},
+        {"id": "4", "name": "n4"},
+        {"id": "0", "name": "zero"},
+    ]
+
+    assert extract(config_path) == expected
+
+    result = runner.invoke(app, ["--config", str(config_path), "compact"])
+
+    assert result.exit_code == 0, result.output
+    assert csv_path.read_text() == "id,name\n2,n2\n4,n4\n0,zero\n"
+    assert extract(config_path) == expected
+    with KeyIndex(str(csv_path), "id") as index:
+        assert index.dead_count == 0
+        offset = csv_path.read_bytes().index(b"4,n4")
+        assert index.lookup(["4"]) == {"4": (offset, len(b"4,n4\r\n"))}
+
+
+def test_index_catches_up_with_inserts(tmp_path, write_config):
+    """Test that rows appended by plain inserts supersede indexed ones."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path, primary_key="id")
+    load(config_path, "upsert", {"id": 1, "name": "old"})
+    load(config_path, "insert", {"id": 1, "name": "new"}, {"id": 2, "name": "two"})
+    load(config_path, "delete", {"id": 2})
+
+    assert extract(config_path) == [{"id": "1", "name": "new"}]
+
+
+def test_replaced_file_rebuilds_index(tmp_path, write_config):
+    """Test that an index left from another version of the file is rebuilt."""
+    csv_path = tmp_path / "contacts.csv"
+    config_path = write_config(csv_path, primary_key="id")
+    load(config_path, "upsert", {"id": 1, "name": "a"}, {"id": 1, "name": "b"})
+    assert os.path.exists(index_path(str(csv_path)))
+
+    csv_path.unlink()
+    csv_path.write_text("id,name\n7,x\n")
+
+    assert extract(config_path) == [{"id": "7", "name": "x"}]
+
+
+def test_upsert_requires_primary_key(tmp_path, write_config):
+    """Test that keyed operations need a primary key in the configuration."""
+    config_path = write_config(tmp_path / "contacts.csv")
+
+    result = runner.invoke(
+        app, ["--config", str(config_path), "load", "-o", "upsert"], input=jsonl()
+    )
+
+    assert result.exit_code != 0
+    assert "primary_key" in result.output
@@ -0,0 +1,395 @@
+"""Asyncio engine for bulk user updates.
+
+Decoding and batching run on a producer thread, which encodes request bodies
+ahead of the network and hands them over through a bounded queue (see
+`snowpilot_core.producer`), so a slow API holds back the reading of the
+input. The event loop only sends requests, keeping as many in flight as
+`AdaptiveConcurrency` allows: the limit grows while requests are fast and is
+cut when Iterable throttles them or their latency climbs.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import httpx
+import orjson
+from pydantic import BaseModel
+from snowpilot_core.checkpoint import Acknowledgements, Mark
+from snowpilot_core.metrics import metrics
+from snowpilot_core.producer import END, Producer
+
+from src.defaults import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RECORDS,
+    DEFAULT_RATE_LIMIT,
+)
+
+# https://api.iterable.com/api/docs#users_bulkUpdateUser
+BULK_UPDATE_PATH = "users/bulkUpdate"
+DEFAULT_MAX_RETRIES = 5
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+BODY_PREFIX = b'{"users":['
+BODY_SUFFIX = b"]}"
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how often requests may start."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Consume `tokens` if available, else return the seconds to wait for them."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then consume them."""
+        while (delay := self.reserve(tokens)) > 0:
+            self.sleep(delay)
+
+
+class UploadResult(BaseModel):
+    batches: int = 0
+    records: int = 0
+    success_count: int = 0
+    fail_count: int = 0
+
+
+def iter_batches(
+    records: Iterable[Any],
+    max_records: int,
+    max_bytes: int,
+    on_mark: Optional[Callable[[Mark], None]] = None,
+) -> Iterator[List[bytes]]:
+    """Encode records and group them into batches bounded by count and body size.
+
+    A record larger than `max_bytes` on its own is sent as a batch of one and
+    left for the API to reject. Checkpoint marks in the stream are passed to
+    `on_mark` as they are reached: a mark passed before a batch is yielded
+    only covers records in that batch or earlier ones.
+    """
+    batch: List[bytes] = []
+    size = len(BODY_PREFIX) + len(BODY_SUFFIX)
+    for record in records:
+        if isinstance(record, Mark):
+            on_mark(record)
+            continue
+        encoded = orjson.dumps(record)
+        # Each record after the first is preceded by a comma
+        added = len(encoded) + (1 if batch else 0)
+        if batch and (len(batch) >= max_records or size + added > max_bytes):
+            yield batch
+            batch = []
+            size = len(BODY_PREFIX) + len(BODY_SUFFIX)
+            added = len(encoded)
+        batch.append(encoded)
+        size += added
+    if batch:
+        yield batch
+
+
+def encode_body(batch: List[bytes]) -> bytes:
+    return BODY_PREFIX + b",".join(batch) + BODY_SUFFIX
+
+
+def record_batch(size: int, body: bytes, started: float):
+    """Report a batch accepted by Iterable to the metrics of the run."""
+    metrics.observe("batch_latency", time.monotonic() - started)
+    metrics.count("batches")
+    metrics.count("rows_out", size)
+    metrics.count("bytes_out", len(body))
+
+
+def retry_delay(
+    attempt: int, response: Optional[httpx.Response], backoff: float
+) -> float:
+    """Seconds to wait before retrying, from `Retry-After` or exponential backoff."""
+    metrics.count("http_retries")
+    if response is not None and "Retry-After" in response.headers:
+        try:
+            return float(response.headers["Retry-After"])
+        except ValueError:
+            pass
+    return backoff * 2**attempt * (1 + random.random())
+
+
+# Responses telling that Iterable is overloaded, rather than failing
+THROTTLED_STATUS_CODES = {429, 503}
+
+# Encoded batches waiting for the network
+DEFAULT_QUEUE_SIZE = 4
+
+
+class AdaptiveConcurrency:
+    """Limit on the requests in flight, adjusted by additive increase and
+    multiplicative decrease (AIMD).
+
+    Each request that succeeds quickly adds `1 / limit`, so the limit grows
+    by one per round of requests. A request that is throttled, or takes more
+    than `tolerance` times the lowest latency seen, multiplies the limit by
+    `decrease`. Requests started before a decrease do not decrease it again:
+    they were sent under the old limit.
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_CONCURRENCY,
+        maximum: int = DEFAULT_MAX_CONCURRENCY,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        tolerance: float = 2.0,
+    ):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.min_latency: Optional[float] = None
+        self.in_flight = 0
+        # Incremented on each decrease, to tell which requests predate it
+        self.generation = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        """Wait for a free slot, returning the generation to release it with."""
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.in_flight < max(self.minimum, int(self.limit))
+            )
+            self.in_flight += 1
+            return self.generation
+
+    async def release(
+        self, generation: int, latency: Optional[float], throttled: bool = False
+    ):
+        async with self._condition:
+            self.in_flight -= 1
+            self.update(generation, latency, throttled)
+            self._condition.notify_all()
+
+    def update(self, generation: int, latency: Optional[float], throttled: bool):
+        """Adjust the limit to the outcome of a request.
+
+        `latency` is None for a request that failed without a response.
+        """
+        congested = throttled
+        if not throttled and latency is not None:
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            congested = latency > self.tolerance * self.min_latency
+        if congested:
+            if generation == self.generation:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.generation += 1
+        elif latency is not None:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class AsyncBulkUploader:
+    """Upload user records through `users/bulkUpdate` from an event loop.
+
+    Requests share one pooled async client, start no faster than the rate
+    limiter allows, are limited in number by `AdaptiveConcurrency` and are
+    retried with exponential backoff on 429 and 5xx responses.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        max_records: int = DEFAULT_MAX_RECORDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = 0.5,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.concurrency = AdaptiveConcurrency(concurrency, max_concurrency)
+        self.rate_limiter = rate_limiter or TokenBucket(DEFAULT_RATE_LIMIT)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue_size = queue_size
+        self.sleep = sleep
+        self.clock = clock
+
+    async def post(self, body: bytes) -> httpx.Response:
+        """Send one request within the concurrency and rate limits."""
+        generation = await self.concurrency.acquire()
+        latency = None
+        throttled = False
+        try:
+            while (delay := self.rate_limiter.reserve()) > 0:
+                await self.sleep(delay)
+            started = self.clock()
+            try:
+                response = await self.client.post(
+                    BULK_UPDATE_PATH,
+                    content=body,
+                    headers={"Content-Type": "application/json"},
+                )
+            except httpx.TimeoutException:
+                throttled = True
+                raise
+            throttled = response.status_code in THROTTLED_STATUS_CODES
+            # Errors say nothing about the load on the API
+            if response.is_success:
+                latency = self.clock() - started
+            return response
+        finally:
+            await self.concurrency.release(generation, latency, throttled)
+
+    async def send_batch(self, body: bytes, size: int) -> Dict[str, Any]:
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.post(body)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRYABLE_STATUS_CODES
+                    or attempt == self.max_retries
+                ):
+                    response.raise_for_status()
+                    record_batch(size, body, started)
+                    return response.json()
+            await self.sleep(retry_delay(attempt, response, self.backoff))
+
+    async def upload(
+        self,
+        records: Iterable[Any],
+        acknowledgements: Optional[Acknowledgements] = None,
+    ) -> UploadResult:
+        """Upload the records, committing the marks among them to a checkpoint.
+
+        Records are marked with `Checkpoint.marked`. A batch that fails stops
+        the upload, and the reading of the input, before the marks after it
+        are committed.
+        """
+
+        def encode() -> Iterator[Tuple[Optional[bytes], int, Optional[Mark]]]:
+            # Runs on the producer thread: reading, validating and encoding records
+            marks: List[Mark] = []
+            iterator = iter(records)
+            try:
+                batches = iter_batches(
+                    iterator, self.max_records, self.max_bytes, on_mark=marks.append
+                )
+                for batch in metrics.timed("encode", batches):
+                    mark = marks[-1] if marks else None
+                    marks.clear()
+                    yield encode_body(batch), len(batch), mark
+                # Marks after the last record, for input that was all invalid
+                if marks:
+                    yield None, 0, marks[-1]
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+
+        result = UploadResult()
+
+        def collect(tasks: Set[asyncio.Task]):
+            """Count the batches done, then raise the first error among them.
+
+            Every task is looked at before raising: the batches that succeeded
+            alongside a failed one are still acknowledged.
+            """
+            error = None
+            for task in tasks:
+                # The error of a batch that exhausted its retries
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                body, size, ticket = task.result()
+                result.batches += 1
+                result.records += size
+                result.success_count += body.get("successCount", size)
+                result.fail_count += body.get("failCount", 0)
+                if acknowledgements is not None:
+                    acknowledgements.acknowledge(ticket)
+            if error is not None:
+                raise error
+
+        async def send(body: bytes, size: int, ticket: Optional[int]):
+            return await self.send_batch(body, size), size, ticket
+
+        producer = Producer(encode(), self.queue_size, "iterable-encode")
+        producer.start()
+        pending: Set[asyncio.Task] = set()
+        try:
+            while (item := await asyncio.to_thread(producer.get)) is not END:
+                body, size, mark = item
+                ticket = None
+                if acknowledgements is not None:
+                    ticket = acknowledgements.register(mark)
+                if body is None:
+                    if ticket is not None:
+                        acknowledgements.acknowledge(ticket)
+                    continue
+                # Tasks beyond the limit would only hold batches in memory
+                while len(pending) >= max(1, int(self.concurrency.limit)):
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    collect(done)
+                pending.add(asyncio.create_task(send(body, size, ticket)))
+            if pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_EXCEPTION
+                )
+                collect(done)
+        finally:
+            # Tasks still pending after an error are cancelled and awaited
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await asyncio.to_thread(producer.stop)
+        return result
@@ -0,0 +1,140 @@
+import time
+from typing import Callable, List, Optional
+
+import httpx
+from pydantic import BaseModel
+from snowpilot_core.metrics import metrics
+
+from src.models import Config, HttpConfig, Region
+
+BASE_URLS = {
+    Region.us: "https://api.iterable.com/api/",
+}
+USER_AGENT = "Snowpilot/1.0 (developers@snowpilot.com)"
+# Request extension holding the time the request was sent
+STARTED_EXTENSION = "snowpilot.started"
+
+
+class RequestMetric(BaseModel):
+    method: str
+    endpoint: str
+    status_code: int
+    # Seconds from sending the request until the response headers arrived
+    elapsed: float
+
+
+MetricsHook = Callable[[RequestMetric], None]
+
+
+def observe_request(metric: RequestMetric):
+    """Report a request to the metrics of the run."""
+    metrics.observe(f"http_latency.{metric.endpoint}", metric.elapsed)
+    metrics.count(f"http_status.{metric.status_code}")
+
+
+def base_url(config: Config) -> str:
+    return config.base_url or BASE_URLS[config.region]
+
+
+def endpoint_of(request: httpx.Request, base_path: str) -> str:
+    """Return the API endpoint of a request, e.g. `users/bulkUpdate`."""
+    path = request.url.path
+    return path[len(base_path) :] if path.startswith(base_path) else path
+
+
+class ClientHooks:
+    """httpx event hooks applying per-endpoint timeouts and reporting latency.
+
+    The same instance works for sync and async clients: `request`/`response`
+    are plain callables, `async_request`/`async_response` wrap them.
+    """
+
+    def __init__(
+        self,
+        base_path: str,
+        http: HttpConfig,
+        metrics_hooks: Optional[List[MetricsHook]] = None,
+    ):
+        self.base_path = base_path
+        self.timeouts = {
+            endpoint: httpx.Timeout(timeout, connect=http.connect_timeout).as_dict()
+            for endpoint, timeout in http.endpoint_timeouts.items()
+        }
+        self.metrics_hooks = list(metrics_hooks or [])
+        if metrics.enabled:
+            self.metrics_hooks.append(observe_request)
+
+    def request(self, request: httpx.Request):
+        endpoint = endpoint_of(request, self.base_path)
+        if endpoint in self.timeouts:
+            # Transports read the timeout from the request, so this overrides
+            # the client-wide default for this endpoint only
+            request.extensions["timeout"] = self.timeouts[endpoint]
+        if self.metrics_hooks:
+            # Kept on the request, so a request that fails leaves nothing behind
+            request.extensions[STARTED_EXTENSION] = time.perf_counter()
+
+    def response(self, response: httpx.Response):
+        started = response.request.extensions.get(STARTED_EXTENSION)
+        if started is None:
+            return
+        metric = RequestMetric(
+            method=response.request.method,
+            endpoint=endpoint_of(response.request, self.base_path),
+            status_code=response.status_code,
+            elapsed=time.perf_counter() - started,
+        )
+        for hook in self.metrics_hooks:
+            hook(metric)
+
+    async def async_request(self, request: httpx.Request):
+        self.request(request)
+
+    async def async_response(self, response: httpx.Response):
+        self.response(response)
+
+
+def client_options(config: Config) -> dict:
+    """Keyword arguments shared by the sync and async clients."""
+    http = config.http
+    return dict(
+        base_url=base_url(config),
+        headers={
+            "Api-Key": config.api_key,
+            "User-Agent": USER_AGENT,
+        },
+        http2=http.http2,
+        limits=httpx.Limits(
+            max_connections=http.max_connections,
+            max_keepalive_connections=http.max_keepalive_connections,
+            keepalive_expiry=http.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(http.timeout, connect=http.connect_timeout),
+    )
+
+
+def build_client(
+    config: Config, metrics_hooks: Optional[List[MetricsHook]] = None
+) -> httpx.Client:
+    """Build the pooled client used for every request of a command."""
+    options = client_options(config)
+    hooks = ClientHooks(httpx.URL(options["base_url"]).path, config.http, metrics_hooks)
+    return httpx.Client(
+        **options,
+        event_hooks={"request": [hooks.request], "response": [hooks.response]},
+    )
+
+
+def build_async_client(
+    config: Config, metrics_hooks: Optional[List[MetricsHook]] = None
+) -> httpx.AsyncClient:
+    """Build the asyncio counterpart of `build_client`."""
+    options = client_options(config)
+    hooks = ClientHooks(httpx.URL(options["base_url"]).path, config.http, metrics_hooks)
+    return httpx.AsyncClient(
+        **options,
+        event_hooks={
+            "request": [hooks.async_request],
+            "response": [hooks.async_response],
+        },
+    )
@@ -0,0 +1,17 @@
+"""Defaults of command-line options.
+
+Kept apart from the modules using them, which import httpx and pydantic, so
+that the CLI can be built without importing those.
+"""
+
+# Date windows of a partitioned export fetched at once
+DEFAULT_PARTITION_CONCURRENCY = 4
+
+# Bulk user updates
+DEFAULT_MAX_RECORDS = 1000
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+# Ceiling of the requests in flight, which adapts to latency and throttling
+DEFAULT_MAX_CONCURRENCY = 16
+# Requests per second allowed by Iterable for bulk user updates
+DEFAULT_RATE_LIMIT = 5.0
@@ -0,0 +1,147 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+import orjson
+from snowpilot_core.metrics import metrics
+from snowpilot_core.producer import POLL_INTERVAL
+
+from src.defaults import DEFAULT_PARTITION_CONCURRENCY
+
+# https://api.iterable.com/api/docs#export_exportDataJson
+EXPORT_PATH = "export/data.json"
+EXPORT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Lower bound for partitioned exports when no start is given. Iterable has no
+# data from before it launched.
+EARLIEST_EXPORT_DATETIME = datetime(2013, 1, 1, tzinfo=timezone.utc)
+
+Window = Tuple[datetime, datetime]
+
+
+def export_params(
+    fields: Optional[List[str]], window: Optional[Window] = None
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"dataTypeName": "user"}
+    if window is None:
+        params["range"] = "All"
+    else:
+        start, end = window
+        params["startDateTime"] = format_datetime(start)
+        params["endDateTime"] = format_datetime(end)
+    if fields:
+        # Let the API do the projection so unused fields are never transferred
+        params["onlyFields"] = fields
+    return params
+
+
+def format_datetime(value: datetime) -> str:
+    """Format a datetime the way the export API expects, in UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime(EXPORT_DATETIME_FORMAT)
+
+
+def partition_windows(start: datetime, end: datetime, partitions: int) -> List[Window]:
+    """Split [start, end) into `partitions` contiguous windows of equal length.
+
+    Adjacent windows share a boundary, so every instant in the range belongs to
+    exactly one window. Boundaries are rounded to whole seconds, the precision
+    of the export API.
+    """
+    if end <= start:
+        raise ValueError("The end of the export range must be after its start")
+    step = (end - start) / partitions
+    boundaries = [start + step * i for i in range(partitions)] + [end]
+    boundaries = [boundary.replace(microsecond=0) for boundary in boundaries]
+    # Rounding can collapse very short windows; drop the empty ones
+    return [
+        (lower, upper)
+        for lower, upper in zip(boundaries, boundaries[1:])
+        if lower < upper
+    ]
+
+
+def line_batches(chunks: Iterable[bytes]) -> Iterator[List[bytes]]:
+    """Split a stream of chunks into the lines completed by each chunk."""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield lines
+    if pending:
+        yield [pending]
+
+
+def export_batches(
+    client: httpx.Client, params: Dict[str, Any]
+) -> Iterator[List[Dict]]:
+    """Stream an export as the records decoded from each chunk of the response."""
+    with client.stream("GET", EXPORT_PATH, params=params) as response:
+        response.raise_for_status()
+        for lines in line_batches(metrics.timed("download", response.iter_bytes())):
+            yield [orjson.loads(line) for line in lines if line.strip()]
+
+
+def export_records(client: httpx.Client, params: Dict[str, Any]) -> Iterator[Dict]:
+    """Stream an export as decoded records."""
+    for batch in export_batches(client, params):
+        yield from batch
+
+
+def parallel_export_records(
+    client: httpx.Client,
+    fields: Optional[List[str]],
+    windows: List[Window],
+    concurrency: int = DEFAULT_PARTITION_CONCURRENCY,
+) -> Iterator[Dict]:
+    """Export several date windows at the same time as one stream of records.
+
+    Windows are fetched by a pool of `concurrency` threads sharing one client.
+    Each thread hands over the records of a chunk at a time through a bounded
+    queue, so records from different windows are interleaved, and a slow
+    consumer holds back the downloads.
+    """
+    batches: "queue.Queue" = queue.Queue(maxsize=concurrency * 2)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(window: Window):
+        # Ends with None, or with the error that stopped the window
+        try:
+            for batch in export_batches(client, export_params(fields, window)):
+                if not put(batch):
+                    return
+        except BaseException as e:
+            put(e)
+        else:
+            put(None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for window in windows:
+                executor.submit(fetch, window)
+            remaining = len(windows)
+            while remaining:
+                item = batches.get()
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            # Threads still fetching give up at their next chunk, and the
+            # windows not started yet are not fetched at all
+            stop.set()
+            executor.shutdown(cancel_futures=True)
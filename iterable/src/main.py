@@ -1,41 +1,54 @@
-import json
 import sys
-from datetime import datetime
-from typing import Dict, Optional
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
-import httpx
-import jsonc
 import typer
-from pydantic import ValidationError, create_model
-from rich import print
-from rich.console import Console
+from snowpilot_core.cli import (
+    config_callback,
+    console,
+    err_console,
+    parse_fields,
+    warn_invalid_line,
+)
 from typing_extensions import Annotated
 
-from src.models import (
-    Catalog,
-    CollectionMetadata,
-    Config,
-    Schema,
-    User,
+from src.defaults import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RECORDS,
+    DEFAULT_PARTITION_CONCURRENCY,
+    DEFAULT_RATE_LIMIT,
 )
 
-err_console = Console(stderr=True)
-app = typer.Typer()
-state: Dict[str, Optional[Config]] = {"config": None}
+if TYPE_CHECKING:
+    from snowpilot_core.state import ExtractState
 
+    from src.models import Config, Schema
 
-# OPEN Q: Should we have a `meta` command to get the schema of the config file?
+# Modules that import httpx, pydantic or orjson are imported by the commands
+# using them, so that starting the CLI stays cheap.
 
+app = typer.Typer()
+state: Dict[str, Optional["Config"]] = {"config": None}
 
-def build_client(config: Config):
-    return httpx.Client(
-        # NOTE: base_url will have to be dynamic when we support eu-region accounts
-        base_url="https://api.iterable.com/api/",
-        headers={
-            "Api-Key": config.api_key,
-            "User-Agent": "Snowpilot/1.0 (developers@snowpilot.com)",
-        },
-    )
+# Models in `src.models` that incoming records are validated against, per
+# load operation
+OPERATION_SCHEMAS: Dict[str, str] = {"upsert": "User"}
+
+
+# OPEN Q: Should we have a `meta` command to get the schema of the config file?
 
 
 def api_type_to_pydantic_type(type: str) -> type:
@@ -54,7 +67,11 @@ def api_type_to_pydantic_type(type: str) -> type:
             raise ValueError(f"Unsupported type: {type}")
 
 
-def get_user_schema(config: Config) -> Schema:
+def get_user_schema(config: "Config") -> "Schema":
+    from pydantic import create_model
+
+    from src.client import build_client
+
     with build_client(config) as client:
         response = client.get("users/getFields")
         response.raise_for_status()
@@ -85,28 +102,37 @@ def get_user_schema(config: Config) -> Schema:
         return schema
 
 
-@app.callback()
-def config(
-    config_file: Annotated[
-        typer.FileText,
-        typer.Option("--config", "-f", help="Path to the configuration file"),
-    ],
-):
-    """Provide the path to the configuration file."""
-    raw_config = jsonc.load(config_file)
-    try:
-        validated_config = Config.model_validate(raw_config)
-        state["config"] = validated_config
-    except ValidationError as e:
-        err_console.print("[bold red]Error in configuration file:[/bold red]")
-        err_console.print(e)
-        raise typer.Exit(code=1)
+def config_model():
+    from src.models import Config
+
+    return Config
+
+
+app.callback()(config_callback(config_model, state))
 
 
 @app.command()
-def discover():
+def discover(
+    use_cache: Annotated[
+        bool,
+        typer.Option("--cache/--no-cache", help="Reuse schemas from earlier runs"),
+    ] = True,
+):
     """Discover available collections and their schemas."""
-    user_schema = get_user_schema(state["config"])
+    from snowpilot_core.cache import SchemaCache, cache_key, default_cache_dir
+
+    from src.client import base_url
+    from src.models import Catalog, CollectionMetadata, User
+
+    config = state["config"]
+    cache = SchemaCache(default_cache_dir() / "iterable", ttl=config.schema_cache_ttl)
+    key = cache_key(config, {"base_url": base_url(config)})
+    schemas = cache.get(key) if use_cache else None
+    if schemas is None:
+        schemas = {"users": get_user_schema(config)}
+        cache.set(key, schemas)
+
+    user_schema = schemas["users"]
     catalog = Catalog(
         collections=[
             CollectionMetadata(
@@ -114,76 +140,337 @@ def discover():
             )  # TODO: we should enforce the types of custom fields on upsert
         ]
     )
-    print(catalog.model_dump_json(indent=2))
+    console.print(catalog.model_dump_json(indent=2), markup=False)
 
 
-@app.command()
-def extract(collection_id: Annotated[str, typer.Option("--collection", "-c")]):
-    """Extract data from the specified collection."""
+def check_collection(collection_id: Optional[str]):
+    # TODO: support collections other than users, and list which ones are valid
     if collection_id not in ["users"]:
-        raise typer.BadArgument("Unsupported collection ID")
+        raise typer.BadParameter("Unsupported collection ID")
+
+
+def export_range(
+    extract_state: "ExtractState",
+    collection_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Tuple[datetime, datetime]:
+    """Find the range of `profileUpdatedAt` to export incrementally.
+
+    It starts at the watermark of the previous export unless `start` is
+    given, and ends now unless `end` is given. Its end is the next watermark.
+    """
+    from src.export import EARLIEST_EXPORT_DATETIME
+
+    cursor = extract_state.cursor(collection_id)
+    if start is None and cursor is not None:
+        start = datetime.fromisoformat(cursor["profileUpdatedAt"])
+    start = (start or EARLIEST_EXPORT_DATETIME).replace(tzinfo=timezone.utc)
+    end = (end or datetime.now(timezone.utc)).replace(tzinfo=timezone.utc)
+    # The export API has a precision of one second
+    return start, end.replace(microsecond=0)
+
+
+def watermark(end: datetime) -> Dict[str, str]:
+    return {"profileUpdatedAt": end.isoformat()}
+
+
+def extract_records(
+    config: "Config",
+    collection_id: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    state: Optional["ExtractState"] = None,
+    partitions: int = 1,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    concurrency: int = DEFAULT_PARTITION_CONCURRENCY,
+) -> Iterator[Dict[str, Any]]:
+    """Export the records of a collection, for `extract` and to run the
+    connector in-process.
+
+    Arguments are checked before this returns, the export starts on the first
+    record read. With `partitions` or a range, users updated from `start` to
+    `end` are exported in that many windows, `concurrency` of them at once.
+    With a `state`, the range starts at its watermark, and the watermark is
+    advanced once every user is exported; saving it is up to the caller.
+    """
+    check_collection(collection_id)
 
-    with build_client(state["config"]) as client:
-        response = client.get(
-            "export/data.json",
-            params={"dataTypeName": "user", "range": "All"},
+    from src.client import build_client
+    from src.export import (
+        EARLIEST_EXPORT_DATETIME,
+        export_params,
+        export_records,
+        parallel_export_records,
+        partition_windows,
+    )
+
+    windows = None
+    if state is not None:
+        start, end = export_range(state, collection_id, start, end)
+        # Nothing was updated since the previous export
+        if start >= end:
+            return iter(())
+    if partitions > 1 or start is not None or end is not None:
+        windows = partition_windows(
+            (start or EARLIEST_EXPORT_DATETIME).replace(tzinfo=timezone.utc),
+            (end or datetime.now(timezone.utc)).replace(tzinfo=timezone.utc),
+            max(partitions, 1),
         )
-        response.raise_for_status()
-        print(response.text.strip())
+
+    def records() -> Iterator[Dict[str, Any]]:
+        with build_client(config) as client:
+            if windows is None:
+                yield from export_records(client, export_params(fields))
+            elif len(windows) == 1:
+                yield from export_records(client, export_params(fields, windows[0]))
+            else:
+                yield from parallel_export_records(client, fields, windows, concurrency)
+        if state is not None:
+            state.advance(collection_id, watermark(end))
+
+    return records()
+
+
+@app.command()
+def extract(
+    collection_id: Annotated[str, typer.Option("--collection", "-c")],
+    fields: Annotated[
+        Optional[str],
+        typer.Option("--fields", help="Comma-separated list of fields to extract"),
+    ] = None,
+    partitions: Annotated[
+        int,
+        typer.Option(
+            "--partitions",
+            help="Split the export into this many date windows fetched in parallel",
+        ),
+    ] = 1,
+    start: Annotated[
+        Optional[datetime],
+        typer.Option("--start", help="Start of the partitioned range (UTC)"),
+    ] = None,
+    end: Annotated[
+        Optional[datetime],
+        typer.Option("--end", help="End of the partitioned range (UTC)"),
+    ] = None,
+    concurrency: Annotated[
+        int,
+        typer.Option("--concurrency", help="Number of partitions fetched at once"),
+    ] = DEFAULT_PARTITION_CONCURRENCY,
+    state_file: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--state",
+            help="File with the profileUpdatedAt watermark to export from, updated after",
+        ),
+    ] = None,
+):
+    """Extract data from the specified collection."""
+    from snowpilot_core.jsonl import JsonlWriter
+    from snowpilot_core.state import ExtractState
+
+    extract_state = ExtractState.read(state_file) if state_file is not None else None
+    records = extract_records(
+        state["config"],
+        collection_id,
+        parse_fields(fields),
+        extract_state,
+        partitions=partitions,
+        start=start,
+        end=end,
+        concurrency=concurrency,
+    )
+    with JsonlWriter(sys.stdout.buffer) as writer:
+        writer.write_many(records)
+
+    if extract_state is not None:
+        extract_state.save()
 
 
 @app.command()
 def load(
     collection_id: Annotated[str, typer.Option("--collection", "-c")],
     operation: Annotated[str, typer.Option("--operation", "-o")],
+    batch_size: Annotated[
+        int, typer.Option("--batch-size", help="Maximum number of records per request")
+    ] = DEFAULT_MAX_RECORDS,
+    max_batch_bytes: Annotated[
+        int, typer.Option("--max-batch-bytes", help="Maximum request body size")
+    ] = DEFAULT_MAX_BYTES,
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency", min=1, help="Number of requests in flight to start with"
+        ),
+    ] = DEFAULT_CONCURRENCY,
+    max_concurrency: Annotated[
+        int,
+        typer.Option(
+            "--max-concurrency",
+            min=1,
+            help="Most requests in flight, as the limit adapts to latency and throttling",
+        ),
+    ] = DEFAULT_MAX_CONCURRENCY,
+    rate_limit: Annotated[
+        float, typer.Option("--rate-limit", help="Maximum requests per second")
+    ] = DEFAULT_RATE_LIMIT,
+    validate: Annotated[
+        bool,
+        typer.Option(
+            "--validate/--no-validate",
+            help="Check records against the schema of the operation",
+        ),
+    ] = True,
+    dead_letter: Annotated[
+        Optional[Path],
+        typer.Option("--dead-letter", help="File to append invalid records to"),
+    ] = None,
+    checkpoint: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--checkpoint", help="File recording how much of the input is loaded"
+        ),
+    ] = None,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume", help="Skip the input records loaded according to --checkpoint"
+        ),
+    ] = False,
 ):
     """Load data into the specified collection."""
-    # TODO: support collections other than users, and list which ones are valid
-    if collection_id not in ["users"]:
-        raise typer.BadArgument("Unsupported collection ID")
+    from snowpilot_core.jsonl import JsonlReader
+
+    # Read JSONL from stdin, sending each batch as soon as it is complete
+    count = load_records(
+        state["config"],
+        JsonlReader(sys.stdin.buffer, on_error=warn_invalid_line),
+        collection_id,
+        operation,
+        batch_size=batch_size,
+        max_batch_bytes=max_batch_bytes,
+        concurrency=concurrency,
+        max_concurrency=max_concurrency,
+        rate_limit=rate_limit,
+        validate=validate,
+        dead_letter=dead_letter,
+        checkpoint=checkpoint,
+        resume=resume,
+    )
+    if not count:
+        err_console.print(
+            "[bold yellow]Warning: No valid records found in input.[/bold yellow]"
+        )
+        return
+
+    console.print(
+        f"[green]Successfully loaded {count} records into {collection_id}[/green]"
+    )
+
+
+def load_records(
+    config: "Config",
+    records: Iterable[Dict[str, Any]],
+    collection_id: Optional[str] = None,
+    operation: Optional[str] = None,
+    batch_size: int = DEFAULT_MAX_RECORDS,
+    max_batch_bytes: int = DEFAULT_MAX_BYTES,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    rate_limit: float = DEFAULT_RATE_LIMIT,
+    validate: bool = True,
+    dead_letter: Optional[Path] = None,
+    checkpoint: Optional[Path] = None,
+    resume: bool = False,
+) -> int:
+    """Upload records to a collection, returning how many Iterable accepted.
+
+    With a `checkpoint` file, the input offset up to which every batch has
+    been accepted is committed to it as batches complete, and `resume` skips
+    the records before it. Used by `load`, and to run the connector in-process.
+
+    Records are read and encoded on a thread of their own while requests are
+    sent from an event loop, starting with `concurrency` of them in flight.
+    """
+    check_collection(collection_id)
 
     # TODO: support other operations, and list the valid ones
-    if operation not in ["upsert"]:
-        raise typer.BadArgument("Unsupported operation")
+    if operation not in OPERATION_SCHEMAS:
+        raise typer.BadParameter("Unsupported operation")
+    if concurrency > max_concurrency:
+        raise typer.BadParameter("--concurrency cannot exceed --max-concurrency")
 
-    records: list[Dict] = []
+    import asyncio
 
-    # Read JSONL from stdin
-    # TODO: we should do this in a streaming fashion
-    for line in sys.stdin:
-        try:
-            record = json.loads(line.strip())
-            records.append(record)
-        except json.JSONDecodeError:
-            err_console.print(
-                f"[bold yellow]Warning: Skipping invalid JSON line: {line.strip()}[/bold yellow]"
+    import httpx
+    from snowpilot_core.checkpoint import Acknowledgements, Mark, open_checkpoint
+    from snowpilot_core.validation import RecordValidator
+
+    from src import models
+    from src.async_uploader import AsyncBulkUploader, TokenBucket
+    from src.client import build_async_client
+
+    progress = open_checkpoint(
+        checkpoint,
+        {"connector": "iterable", "collection": collection_id, "operation": operation},
+        resume,
+    )
+
+    with ExitStack() as stack:
+        validator = None
+        if validate:
+            dead_letter_file = (
+                stack.enter_context(open(dead_letter, "ab")) if dead_letter else None
             )
+            schema = getattr(models, OPERATION_SCHEMAS[operation])
+            validator = RecordValidator(schema, dead_letter_file)
 
-    if not records:
-        err_console.print(
-            "[bold yellow]Warning: No valid records found in input.[/bold yellow]"
+        acknowledgements = None
+        if progress is not None:
+            acknowledgements = Acknowledgements(progress)
+            records = progress.marked(
+                records, validator.validate if validator else None, batch_size
+            )
+        elif validator is not None:
+            records = validator.filter(records)
+
+        users = (
+            (
+                record
+                if isinstance(record, Mark)
+                else {**record, "preferUserId": True, "mergeNestedObjects": True}
+            )
+            for record in records
         )
-        return
 
-        # TODO: rate-limiting & size-limiting
-        # TODO: error handling
+        async def upload():
+            async with build_async_client(config) as client:
+                uploader = AsyncBulkUploader(
+                    client,
+                    max_records=batch_size,
+                    max_bytes=max_batch_bytes,
+                    concurrency=concurrency,
+                    max_concurrency=max_concurrency,
+                    rate_limiter=TokenBucket(rate_limit),
+                )
+                return await uploader.upload(users, acknowledgements)
 
-    # https://api.iterable.com/api/docs#users_bulkUpdateUser
-    body = {
-        "users": [
-            {**record, "preferUserId": True, "mergeNestedObjects": True}
-            for record in records
-        ]
-    }
+        try:
+            result = asyncio.run(upload())
+        except httpx.HTTPStatusError as e:
+            err_console.print(
+                f"[bold red]Error: Iterable rejected a batch: {e}[/bold red]"
+            )
+            raise typer.Exit(code=1)
 
-    with build_client(state["config"]) as client:
-        response = client.post(
-            "users/bulkUpdate",
-            json=body,
+    if validator is not None and validator.invalid_count:
+        err_console.print(
+            f"[bold yellow]Warning: Skipped {validator.invalid_count} invalid records[/bold yellow]"
         )
-        response.raise_for_status()
-        print(response.json())
 
-    print(
-        f"[green]Successfully loaded {len(records)} records into {collection_id}[/green]"
-    )
+    if result.fail_count:
+        err_console.print(
+            f"[bold yellow]Warning: {result.fail_count} records were rejected by Iterable[/bold yellow]"
+        )
+    return result.success_count
@@ -1,49 +1,10 @@
-import json
-from enum import Enum, IntEnum
-from typing import Any, Dict, Optional, Type
+from enum import Enum
+from typing import Any, Dict, Optional
 
-from pydantic import (
-    BaseModel,
-    ConfigDict,
-    field_serializer,
-    field_validator,
-    model_serializer,
-)
+from pydantic import BaseModel, ConfigDict
 from pydantic.alias_generators import to_camel
-from typing_extensions import Literal
-
-# TODO: types below are not specific to any one connector, but are used for all connectors
-# we should extract this out into a package.
-
-# should this be Type[BaseModel] or Type[Dict[str, Any]]?
-Schema = Type[BaseModel]
-
-
-class CollectionMetadata(BaseModel):
-    id: str
-    label: str
-    row: Optional[Schema] = None
-    insert: Optional[Schema] = None
-    update: Optional[Schema] = None
-    upsert: Optional[Schema] = None
-    delete: Optional[Schema] = None
-
-    # @model_serializer()
-    # def serialize_model(self, when_used="json-unless-none"):
-    #     return self.model_dump_json()
-
-    @field_serializer(
-        "row", "insert", "update", "upsert", "delete", when_used="json-unless-none"
-    )
-    def serialize_schema(value: Optional[Schema]):
-        if value is None:
-            return None
-        return value.model_json_schema()
-
-
-class Catalog(BaseModel):
-    collections: list[CollectionMetadata]
-
+# Re-exported, so the connector imports every model from `src.models`
+from snowpilot_core.models import Catalog, CollectionMetadata, Schema  # noqa: F401
 
 # Now here are the Iterable-specific models
 
@@ -58,10 +19,31 @@ class Region(str, Enum):
     # eu = "eu" # TODO: Support this in the future
 
 
+class HttpConfig(BaseModel):
+    # Connection pool limits, shared by every request of a command
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    # Timeouts in seconds. `timeout` applies to reads, writes and waiting for a
+    # pooled connection, unless overridden for a specific endpoint.
+    connect_timeout: float = 10.0
+    timeout: float = 30.0
+    endpoint_timeouts: Dict[str, float] = {
+        "export/data.json": 300.0,
+        "users/bulkUpdate": 60.0,
+    }
+
+
 class Config(BaseModel):
     api_key: str
     project_type: ProjectType
     region: Region
+    # Overrides the regional API URL, e.g. to point at a proxy or a mock server
+    base_url: Optional[str] = None
+    http: HttpConfig = HttpConfig()
+    # Seconds for which `discover` reuses the fields fetched from the API
+    schema_cache_ttl: float = 3600.0
 
 
 class User(BaseModel):
@@ -0,0 +1,40 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# The mock Iterable API is the one the benchmarks run against
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bench"))
+
+from mock_iterable import MockIterableServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_iterable():
+    with MockIterableServer(record_requests=True) as mock:
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep schema caches written by tests out of the user's cache directory."""
+    monkeypatch.setenv("SNOWPILOT_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def config_path(tmp_path, mock_iterable):
+    """A config file pointing the connector at the mock server."""
+    path = tmp_path / "config.json"
+    path.write_text(
+        json.dumps(
+            {
+                "api_key": "test-key",
+                "project_type": "user_id_based",
+                "region": "us",
+                "base_url": mock_iterable.base_url,
+            }
+        )
+    )
+    return path
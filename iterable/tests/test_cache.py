@@ -0,0 +1,28 @@
+"""
+Tests for caching the discovered user schema.
+"""
+
+from typer.testing import CliRunner
+
+from src.main import app
+
+from .conftest import MockIterableServer
+
+runner = CliRunner()
+
+
+def test_discover_reuses_cached_fields(mock_iterable, config_path):
+    """Test that repeated discovers only call users/getFields once."""
+    mock_iterable.handler = lambda request: MockIterableServer.json_response(
+        {"fields": {"email": "string", "signupDate": "date", "visits": "long"}}
+    )
+
+    first = runner.invoke(app, ["--config", str(config_path), "discover"])
+    second = runner.invoke(app, ["--config", str(config_path), "discover"])
+
+    assert first.exit_code == 0, first.output
+    assert first.stdout == second.stdout
+    assert len(mock_iterable.requests) == 1
+
+    runner.invoke(app, ["--config", str(config_path), "discover", "--no-cache"])
+    assert len(mock_iterable.requests) == 2
@@ -0,0 +1,81 @@
+"""
+Tests for the shared HTTP client layer, run against a local mock server.
+"""
+
+import asyncio
+
+import httpx
+
+from src.client import (
+    STARTED_EXTENSION,
+    ClientHooks,
+    build_async_client,
+    build_client,
+)
+from src.models import Config, HttpConfig
+
+
+def make_config(base_url, **http):
+    return Config(
+        api_key="test-key",
+        project_type="user_id_based",
+        region="us",
+        base_url=base_url,
+        http=HttpConfig(**http),
+    )
+
+
+def test_endpoint_timeouts_override_default():
+    """Test that configured endpoints get their own timeout."""
+    http = HttpConfig(timeout=5, endpoint_timeouts={"export/data.json": 120})
+    hooks = ClientHooks("/api/", http)
+
+    export = httpx.Request("GET", "https://example.com/api/export/data.json")
+    fields = httpx.Request("GET", "https://example.com/api/users/getFields")
+    hooks.request(export)
+    hooks.request(fields)
+
+    assert export.extensions["timeout"]["read"] == 120
+    assert "timeout" not in fields.extensions
+
+
+def test_start_time_is_kept_on_the_request():
+    """Test that the start time travels with the request, so the hooks keep
+    nothing for requests that fail without a response."""
+    hooks = ClientHooks("/api/", HttpConfig(), metrics_hooks=[lambda metric: None])
+    request = httpx.Request("GET", "https://example.com/api/users/getFields")
+
+    hooks.request(request)
+
+    assert STARTED_EXTENSION in request.extensions
+
+
+def test_client_reports_metrics(mock_iterable):
+    """Test that the sync client sends credentials and reports each request."""
+    metrics = []
+    config = make_config(mock_iterable.base_url, max_connections=2)
+
+    with build_client(config, metrics_hooks=[metrics.append]) as client:
+        for _ in range(3):
+            client.get("users/getFields").raise_for_status()
+
+    assert [metric.endpoint for metric in metrics] == ["users/getFields"] * 3
+    assert all(metric.status_code == 200 for metric in metrics)
+    assert all(metric.elapsed >= 0 for metric in metrics)
+    assert mock_iterable.requests[0]["headers"]["Api-Key"] == "test-key"
+
+
+def test_async_client_reports_metrics(mock_iterable):
+    """Test that the async client shares the same hooks."""
+    metrics = []
+    config = make_config(mock_iterable.base_url)
+
+    async def run():
+        async with build_async_client(config, metrics_hooks=[metrics.append]) as client:
+            responses = await asyncio.gather(
+                *(client.post("users/bulkUpdate", json={"users": []}) for _ in range(4))
+            )
+            return [response.status_code for response in responses]
+
+    assert asyncio.run(run()) == [200] * 4
+    assert [metric.endpoint for metric in metrics] == ["users/bulkUpdate"] * 4
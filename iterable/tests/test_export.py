@@ -0,0 +1,135 @@
+"""
+Tests for streaming user exports, run against a local mock server.
+"""
+
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from typer.testing import CliRunner
+
+from src.export import (
+    export_params,
+    export_records,
+    line_batches,
+    parallel_export_records,
+    partition_windows,
+)
+from src.main import app
+
+
+def test_line_batches_split_across_chunks():
+    """Test that lines split across chunks are only returned once complete."""
+    chunks = [b'{"userId": "a"}\n{"user', b'Id": "b"}', b'\n{"userId": "c"}']
+
+    assert list(line_batches(iter(chunks))) == [
+        [b'{"userId": "a"}'],
+        [],
+        [b'{"userId": "b"}'],
+        [b'{"userId": "c"}'],
+    ]
+
+
+def test_export_records(mock_iterable):
+    """Test that the export is decoded line by line with the projected fields."""
+    users = [{"userId": f"user_{i}", "email": f"{i}@example.com"} for i in range(1000)]
+    body = "\n".join(json.dumps(user) for user in users).encode()
+    mock_iterable.handler = lambda request: (200, {}, body)
+
+    with httpx.Client(base_url=mock_iterable.base_url) as client:
+        records = list(export_records(client, export_params(["userId", "email"])))
+
+    assert records == users
+    (request,) = mock_iterable.requests
+    assert request["path"] == "/api/export/data.json"
+    assert request["params"]["dataTypeName"] == ["user"]
+    assert request["params"]["onlyFields"] == ["userId", "email"]
+
+
+def test_partition_windows_are_contiguous():
+    """Test that windows cover the range without gaps or overlaps."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 31, 12, tzinfo=timezone.utc)
+
+    windows = partition_windows(start, end, 7)
+
+    assert len(windows) == 7
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, upper), (lower, _) in zip(windows, windows[1:]):
+        assert upper == lower
+
+
+def test_parallel_export_merges_partitions(mock_iterable):
+    """Test that every window is requested and all records are merged."""
+
+    def handler(request):
+        start = request["params"]["startDateTime"][0]
+        lines = [json.dumps({"userId": f"{start}-{i}"}) for i in range(200)]
+        return 200, {}, ("\n".join(lines) + "\n").encode()
+
+    mock_iterable.handler = handler
+    windows = partition_windows(
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+        datetime(2024, 1, 5, tzinfo=timezone.utc),
+        4,
+    )
+
+    with httpx.Client(base_url=mock_iterable.base_url) as client:
+        records = list(parallel_export_records(client, None, windows, concurrency=4))
+
+    assert len(records) == 800
+    starts = sorted(r["params"]["startDateTime"][0] for r in mock_iterable.requests)
+    assert starts == [
+        "2024-01-01 00:00:00",
+        "2024-01-02 00:00:00",
+        "2024-01-03 00:00:00",
+        "2024-01-04 00:00:00",
+    ]
+    assert all("range" not in r["params"] for r in mock_iterable.requests)
+
+
+def test_extract_continues_from_watermark(tmp_path, mock_iterable, config_path):
+    """Test that an extract with a state file starts where the previous ended."""
+    mock_iterable.handler = lambda request: (200, {}, b'{"userId": "a"}\n')
+    state_path = tmp_path / "state.json"
+    args = ["--config", str(config_path), "extract", "-c", "users"]
+    args += ["--state", str(state_path)]
+    runner = CliRunner()
+
+    first = runner.invoke(app, args + ["--end", "2024-03-01T12:00:00"])
+    second = runner.invoke(app, args + ["--end", "2024-03-01T13:00:00"])
+
+    assert first.exit_code == 0, first.output
+    assert second.exit_code == 0, second.output
+    windows = [
+        (request["params"]["startDateTime"], request["params"]["endDateTime"])
+        for request in mock_iterable.requests
+    ]
+    assert windows == [
+        (["2013-01-01 00:00:00"], ["2024-03-01 12:00:00"]),
+        (["2024-03-01 12:00:00"], ["2024-03-01 13:00:00"]),
+    ]
+    cursors = json.loads(state_path.read_text())["cursors"]
+    assert cursors == {"users": {"profileUpdatedAt": "2024-03-01T13:00:00+00:00"}}
+
+
+def test_parallel_export_raises_the_error_of_a_window(mock_iterable):
+    """Test that a failed window fails the whole export."""
+
+    def handler(request):
+        if request["params"]["startDateTime"][0] == "2024-01-02 00:00:00":
+            return 500, {}, b""
+        return 200, {}, b'{"userId": "a"}\n' * 1000
+
+    mock_iterable.handler = handler
+    windows = partition_windows(
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+        datetime(2024, 1, 5, tzinfo=timezone.utc),
+        4,
+    )
+
+    with httpx.Client(base_url=mock_iterable.base_url) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            list(parallel_export_records(client, None, windows, concurrency=2))
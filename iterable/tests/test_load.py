@@ -0,0 +1,126 @@
+"""
+Tests for the Iterable load command, run against a local mock server.
+"""
+
+import json
+
+import httpx
+from typer.testing import CliRunner
+
+from src.main import app
+
+from .conftest import MockIterableServer
+
+runner = CliRunner()
+
+
+def test_load_sends_invalid_records_to_dead_letter(
+    tmp_path, mock_iterable, config_path
+):
+    """Test that records failing the upsert schema are set aside, not uploaded."""
+    mock_iterable.handler = lambda request: MockIterableServer.json_response(
+        {"successCount": 2, "failCount": 0}
+    )
+    dead_letter = tmp_path / "dead_letter.jsonl"
+    records = [
+        {"userId": "user_1", "email": "one@example.com"},
+        {"email": "missing-id@example.com"},
+        {"userId": "user_3", "dataFields": {"plan": "pro"}},
+    ]
+
+    result = runner.invoke(
+        app,
+        [
+            "--config",
+            str(config_path),
+            "load",
+            "--collection",
+            "users",
+            "--operation",
+            "upsert",
+            "--dead-letter",
+            str(dead_letter),
+        ],
+        input="".join(json.dumps(record) + "\n" for record in records),
+    )
+
+    assert result.exit_code == 0, result.output
+    (request,) = mock_iterable.requests
+    sent = json.loads(request["body"])["users"]
+    assert [user["userId"] for user in sent] == ["user_1", "user_3"]
+    assert all(user["preferUserId"] for user in sent)
+    (rejected,) = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert rejected["record"] == records[1]
+    assert rejected["errors"][0]["loc"] == ["userId"]
+
+
+def test_resume_skips_accepted_batches(tmp_path, mock_iterable, config_path):
+    """Test that a resumed load only sends the records after the checkpoint."""
+    failing = {"user_3"}
+
+    def handler(request):
+        users = json.loads(request["body"])["users"]
+        if failing & {user["userId"] for user in users}:
+            return MockIterableServer.json_response({"msg": "Bad request"}, status=400)
+        return MockIterableServer.json_response({"successCount": len(users)})
+
+    mock_iterable.handler = handler
+    checkpoint = tmp_path / "load.checkpoint"
+    records = [{"userId": f"user_{i}"} for i in range(1, 7)]
+    args = ["--config", str(config_path), "load", "-c", "users", "-o", "upsert"]
+    args += ["--batch-size", "2", "--concurrency", "1"]
+    args += ["--checkpoint", str(checkpoint)]
+    input = "".join(json.dumps(record) + "\n" for record in records)
+
+    failed = runner.invoke(app, args, input=input)
+
+    assert failed.exit_code == 1
+    assert "Iterable rejected a batch" in failed.output
+    assert not isinstance(failed.exception, httpx.HTTPStatusError)
+    assert json.loads(checkpoint.read_text())["offset"] == 2
+
+    failing.clear()
+    mock_iterable.requests.clear()
+    resumed = runner.invoke(app, args + ["--resume"], input=input)
+
+    assert resumed.exit_code == 0, resumed.output
+    sent = [
+        user["userId"]
+        for request in mock_iterable.requests
+        for user in json.loads(request["body"])["users"]
+    ]
+    assert sent == ["user_3", "user_4", "user_5", "user_6"]
+    assert json.loads(checkpoint.read_text())["offset"] == 6
+
+
+def test_load_reports_metrics(tmp_path, mock_iterable, config_path):
+    """Test that --metrics writes a summary of rows, requests and stages."""
+    statuses = iter([429])
+
+    def handler(request):
+        if next(statuses, 200) == 429:
+            return MockIterableServer.json_response({}, 429, {"Retry-After": "0"})
+        return MockIterableServer.json_response({"successCount": 2, "failCount": 0})
+
+    mock_iterable.handler = handler
+    metrics_path = tmp_path / "metrics.jsonl"
+    records = [{"userId": "user_1"}, {"userId": "user_2"}]
+
+    result = runner.invoke(
+        app,
+        ["--config", str(config_path), "--metrics", str(metrics_path)]
+        + ["load", "-c", "users", "-o", "upsert"],
+        input="".join(json.dumps(record) + "\n" for record in records),
+    )
+
+    assert result.exit_code == 0, result.output
+    (summary,) = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert summary["command"] == "load"
+    counters = summary["counters"]
+    assert counters["rows_in"] == 2
+    assert counters["rows_out"] == 2
+    assert counters["http_retries"] == 1
+    assert counters["http_status.429"] == 1
+    assert summary["histograms"]["http_latency.users/bulkUpdate"]["count"] == 2
+    assert summary["histograms"]["batch_latency"]["count"] == 1
+    assert {"decode", "validate", "encode"} <= set(summary["stages"])
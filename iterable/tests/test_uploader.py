@@ -0,0 +1,217 @@
+"""
+Tests for the batching bulk uploader, run against a local mock server.
+"""
+
+import asyncio
+import gc
+import json
+
+import httpx
+import pytest
+from snowpilot_core.checkpoint import Acknowledgements
+
+from src.async_uploader import (
+    AdaptiveConcurrency,
+    AsyncBulkUploader,
+    TokenBucket,
+    iter_batches,
+)
+
+from .conftest import MockIterableServer
+
+
+def users(count):
+    return [{"userId": f"user_{i}", "dataFields": {"n": i}} for i in range(count)]
+
+
+def unlimited():
+    return TokenBucket(rate=1_000_000)
+
+
+def test_iter_batches_respects_count_and_size():
+    """Test that batches are cut by record count and by encoded body size."""
+    records = users(10)
+
+    by_count = list(iter_batches(records, max_records=4, max_bytes=1 << 20))
+    assert [len(batch) for batch in by_count] == [4, 4, 2]
+
+    by_size = list(iter_batches(records, max_records=100, max_bytes=120))
+    assert sum(len(batch) for batch in by_size) == 10
+    for batch in by_size:
+        assert len(b'{"users":[' + b",".join(batch) + b"]}") <= 120
+
+
+def test_token_bucket_waits_for_tokens():
+    """Test that acquiring past the capacity waits for the refill."""
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+
+    assert sum(sleeps) == pytest.approx(1.0)
+
+
+def async_upload(mock_iterable, records, **options):
+    async def upload():
+        async with httpx.AsyncClient(base_url=mock_iterable.base_url) as client:
+            uploader = AsyncBulkUploader(client, rate_limiter=unlimited(), **options)
+            return uploader, await uploader.upload(iter(records))
+
+    return asyncio.run(upload())
+
+
+def test_adaptive_concurrency_increases_additively_and_decreases_once():
+    """Test that fast requests grow the limit and congestion halves it once."""
+    limit = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(4):
+        limit.update(0, latency=0.1, throttled=False)
+    assert limit.limit == pytest.approx(5, abs=0.1)
+
+    # Requests sent before the decrease do not decrease it again
+    limit.update(0, latency=None, throttled=True)
+    limit.update(0, latency=1.0, throttled=False)
+    assert limit.limit == pytest.approx(2.5, abs=0.1)
+
+    limit.update(1, latency=1.0, throttled=False)
+    assert limit.limit == pytest.approx(1.25, abs=0.1)
+    limit.update(2, latency=None, throttled=True)
+    assert limit.limit == 1
+
+
+def test_async_upload_sends_every_record_once(mock_iterable):
+    """Test that the async engine sends each record in a single batch."""
+    _, result = async_upload(mock_iterable, users(50), max_records=7, concurrency=3)
+
+    assert result.batches == 8
+    assert result.records == 50
+    assert result.success_count == 50
+    sent = [
+        user["userId"]
+        for request in mock_iterable.requests
+        for user in json.loads(request["body"])["users"]
+    ]
+    assert sorted(sent) == sorted(user["userId"] for user in users(50))
+    assert all(
+        request["path"] == "/api/users/bulkUpdate" for request in mock_iterable.requests
+    )
+
+
+def test_async_upload_retries_throttled_requests(mock_iterable):
+    """Test that 429 and 5xx responses are retried until they succeed."""
+    statuses = iter([429, 503])
+
+    def handler(request):
+        status = next(statuses, 200)
+        if status != 200:
+            return MockIterableServer.json_response(
+                {"msg": "slow down"}, status, {"Retry-After": "0"}
+            )
+        return MockIterableServer.json_response({"successCount": 3, "failCount": 0})
+
+    mock_iterable.handler = handler
+
+    _, result = async_upload(mock_iterable, users(3), concurrency=1)
+
+    assert len(mock_iterable.requests) == 3
+    assert result.success_count == 3
+
+
+def test_async_upload_gives_up_after_max_retries(mock_iterable):
+    """Test that a batch failing past the retry budget raises."""
+    mock_iterable.handler = lambda request: MockIterableServer.json_response({}, 500)
+
+    async def no_sleep(seconds):
+        pass
+
+    with pytest.raises(httpx.HTTPStatusError):
+        async_upload(
+            mock_iterable, users(1), concurrency=1, max_retries=2, sleep=no_sleep
+        )
+
+    assert len(mock_iterable.requests) == 3
+
+
+def test_async_upload_backs_off_when_throttled(mock_iterable):
+    """Test that a 429 is retried and lowers the requests in flight."""
+    statuses = iter([429])
+
+    def handler(request):
+        if next(statuses, 200) == 429:
+            return MockIterableServer.json_response({}, 429, {"Retry-After": "0"})
+        users = json.loads(request["body"])["users"]
+        return MockIterableServer.json_response({"successCount": len(users)})
+
+    mock_iterable.handler = handler
+
+    uploader, result = async_upload(
+        mock_iterable, users(5), max_records=5, concurrency=4
+    )
+
+    assert len(mock_iterable.requests) == 2
+    assert result.success_count == 5
+    assert uploader.concurrency.limit < 4
+
+
+def test_async_upload_stops_reading_input_on_failure(mock_iterable):
+    """Test that a failed batch raises and stops the producer thread."""
+    mock_iterable.handler = lambda request: MockIterableServer.json_response({}, 400)
+    read = []
+
+    def records():
+        for record in users(10_000):
+            read.append(record)
+            yield record
+
+    with pytest.raises(httpx.HTTPStatusError):
+        async_upload(mock_iterable, records(), max_records=10, queue_size=1)
+
+    assert len(read) < 10_000
+
+
+def test_async_upload_collects_every_batch_done():
+    """Test that batches finishing with a failed one are acknowledged, and the
+    errors of the others retrieved."""
+    arrived = 0
+    ready = asyncio.Event()
+
+    async def handler(request):
+        nonlocal arrived
+        arrived += 1
+        if arrived == 4:
+            ready.set()
+        # Every batch finishes at once, two of them failing
+        await ready.wait()
+        first = json.loads(request.content)["users"][0]["userId"]
+        if first in ("user_1", "user_2"):
+            return httpx.Response(400, json={})
+        return httpx.Response(200, json={"successCount": 1})
+
+    unretrieved = []
+    acknowledgements = Acknowledgements(checkpoint=None)
+
+    async def upload():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: unretrieved.append(context)
+        )
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://iterable"
+        ) as client:
+            uploader = AsyncBulkUploader(
+                client, max_records=1, concurrency=4, rate_limiter=unlimited()
+            )
+            with pytest.raises(httpx.HTTPStatusError):
+                await uploader.upload(iter(users(4)), acknowledgements)
+        gc.collect()
+
+    asyncio.run(upload())
+
+    assert unretrieved == []
+    assert acknowledgements.committed == 1
+    assert acknowledgements.acknowledged == {3}
@@ -0,0 +1,2 @@
+# Must run before typer is imported, see snowpilot_core.startup
+import snowpilot_core.startup  # noqa: F401
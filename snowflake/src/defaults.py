@@ -0,0 +1,12 @@
+"""Defaults of command-line options.
+
+Kept apart from the modules using them, which import pydantic and orjson, so
+that the CLI can be built without importing those.
+"""
+
+# Result chunks fetched at once by `extract`
+DEFAULT_CONCURRENCY = 4
+
+# Uncompressed bytes per part file. Snowflake loads fastest from compressed
+# files of roughly 100-250 MB; CSV typically compresses 3-5x.
+DEFAULT_PART_BYTES = 512 * 1024 * 1024
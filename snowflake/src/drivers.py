@@ -0,0 +1,502 @@
+import csv
+import gzip
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Sequence
+
+from src.models import Config
+
+# Marker written to staged files for SQL NULL
+NULL_MARKER = "\\N"
+# Column appended to staged rows, recording their position in the input so
+# that the last of several records with the same key wins
+SEQUENCE_COLUMN = "_snowpilot_seq"
+
+SIMPLE_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+
+# Rows per chunk when a driver splits a table into key ranges
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Fetches one chunk of a result set, as a list of row tuples
+ChunkFetcher = Callable[[], List[tuple]]
+# Fetches one chunk of a result set, as an Arrow table or record batch
+ArrowChunkFetcher = Callable[[], Any]
+
+# Formats of staged part files
+PART_FORMATS = ["csv", "parquet"]
+
+
+class Range(NamedTuple):
+    """The rows whose `column` is from `low`, if set, to `high`, inclusive."""
+
+    column: str
+    low: Any
+    high: Any
+
+
+def range_condition(rows: Range, placeholder: str) -> tuple[str, List[Any]]:
+    """Build the SQL condition selecting a range of rows, and its parameters."""
+    column = quote_identifier(rows.column)
+    if rows.low is None:
+        return f"{column} <= {placeholder}", [rows.high]
+    return (
+        f"{column} >= {placeholder} AND {column} <= {placeholder}",
+        [rows.low, rows.high],
+    )
+
+
+class ColumnInfo(NamedTuple):
+    table: str
+    column: str
+    data_type: str
+    scale: Optional[int]
+    nullable: bool
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an identifier unless it can be used as is.
+
+    Simple identifiers are left unquoted so that the database resolves them
+    case-insensitively, e.g. `email` matches a Snowflake column `EMAIL`.
+    """
+    if SIMPLE_IDENTIFIER.fullmatch(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_list(columns: Sequence[str], prefix: str = "") -> str:
+    return ", ".join(prefix + quote_identifier(column) for column in columns)
+
+
+def key_condition(keys: Sequence[str], left: str, right: str) -> str:
+    return " AND ".join(
+        f"{left}.{quote_identifier(key)} = {right}.{quote_identifier(key)}"
+        for key in keys
+    )
+
+
+def read_parquet_rows(path: Path, columns: Sequence[str]) -> Iterator[tuple]:
+    import pyarrow.parquet
+
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(columns=list(columns)):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+class Driver(ABC):
+    """The database operations needed to bulk load staged files.
+
+    `BulkLoader` only talks to the database through this interface, so the
+    same load engine runs against Snowflake and against local stand-ins.
+    """
+
+    @abstractmethod
+    def create_stage(self) -> str:
+        """Create a temporary stage for part files and return its name."""
+
+    @abstractmethod
+    def put(self, path: Path, stage: str):
+        """Upload a part file (gzipped CSV or Parquet) to the stage."""
+
+    @abstractmethod
+    def create_temp_table(self, like: str, columns: Sequence[str]) -> str:
+        """Create a temporary table holding `columns` of `like`, plus a
+        sequence column, and return its name."""
+
+    @abstractmethod
+    def copy_into(
+        self, table: str, stage: str, columns: Sequence[str], part_format: str = "csv"
+    ):
+        """Load every file of the stage into `columns` of the table.
+
+        Parquet parts are matched to the columns by name, CSV parts by position.
+        """
+
+    @abstractmethod
+    def apply(
+        self,
+        operation: str,
+        table: str,
+        source: str,
+        columns: Sequence[str],
+        keys: Sequence[str],
+    ):
+        """Apply the rows staged in `source` to `table` for a keyed operation
+        (`upsert`, `update` or `delete`). Of several rows with the same key,
+        only the one with the highest sequence number is applied."""
+
+    @abstractmethod
+    def columns(self) -> List[ColumnInfo]:
+        """List the columns of every table in the current schema, in order, with
+        a single query."""
+
+    @abstractmethod
+    def max_value(self, table: str, column: str) -> Any:
+        """Return the highest value of a column, None if the table is empty."""
+
+    @abstractmethod
+    def result_chunks(
+        self, table: str, columns: Sequence[str], rows: Optional[Range] = None
+    ) -> List[ChunkFetcher]:
+        """Split a read of `columns` of the table into chunks.
+
+        Every row is read, or only those in `rows`. The fetchers are
+        independent of each other, so they can run on several threads at
+        once; concatenated in order they return every row.
+        """
+
+    def arrow_chunks(
+        self,
+        table: str,
+        columns: Sequence[str],
+        schema: Any,
+        rows: Optional[Range] = None,
+    ) -> List[ArrowChunkFetcher]:
+        """Like `result_chunks`, but each chunk is a record batch of `schema`.
+
+        The default converts the row tuples of `result_chunks`; drivers that can
+        fetch Arrow data directly override it.
+        """
+        from snowpilot_core.arrow import rows_to_batch
+
+        return [
+            lambda fetch=fetch: rows_to_batch(fetch(), schema)
+            for fetch in self.result_chunks(table, columns, rows)
+        ]
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SnowflakeDriver(Driver):
+    # NULL is staged as NULL_MARKER, so empty fields are empty strings
+    FILE_FORMAT = (
+        "TYPE = CSV COMPRESSION = GZIP FIELD_OPTIONALLY_ENCLOSED_BY = '\"' "
+        "ESCAPE_UNENCLOSED_FIELD = NONE NULL_IF = ('\\\\N') "
+        "EMPTY_FIELD_AS_NULL = FALSE"
+    )
+
+    def __init__(self, config: Config):
+        # Imported here so that the other drivers work without the Snowflake
+        # client installed
+        import snowflake.connector
+
+        self.connection = snowflake.connector.connect(
+            user=config.user,
+            password=config.password,
+            account=config.account,
+            warehouse=config.warehouse,
+            database=config.database,
+            schema=config.schema,
+            application="Snowpilot",
+        )
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def create_stage(self) -> str:
+        name = f"snowpilot_stage_{uuid.uuid4().hex}"
+        self.execute(
+            f"CREATE TEMPORARY STAGE {name} FILE_FORMAT = ({self.FILE_FORMAT})"
+        )
+        return name
+
+    def put(self, path: Path, stage: str):
+        # Parts are already compressed; PUT only has to transfer them
+        self.execute(
+            f"PUT 'file://{path.as_posix()}' @{stage} AUTO_COMPRESS = FALSE PARALLEL = 4"
+        )
+
+    def create_temp_table(self, like: str, columns: Sequence[str]) -> str:
+        name = f"snowpilot_temp_{uuid.uuid4().hex}"
+        self.execute(
+            f"CREATE TEMPORARY TABLE {name} AS "
+            f"SELECT {column_list(columns)}, 0::NUMBER AS {SEQUENCE_COLUMN} "
+            f"FROM {quote_identifier(like)} WHERE FALSE"
+        )
+        return name
+
+    def copy_into(
+        self, table: str, stage: str, columns: Sequence[str], part_format: str = "csv"
+    ):
+        if part_format == "parquet":
+            # Each Parquet row is a single variant; pick the fields by name
+            fields = ", ".join(
+                "$1:" + '"' + column.replace('"', '""') + '"' for column in columns
+            )
+            source = f"(SELECT {fields} FROM @{stage})"
+            file_format = "TYPE = PARQUET"
+        else:
+            source = f"@{stage}"
+            file_format = self.FILE_FORMAT
+        self.execute(
+            f"COPY INTO {quote_identifier(table)} ({column_list(columns)}) "
+            f"FROM {source} FILE_FORMAT = ({file_format}) "
+            "ON_ERROR = ABORT_STATEMENT PURGE = TRUE"
+        )
+
+    def apply(
+        self,
+        operation: str,
+        table: str,
+        source: str,
+        columns: Sequence[str],
+        keys: Sequence[str],
+    ):
+        latest = (
+            f"(SELECT * FROM {source} QUALIFY ROW_NUMBER() OVER "
+            f"(PARTITION BY {column_list(keys)} ORDER BY {SEQUENCE_COLUMN} DESC) = 1)"
+        )
+        values = [column for column in columns if column not in keys]
+        update = ", ".join(
+            f"t.{quote_identifier(column)} = s.{quote_identifier(column)}"
+            for column in values
+        )
+        # With only key columns, matched rows have nothing to update
+        matched = f"WHEN MATCHED THEN UPDATE SET {update} " if values else ""
+        clauses = {
+            "upsert": (
+                f"{matched}WHEN NOT MATCHED THEN INSERT ({column_list(columns)}) "
+                f"VALUES ({column_list(columns, 's.')})"
+            ),
+            "update": matched,
+            "delete": "WHEN MATCHED THEN DELETE",
+        }
+        if not clauses[operation]:
+            return
+        self.execute(
+            f"MERGE INTO {quote_identifier(table)} t USING {latest} s "
+            f"ON {key_condition(keys, 't', 's')} {clauses[operation]}"
+        )
+
+    def columns(self) -> List[ColumnInfo]:
+        rows = self.execute(
+            "SELECT table_name, column_name, data_type, numeric_scale, is_nullable "
+            "FROM information_schema.columns "
+            "WHERE table_schema = CURRENT_SCHEMA() "
+            "ORDER BY table_name, ordinal_position"
+        )
+        return [
+            ColumnInfo(table, column, data_type, scale, nullable == "YES")
+            for table, column, data_type, scale, nullable in rows
+        ]
+
+    def select(self, table: str, columns: Sequence[str], rows: Optional[Range]):
+        """Run a read of the table, returning its result batches."""
+        sql = f"SELECT {column_list(columns)} FROM {quote_identifier(table)}"
+        params: List[Any] = []
+        if rows is not None:
+            condition, params = range_condition(rows, "%s")
+            sql += f" WHERE {condition}"
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.get_result_batches()
+
+    def max_value(self, table: str, column: str) -> Any:
+        ((value,),) = self.execute(
+            f"SELECT MAX({quote_identifier(column)}) FROM {quote_identifier(table)}"
+        )
+        return value
+
+    def result_chunks(
+        self, table: str, columns: Sequence[str], rows: Optional[Range] = None
+    ) -> List[ChunkFetcher]:
+        batches = self.select(table, columns, rows)
+        # Result batches are downloaded separately from cloud storage, so
+        # they can be fetched in parallel
+        return [lambda batch=batch: list(batch.create_iter()) for batch in batches]
+
+    def arrow_chunks(
+        self,
+        table: str,
+        columns: Sequence[str],
+        schema: Any,
+        rows: Optional[Range] = None,
+    ) -> List[ArrowChunkFetcher]:
+        batches = self.select(table, columns, rows)
+        # Result batches are downloaded as Arrow, so they need no conversion
+        # beyond casting to the discovered types
+        return [
+            lambda batch=batch: batch.to_arrow()
+            .rename_columns(list(columns))
+            .cast(schema)
+            for batch in batches
+        ]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteDriver(Driver):
+    """Local stand-in for Snowflake, backed by SQLite.
+
+    The stage is a temporary directory, PUT copies files into it and COPY INTO
+    reads them back with the csv module. Reads are split into rowid ranges; for
+    database files each chunk is read through its own connection.
+    """
+
+    # Like Snowflake, read empty fields as NULL unless the file format says not to
+    empty_field_as_null = (
+        "EMPTY_FIELD_AS_NULL = FALSE" not in SnowflakeDriver.FILE_FORMAT
+    )
+
+    def __init__(
+        self, database: str = ":memory:", chunk_rows: int = DEFAULT_CHUNK_ROWS
+    ):
+        self.database = database
+        self.chunk_rows = chunk_rows
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.stages: List[Path] = []
+        self._lock = threading.Lock()
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        return self.connection.execute(sql, params).fetchall()
+
+    def create_stage(self) -> str:
+        stage = Path(tempfile.mkdtemp(prefix="snowpilot_stage_"))
+        self.stages.append(stage)
+        return str(stage)
+
+    def put(self, path: Path, stage: str):
+        shutil.copy(path, stage)
+
+    def create_temp_table(self, like: str, columns: Sequence[str]) -> str:
+        name = f"snowpilot_temp_{uuid.uuid4().hex}"
+        self.execute(
+            f"CREATE TEMP TABLE {name} AS "
+            f"SELECT {column_list(columns)}, 0 AS {SEQUENCE_COLUMN} "
+            f"FROM {quote_identifier(like)} WHERE 0"
+        )
+        return name
+
+    def copy_into(
+        self, table: str, stage: str, columns: Sequence[str], part_format: str = "csv"
+    ):
+        placeholders = ", ".join("?" for _ in columns)
+        sql = (
+            f"INSERT INTO {quote_identifier(table)} ({column_list(columns)}) "
+            f"VALUES ({placeholders})"
+        )
+        nulls = {NULL_MARKER, ""} if self.empty_field_as_null else {NULL_MARKER}
+        for path in sorted(Path(stage).iterdir()):
+            if part_format == "parquet":
+                self.connection.executemany(sql, read_parquet_rows(path, columns))
+            else:
+                with gzip.open(path, "rt", newline="") as f:
+                    rows = (
+                        [None if value in nulls else value for value in row]
+                        for row in csv.reader(f)
+                    )
+                    self.connection.executemany(sql, rows)
+            path.unlink()
+
+    def apply(
+        self,
+        operation: str,
+        table: str,
+        source: str,
+        columns: Sequence[str],
+        keys: Sequence[str],
+    ):
+        table = quote_identifier(table)
+        latest = (
+            f"SELECT {column_list(columns)} FROM {source} WHERE {SEQUENCE_COLUMN} IN "
+            f"(SELECT MAX({SEQUENCE_COLUMN}) FROM {source} GROUP BY {column_list(keys)})"
+        )
+        values = [column for column in columns if column not in keys]
+        if operation == "upsert":
+            update = ", ".join(
+                f"{quote_identifier(column)} = excluded.{quote_identifier(column)}"
+                for column in values
+            )
+            conflict = f"DO UPDATE SET {update}" if update else "DO NOTHING"
+            self.execute(
+                f"INSERT INTO {table} ({column_list(columns)}) {latest} "
+                f"ON CONFLICT ({column_list(keys)}) {conflict}"
+            )
+        elif operation == "update" and values:
+            update = ", ".join(
+                f"{quote_identifier(column)} = s.{quote_identifier(column)}"
+                for column in values
+            )
+            self.execute(
+                f"UPDATE {table} AS t SET {update} FROM ({latest}) AS s "
+                f"WHERE {key_condition(keys, 't', 's')}"
+            )
+        elif operation == "delete":
+            self.execute(
+                f"DELETE FROM {table} AS t WHERE EXISTS "
+                f"(SELECT 1 FROM {source} AS s WHERE {key_condition(keys, 't', 's')})"
+            )
+
+    def columns(self) -> List[ColumnInfo]:
+        rows = self.execute(
+            'SELECT m.name, p.name, p.type, NOT p."notnull" AND NOT p.pk '
+            "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+            "WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' "
+            "ORDER BY m.name, p.cid"
+        )
+        return [
+            ColumnInfo(table, column, data_type, None, bool(nullable))
+            for table, column, data_type, nullable in rows
+        ]
+
+    def max_value(self, table: str, column: str) -> Any:
+        ((value,),) = self.execute(
+            f"SELECT MAX({quote_identifier(column)}) FROM {quote_identifier(table)}"
+        )
+        return value
+
+    def read_range(
+        self, sql: str, start: int, params: Sequence[Any] = ()
+    ) -> List[tuple]:
+        params = (start, start + self.chunk_rows, *params)
+        if self.database == ":memory:":
+            # An in-memory database only exists on its own connection
+            with self._lock:
+                return self.connection.execute(sql, params).fetchall()
+        with sqlite3.connect(self.database) as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def result_chunks(
+        self, table: str, columns: Sequence[str], rows: Optional[Range] = None
+    ) -> List[ChunkFetcher]:
+        table = quote_identifier(table)
+        ((low, high),) = self.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}")
+        if low is None:
+            return []
+        sql = (
+            f"SELECT {column_list(columns)} FROM {table} "
+            "WHERE rowid >= ? AND rowid < ?"
+        )
+        params: List[Any] = []
+        if rows is not None:
+            condition, params = range_condition(rows, "?")
+            sql += f" AND {condition}"
+        sql += " ORDER BY rowid"
+        return [
+            lambda start=start: self.read_range(sql, start, params)
+            for start in range(low, high + 1, self.chunk_rows)
+        ]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        for stage in self.stages:
+            shutil.rmtree(stage, ignore_errors=True)
+        self.connection.close()
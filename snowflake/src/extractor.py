@@ -0,0 +1,127 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from pydantic import create_model
+from snowpilot_core.metrics import metrics
+
+from src.defaults import DEFAULT_CONCURRENCY
+from src.drivers import ChunkFetcher, ColumnInfo, Driver, Range
+from src.models import Schema
+
+
+def sql_type_to_pydantic_type(data_type: str, scale: Optional[int] = None) -> type:
+    """Map a Snowflake (or stand-in) column type to a Python type."""
+    data_type = data_type.upper()
+    if data_type in ("NUMBER", "DECIMAL", "NUMERIC", "FIXED"):
+        return int if not scale else float
+    if "INT" in data_type:
+        return int
+    if any(name in data_type for name in ("FLOAT", "DOUBLE", "REAL")):
+        return float
+    if "BOOL" in data_type:
+        return bool
+    if "TIMESTAMP" in data_type or data_type == "DATETIME":
+        return datetime
+    if data_type == "DATE":
+        return date
+    if data_type == "TIME":
+        return time
+    if data_type in ("VARIANT", "OBJECT"):
+        return dict
+    if data_type == "ARRAY":
+        return list
+    return str
+
+
+def build_schemas(columns: Iterable[ColumnInfo]) -> Dict[str, Schema]:
+    """Build one row model per table from the rows of a single column listing."""
+    tables: Dict[str, Dict[str, Any]] = {}
+    for info in columns:
+        annotation = sql_type_to_pydantic_type(info.data_type, info.scale)
+        fields = tables.setdefault(info.table, {})
+        if info.nullable:
+            fields[info.column] = (Optional[annotation], None)
+        else:
+            fields[info.column] = (annotation, ...)
+    return {
+        table: create_model(f"{table}_schema", **fields)
+        for table, fields in tables.items()
+    }
+
+
+def ordered_chunks(
+    fetchers: Iterable[ChunkFetcher], concurrency: int = DEFAULT_CONCURRENCY
+) -> Iterator[List[tuple]]:
+    """Fetch chunks on several threads, yielding them in their original order.
+
+    At most `concurrency` chunks are fetched ahead of the consumer, which bounds
+    memory to a few chunks however large the table is.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for fetcher in fetchers:
+            pending.append(executor.submit(fetcher))
+            if len(pending) >= concurrency:
+                yield fetched(pending.popleft())
+        while pending:
+            yield fetched(pending.popleft())
+
+
+def fetched(future: Future) -> List[tuple]:
+    # The time spent waiting for chunks is the fetching not overlapped
+    with metrics.stage("fetch_wait"):
+        chunk = future.result()
+    metrics.count("chunks")
+    metrics.count("rows_in", len(chunk))
+    return chunk
+
+
+def extract_records(
+    driver: Driver,
+    table: str,
+    columns: Sequence[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rows: Optional[Range] = None,
+) -> Iterator[Dict[str, Any]]:
+    chunks = driver.result_chunks(table, columns, rows)
+    for chunk in ordered_chunks(chunks, concurrency):
+        for row in chunk:
+            yield dict(zip(columns, row))
+
+
+def extract_batches(
+    driver: Driver,
+    table: str,
+    columns: Sequence[str],
+    schema: Any,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rows: Optional[Range] = None,
+) -> Iterator[Any]:
+    """Yield the table as Arrow record batches (or tables) of `schema`."""
+    chunks = driver.arrow_chunks(table, columns, schema, rows)
+    yield from ordered_chunks(chunks, concurrency)
+
+
+def cursor_value(value: Any) -> Any:
+    """Convert the value of a replication key for a JSON state file.
+
+    Temporal values are kept as ISO strings, which the database casts back
+    when they are compared with the column.
+    """
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_default(value: Any) -> Any:
+    """Serialize values orjson has no native encoding for."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
@@ -0,0 +1,295 @@
+import csv
+import gzip
+import io
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import orjson
+from pydantic import BaseModel
+from snowpilot_core.metrics import metrics
+
+from src.defaults import DEFAULT_PART_BYTES
+from src.drivers import NULL_MARKER, SEQUENCE_COLUMN, Driver
+
+OPERATIONS = ["insert", "upsert", "update", "delete"]
+KEYED_OPERATIONS = ["upsert", "update", "delete"]
+
+# Finished parts waiting for upload before spooling pauses
+DEFAULT_MAX_PENDING_PARTS = 2
+
+
+class LoadResult(BaseModel):
+    rows: int = 0
+    parts: int = 0
+
+
+def encode_value(value: Any) -> Any:
+    """Convert a JSON value to a CSV field Snowflake parses back to the same value."""
+    if value is None:
+        return NULL_MARKER
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    return value
+
+
+class PartSpooler:
+    """Write records to gzipped CSV part files of bounded size."""
+
+    part_format = "csv"
+
+    def __init__(
+        self,
+        directory: Path,
+        columns: Sequence[str],
+        max_part_bytes: int = DEFAULT_PART_BYTES,
+        with_sequence: bool = False,
+    ):
+        self.directory = directory
+        self.columns = list(columns)
+        self.max_part_bytes = max_part_bytes
+        self.with_sequence = with_sequence
+        self.rows = 0
+        self.parts = 0
+
+    def spool(self, records: Iterable[Dict[str, Any]]) -> Iterator[Path]:
+        """Yield the path of each part file as soon as it is complete."""
+        columns = self.columns
+        part: Optional[Path] = None
+        for record in records:
+            if part is None:
+                part = self.directory / f"part_{self.parts:06d}.csv.gz"
+                self.parts += 1
+                raw = gzip.open(part, "wb", compresslevel=1)
+                text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                writer = csv.writer(text, lineterminator="\n")
+                written = 0
+
+            row = [encode_value(record.get(column)) for column in columns]
+            if self.with_sequence:
+                row.append(self.rows)
+            # Characters written, the uncompressed size of ASCII rows
+            written += writer.writerow(row)
+            self.rows += 1
+
+            if written >= self.max_part_bytes:
+                text.close()
+                yield part
+                part = None
+
+        if part is not None:
+            text.close()
+            yield part
+
+
+class ParquetPartSpooler:
+    """Write Arrow record batches to Parquet part files of bounded size.
+
+    Batches are written as they are, column by column, so no value is
+    converted to text on either side of the stage.
+    """
+
+    part_format = "parquet"
+
+    def __init__(
+        self,
+        directory: Path,
+        columns: Sequence[str],
+        max_part_bytes: int = DEFAULT_PART_BYTES,
+        with_sequence: bool = False,
+    ):
+        self.directory = directory
+        self.columns = list(columns)
+        self.max_part_bytes = max_part_bytes
+        self.with_sequence = with_sequence
+        self.rows = 0
+        self.parts = 0
+
+    def spool(self, batches: Iterable[Any]) -> Iterator[Path]:
+        """Yield the path of each part file as soon as it is complete."""
+        import pyarrow
+        import pyarrow.parquet
+
+        part: Optional[Path] = None
+        for batch in batches:
+            if not batch.num_rows:
+                continue
+            batch = batch.select(self.columns)
+            if self.with_sequence:
+                sequence = pyarrow.array(
+                    range(self.rows, self.rows + batch.num_rows), pyarrow.int64()
+                )
+                batch = batch.append_column(SEQUENCE_COLUMN, sequence)
+
+            if part is None:
+                part = self.directory / f"part_{self.parts:06d}.parquet"
+                self.parts += 1
+                writer = pyarrow.parquet.ParquetWriter(part, batch.schema)
+                written = 0
+
+            writer.write_batch(batch)
+            self.rows += batch.num_rows
+            # In-memory size, comparable to the uncompressed size of CSV parts
+            written += batch.nbytes
+
+            if written >= self.max_part_bytes:
+                writer.close()
+                yield part
+                part = None
+
+        if part is not None:
+            writer.close()
+            yield part
+
+
+class BulkLoader:
+    """Load records by staging compressed part files instead of row inserts.
+
+    Records are spooled into gzipped CSV parts. Each finished part is uploaded
+    (PUT) by a background thread while the next one is written, and deleted
+    locally once staged, so disk use stays bounded. The staged files are then
+    applied with a single COPY INTO, into the target table for inserts or into
+    a temporary table followed by MERGE for keyed operations.
+    """
+
+    def __init__(
+        self,
+        driver: Driver,
+        spool_dir: Optional[str] = None,
+        max_part_bytes: int = DEFAULT_PART_BYTES,
+        max_pending_parts: int = DEFAULT_MAX_PENDING_PARTS,
+    ):
+        self.driver = driver
+        self.spool_dir = spool_dir
+        self.max_part_bytes = max_part_bytes
+        self.max_pending_parts = max_pending_parts
+
+    def stage_parts(self, parts: Iterable[Path], stage: str):
+        def put(part: Path):
+            size = part.stat().st_size
+            started = time.monotonic()
+            with metrics.stage("put"):
+                self.driver.put(part, stage)
+            metrics.observe("put_latency", time.monotonic() - started)
+            metrics.count("parts")
+            metrics.count("bytes_out", size)
+            part.unlink()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending: List[Future] = []
+            for part in parts:
+                pending.append(executor.submit(put, part))
+                # Wait for the oldest upload instead of spooling ahead
+                while len(pending) > self.max_pending_parts:
+                    pending.pop(0).result()
+            for future in pending:
+                future.result()
+
+    def check_operation(self, operation: str, keys: Optional[Sequence[str]]):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unsupported operation: {operation}")
+        if operation in KEYED_OPERATIONS and not keys:
+            raise ValueError(f"The {operation} operation requires key columns")
+
+    def apply_parts(
+        self,
+        table: str,
+        operation: str,
+        spooler,
+        source: Iterable[Any],
+        keys: Optional[Sequence[str]],
+    ):
+        """Stage the parts spooled from `source` and apply them to the table."""
+        columns = spooler.columns
+        stage = self.driver.create_stage()
+        self.stage_parts(metrics.timed("spool", spooler.spool(source)), stage)
+
+        part_format = spooler.part_format
+        with metrics.stage("copy"):
+            if operation in KEYED_OPERATIONS:
+                temp_table = self.driver.create_temp_table(table, columns)
+                self.driver.copy_into(
+                    temp_table, stage, [*columns, SEQUENCE_COLUMN], part_format
+                )
+                self.driver.apply(operation, table, temp_table, columns, keys)
+            else:
+                self.driver.copy_into(table, stage, columns, part_format)
+            self.driver.commit()
+        metrics.count("rows_out", spooler.rows)
+
+    def load(
+        self,
+        table: str,
+        operation: str,
+        records: Iterable[Dict[str, Any]],
+        columns: Optional[Sequence[str]] = None,
+        keys: Optional[Sequence[str]] = None,
+    ) -> LoadResult:
+        self.check_operation(operation, keys)
+        keyed = operation in KEYED_OPERATIONS
+
+        records = iter(records)
+        first = next(records, None)
+        if first is None:
+            return LoadResult()
+        columns = list(columns or first.keys())
+        if keyed:
+            columns += [key for key in keys if key not in columns]
+
+        directory = Path(tempfile.mkdtemp(prefix="snowpilot_", dir=self.spool_dir))
+        try:
+            spooler = PartSpooler(
+                directory, columns, self.max_part_bytes, with_sequence=keyed
+            )
+            self.apply_parts(table, operation, spooler, chain([first], records), keys)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return LoadResult(rows=spooler.rows, parts=spooler.parts)
+
+    def load_batches(
+        self,
+        table: str,
+        operation: str,
+        batches: Any,
+        columns: Optional[Sequence[str]] = None,
+        keys: Optional[Sequence[str]] = None,
+    ) -> LoadResult:
+        """Load an Arrow record batch reader, staging the batches as Parquet.
+
+        The columns default to the fields of the reader's schema.
+        """
+        self.check_operation(operation, keys)
+        keyed = operation in KEYED_OPERATIONS
+
+        names = batches.schema.names
+        columns = list(columns or names)
+        if keyed:
+            columns += [key for key in keys if key not in columns]
+        missing = [column for column in columns if column not in names]
+        if missing:
+            raise ValueError(f"Columns missing from the input: {', '.join(missing)}")
+
+        iterator = iter(batches)
+        first = next(iterator, None)
+        if first is None:
+            return LoadResult()
+
+        directory = Path(tempfile.mkdtemp(prefix="snowpilot_", dir=self.spool_dir))
+        try:
+            spooler = ParquetPartSpooler(
+                directory, columns, self.max_part_bytes, with_sequence=keyed
+            )
+            self.apply_parts(table, operation, spooler, chain([first], iterator), keys)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return LoadResult(rows=spooler.rows, parts=spooler.parts)
@@ -1,84 +1,369 @@
-import json
 import sys
-from datetime import datetime
-from typing import Dict, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
 
-import httpx
-import jsonc
 import typer
-from pydantic import ValidationError, create_model
-from rich import print
-from rich.console import Console
+from snowpilot_core.cli import (
+    DataFormat,
+    config_callback,
+    console,
+    err_console,
+    parse_fields,
+    warn_invalid_line,
+)
 from typing_extensions import Annotated
 
-from src.models import (
-    Catalog,
-    CollectionMetadata,
-    Config,
-    Schema,
-    User,
-)
+from src.defaults import DEFAULT_CONCURRENCY, DEFAULT_PART_BYTES
+
+if TYPE_CHECKING:
+    from snowpilot_core.state import ExtractState
+
+    from src.drivers import ColumnInfo, Driver, Range
+    from src.models import Config
+
+# Modules that import pydantic, orjson or the Snowflake client are imported by
+# the commands using them, so that starting the CLI stays cheap.
 
-err_console = Console(stderr=True)
 app = typer.Typer()
-state: Dict[str, Optional[Config]] = {"config": None}
-
-
-def build_client(config: Config):
-    raise NotImplementedError("build_client not implemented")
-
-
-def api_type_to_pydantic_type(type: str) -> type:
-    raise NotImplementedError("api_type_to_pydantic_type not implemented")
-    # match type:
-    #     case "string":
-    #         return str
-    #     case "long":
-    #         return int
-    #     case "boolean":
-    #         return bool
-    #     case "date":
-    #         return datetime
-    #     case "object":
-    #         return dict
-    #     case _:
-    #         raise ValueError(f"Unsupported type: {type}")
-
-
-@app.callback()
-def config(
-    config_file: Annotated[
-        typer.FileText,
-        typer.Option("--config", "-f", help="Path to the configuration file"),
-    ],
-):
-    """Provide the path to the configuration file."""
-    raw_config = jsonc.load(config_file)
-    try:
-        validated_config = Config.model_validate(raw_config)
-        state["config"] = validated_config
-    except ValidationError as e:
-        err_console.print("[bold red]Error in configuration file:[/bold red]")
-        err_console.print(e)
-        raise typer.Exit(code=1)
+state: Dict[str, Optional["Config"]] = {"config": None}
+
+
+def connect(config: "Config") -> "Driver":
+    from src.drivers import SnowflakeDriver
+
+    return SnowflakeDriver(config)
+
+
+def config_model():
+    from src.models import Config
+
+    return Config
+
+
+app.callback()(config_callback(config_model, state))
 
 
 @app.command()
 def discover():
     """Discover available collections and their schemas."""
-    raise NotImplementedError("Discover operation not implemented")
+    from src.extractor import build_schemas
+    from src.models import Catalog, CollectionMetadata
+
+    driver = connect(state["config"])
+    try:
+        schemas = build_schemas(driver.columns())
+    finally:
+        driver.close()
+
+    catalog = Catalog(
+        collections=[
+            CollectionMetadata(
+                id=table, label=table, row=schema, insert=schema, upsert=schema
+            )
+            for table, schema in schemas.items()
+        ]
+    )
+    console.print(catalog.model_dump_json(indent=2), markup=False)
 
 
 @app.command()
-def extract(collection_id: Annotated[str, typer.Option("--collection", "-c")]):
+def extract(
+    collection_id: Annotated[str, typer.Option("--collection", "-c")],
+    fields: Annotated[
+        Optional[str],
+        typer.Option("--fields", help="Comma-separated list of fields to extract"),
+    ] = None,
+    concurrency: Annotated[
+        int,
+        typer.Option("--concurrency", help="Number of result chunks fetched at once"),
+    ] = DEFAULT_CONCURRENCY,
+    data_format: Annotated[
+        DataFormat, typer.Option("--format", help="Format of the extracted records")
+    ] = DataFormat.jsonl,
+    state_file: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--state",
+            help="File with the replication key value to extract from, updated after",
+        ),
+    ] = None,
+    replication_key: Annotated[
+        Optional[str],
+        typer.Option(
+            "--replication-key",
+            help="Column to extract incrementally by, instead of replication_keys",
+        ),
+    ] = None,
+):
     """Extract data from the specified collection."""
-    raise NotImplementedError("Extract operation not implemented")
+    from snowpilot_core.state import ExtractState
+
+    config = state["config"]
+    extract_state = ExtractState.read(state_file) if state_file else None
+    fields = parse_fields(fields)
+    if data_format == DataFormat.arrow:
+        extract_arrow(
+            config, collection_id, fields, concurrency, extract_state, replication_key
+        )
+    else:
+        from contextlib import closing
+
+        from snowpilot_core.jsonl import JsonlWriter
+
+        from src.extractor import encode_default
+
+        records = extract_records(
+            config, collection_id, fields, concurrency, extract_state, replication_key
+        )
+        # Closing the records closes the connection, should writing fail
+        with closing(records):
+            with JsonlWriter(sys.stdout.buffer, default=encode_default) as writer:
+                writer.write_many(records)
+
+    if extract_state is not None:
+        extract_state.save()
+
+
+def extract_arrow(
+    config: "Config",
+    collection_id: str,
+    fields: Optional[List[str]],
+    concurrency: int,
+    extract_state: Optional["ExtractState"],
+    replication_key: Optional[str],
+):
+    """Write the rows of a table to stdout as an Arrow IPC stream."""
+    from snowpilot_core import arrow
+
+    from src import extractor
+
+    driver = connect(config)
+    try:
+        infos, columns = check_columns(driver, collection_id, fields)
+        rows = None
+        if extract_state is not None:
+            rows = replication_range(
+                config, driver, infos, extract_state, replication_key
+            )
+            if rows is None:
+                return
+
+        table_schema = extractor.build_schemas(infos)[collection_id]
+        schema = arrow.arrow_schema(table_schema, columns)
+        batches = extractor.extract_batches(
+            driver, collection_id, columns, schema, concurrency, rows
+        )
+        arrow.write_stream(sys.stdout.buffer, schema, batches)
+    finally:
+        driver.close()
+
+    if extract_state is not None:
+        advance(extract_state, collection_id, rows)
+
+
+def replication_range(
+    config: "Config",
+    driver: "Driver",
+    infos: List["ColumnInfo"],
+    extract_state: "ExtractState",
+    replication_key: Optional[str] = None,
+) -> Optional["Range"]:
+    """Find the rows to extract incrementally, None if the table is empty.
+
+    They start at the replication key value saved by the previous extract,
+    included, and end at the highest value now in the table, which is saved
+    next. Rows with the saved value are extracted again, so that none added
+    since with that value are missed.
+    """
+    from src.drivers import Range
+
+    (table,) = {info.table for info in infos}
+    column = replication_key or config.replication_keys.get(table)
+    if column is None:
+        raise typer.BadParameter(
+            f"--state requires a replication key for {table}: "
+            "set replication_keys in the configuration or pass --replication-key"
+        )
+    if column not in [info.column for info in infos]:
+        raise typer.BadParameter(f"Unknown replication key: {column}")
+
+    high = driver.max_value(table, column)
+    if high is None:
+        return None
+    cursor = extract_state.cursor(table)
+    low = cursor["value"] if cursor and cursor["column"] == column else None
+    return Range(column, low, high)
+
+
+def advance(extract_state: "ExtractState", table: str, rows: "Range"):
+    from src.extractor import cursor_value
+
+    extract_state.advance(
+        table, {"column": rows.column, "value": cursor_value(rows.high)}
+    )
+
+
+def check_columns(
+    driver: "Driver", table: str, fields: Optional[List[str]]
+) -> tuple[list, List[str]]:
+    """Return the column infos of a table and the columns to extract."""
+    infos = [info for info in driver.columns() if info.table == table]
+    table_columns = [info.column for info in infos]
+    if not table_columns:
+        raise typer.BadParameter(f"Unknown collection: {table}")
+
+    columns = fields or table_columns
+    missing = [column for column in columns if column not in table_columns]
+    if missing:
+        raise typer.BadParameter(f"Unknown fields: {', '.join(missing)}")
+    return infos, columns
+
+
+def extract_records(
+    config: "Config",
+    collection_id: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    state: Optional["ExtractState"] = None,
+    replication_key: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Read the rows of a table, as `extract` does in JSONL.
+
+    Arguments are checked before this returns; the connection is closed once
+    the records are exhausted or the iterator is closed. With a `state`, only
+    the rows from its replication key value on are read, and the value is
+    advanced once they all are; saving it is up to the caller.
+    """
+    driver = connect(config)
+    try:
+        infos, columns = check_columns(driver, collection_id, fields)
+        rows = None
+        if state is not None:
+            rows = replication_range(config, driver, infos, state, replication_key)
+    except BaseException:
+        driver.close()
+        raise
+
+    from src import extractor
+
+    def records() -> Iterator[Dict[str, Any]]:
+        try:
+            if state is not None and rows is None:
+                return
+            yield from extractor.extract_records(
+                driver, collection_id, columns, concurrency, rows
+            )
+            if state is not None:
+                advance(state, collection_id, rows)
+        finally:
+            driver.close()
+
+    return records()
 
 
 @app.command()
 def load(
     collection_id: Annotated[str, typer.Option("--collection", "-c")],
     operation: Annotated[str, typer.Option("--operation", "-o")],
+    fields: Annotated[
+        Optional[str],
+        typer.Option("--fields", help="Comma-separated list of fields to load"),
+    ] = None,
+    key: Annotated[
+        Optional[str],
+        typer.Option(
+            "--key", help="Comma-separated key columns for upsert, update and delete"
+        ),
+    ] = None,
+    max_part_bytes: Annotated[
+        int,
+        typer.Option("--max-part-bytes", help="Uncompressed size of each staged file"),
+    ] = DEFAULT_PART_BYTES,
+    data_format: Annotated[
+        DataFormat, typer.Option("--format", help="Format of the input records")
+    ] = DataFormat.jsonl,
 ):
     """Load data into the specified collection."""
-    raise NotImplementedError("Load operation not implemented")
+    keys = parse_fields(key)
+    if data_format == DataFormat.jsonl:
+        from snowpilot_core.jsonl import JsonlReader
+
+        rows = load_records(
+            state["config"],
+            JsonlReader(sys.stdin.buffer, on_error=warn_invalid_line),
+            collection_id,
+            operation,
+            columns=parse_fields(fields),
+            keys=keys,
+            max_part_bytes=max_part_bytes,
+        )
+    else:
+        from snowpilot_core import arrow
+
+        from src.loader import BulkLoader
+
+        check_operation(operation, keys)
+        driver = connect(state["config"])
+        try:
+            # Batches are staged as Parquet without being converted to rows
+            rows = (
+                BulkLoader(driver, max_part_bytes=max_part_bytes)
+                .load_batches(
+                    collection_id,
+                    operation,
+                    arrow.read_stream(sys.stdin.buffer),
+                    columns=parse_fields(fields),
+                    keys=keys,
+                )
+                .rows
+            )
+        finally:
+            driver.close()
+
+    if not rows:
+        err_console.print(
+            "[bold yellow]Warning: No valid records found in input.[/bold yellow]"
+        )
+        return
+
+    console.print(
+        f"[green]Successfully loaded {rows} records into {collection_id}[/green]"
+    )
+
+
+def check_operation(operation: Optional[str], keys: Optional[List[str]]):
+    from src.loader import KEYED_OPERATIONS, OPERATIONS
+
+    if operation not in OPERATIONS:
+        raise typer.BadParameter(f"Unsupported operation, use one of {OPERATIONS}")
+    if operation in KEYED_OPERATIONS and not keys:
+        raise typer.BadParameter(f"--key is required for the {operation} operation")
+
+
+def load_records(
+    config: "Config",
+    records: Iterable[Dict[str, Any]],
+    collection_id: Optional[str] = None,
+    operation: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    keys: Optional[List[str]] = None,
+    max_part_bytes: int = DEFAULT_PART_BYTES,
+) -> int:
+    """Bulk load records into a table, returning how many rows were loaded.
+
+    Used by `load`, and to run the connector in-process.
+    """
+    from src.loader import BulkLoader
+
+    if not collection_id:
+        raise typer.BadParameter("--collection is required")
+    check_operation(operation, keys)
+    driver = connect(config)
+    try:
+        loader = BulkLoader(driver, max_part_bytes=max_part_bytes)
+        result = loader.load(
+            collection_id, operation, records, columns=columns, keys=keys
+        )
+    finally:
+        driver.close()
+    return result.rows
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """A config file; the tests swap the Snowflake driver for a local one."""
+    path = tmp_path / "config.json"
+    path.write_text(
+        json.dumps(
+            {
+                "user": "user",
+                "password": "password",
+                "account": "account",
+                "warehouse": "warehouse",
+                "database": "database",
+                "schema": "public",
+            }
+        )
+    )
+    return path
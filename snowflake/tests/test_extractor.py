@@ -0,0 +1,175 @@
+"""
+Tests for discovery and chunked extraction, run against the SQLite stand-in.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+from src import main
+from src.drivers import SQLiteDriver
+from src.extractor import build_schemas, extract_records, ordered_chunks
+from src.main import app
+
+
+@pytest.fixture
+def driver(tmp_path):
+    driver = SQLiteDriver(str(tmp_path / "warehouse.db"), chunk_rows=100)
+    driver.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT NOT NULL, score REAL)"
+    )
+    driver.execute("CREATE TABLE orders (order_id INTEGER, placed_at TIMESTAMP)")
+    driver.connection.executemany(
+        "INSERT INTO users VALUES (?, ?, ?)",
+        [(i, f"{i}@example.com", i / 2) for i in range(1, 1001)],
+    )
+    driver.commit()
+    yield driver
+    driver.close()
+
+
+def test_build_schemas(driver):
+    """Test that one column listing yields a model per table."""
+    schemas = build_schemas(driver.columns())
+
+    assert set(schemas) == {"users", "orders"}
+    users = schemas["users"].model_json_schema()
+    assert users["properties"]["id"]["type"] == "integer"
+    assert users["properties"]["email"]["type"] == "string"
+    assert users["required"] == ["id", "email"]
+    orders = schemas["orders"].model_json_schema()
+    assert {"type": "string", "format": "date-time"} in orders["properties"][
+        "placed_at"
+    ]["anyOf"]
+
+
+def test_extract_records_in_order(driver):
+    """Test that chunks read in parallel come back in table order."""
+    records = list(extract_records(driver, "users", ["id", "email"], concurrency=4))
+
+    assert len(driver.result_chunks("users", ["id"])) == 10
+    assert [record["id"] for record in records] == list(range(1, 1001))
+    assert records[0] == {"id": 1, "email": "1@example.com"}
+
+
+def test_ordered_chunks_run_concurrently():
+    """Test that chunks are fetched at the same time but yielded in order."""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetcher(index):
+        def fetch():
+            with lock:
+                running.append(index)
+                peak.append(len(running))
+            time.sleep(0.01 * (5 - index))
+            with lock:
+                running.remove(index)
+            return [(index,)]
+
+        return fetch
+
+    chunks = list(ordered_chunks([fetcher(i) for i in range(5)], concurrency=3))
+
+    assert chunks == [[(i,)] for i in range(5)]
+    assert max(peak) > 1
+
+
+def test_extract_command(config_path, monkeypatch, driver):
+    """Test the extract command end to end with the stand-in driver."""
+    driver.close = lambda: None
+    monkeypatch.setattr(main, "connect", lambda config: driver)
+
+    result = CliRunner().invoke(
+        app,
+        [
+            "--config",
+            str(config_path),
+            "extract",
+            "--collection",
+            "users",
+            "--fields",
+            "id,score",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    lines = result.stdout.splitlines()
+    assert len(lines) == 1000
+    assert json.loads(lines[1]) == {"id": 2, "score": 1.0}
+
+
+def test_extract_arrow_round_trips_into_load(config_path, monkeypatch, driver):
+    """Test that Arrow extract output loads into another table unchanged."""
+    driver.close = lambda: None
+    monkeypatch.setattr(main, "connect", lambda config: driver)
+    driver.execute("CREATE TABLE copies (id INTEGER PRIMARY KEY, score REAL)")
+    runner = CliRunner()
+
+    extracted = runner.invoke(
+        app,
+        ["--config", str(config_path), "extract", "-c", "users"]
+        + ["--fields", "id,score", "--format", "arrow"],
+    )
+    assert extracted.exit_code == 0, extracted.output
+    loaded = runner.invoke(
+        app,
+        ["--config", str(config_path), "load", "-c", "copies", "-o", "insert"]
+        + ["--format", "arrow"],
+        input=extracted.stdout_bytes,
+    )
+
+    assert loaded.exit_code == 0, loaded.output
+    assert driver.execute("SELECT COUNT(*), SUM(score) FROM copies") == [
+        (1000, 250250.0)
+    ]
+
+
+def test_extract_from_replication_key(config_path, monkeypatch, driver, tmp_path):
+    """Test that extracts with a state file continue from the highest key read."""
+    driver.close = lambda: None
+    monkeypatch.setattr(main, "connect", lambda config: driver)
+    state_path = tmp_path / "state.json"
+    args = ["--config", str(config_path), "extract", "-c", "orders"]
+    args += ["--state", str(state_path), "--replication-key", "placed_at"]
+    runner = CliRunner()
+
+    def extract():
+        result = runner.invoke(app, args)
+        assert result.exit_code == 0, result.output
+        return [json.loads(line)["order_id"] for line in result.stdout.splitlines()]
+
+    assert extract() == []
+    driver.connection.executemany(
+        "INSERT INTO orders VALUES (?, ?)",
+        [(1, "2024-01-01T09:00:00"), (2, "2024-01-01T10:00:00")],
+    )
+    driver.commit()
+    assert extract() == [1, 2]
+
+    driver.execute("INSERT INTO orders VALUES (3, '2024-01-01T11:00:00')")
+    driver.commit()
+    # Rows with the last value read are read again
+    assert extract() == [2, 3]
+    assert json.loads(state_path.read_text())["cursors"] == {
+        "orders": {"column": "placed_at", "value": "2024-01-01T11:00:00"}
+    }
+
+
+def test_extract_state_requires_replication_key(config_path, monkeypatch, driver):
+    """Test that incremental extracts need a replication key for the table."""
+    driver.close = lambda: None
+    monkeypatch.setattr(main, "connect", lambda config: driver)
+
+    result = CliRunner().invoke(
+        app,
+        ["--config", str(config_path), "extract", "-c", "users"]
+        + ["--state", str(config_path.parent / "state.json")],
+    )
+
+    assert result.exit_code != 0
+    assert "replication" in result.output
@@ -0,0 +1,158 @@
+"""
+Tests for the staged bulk loader, run against the SQLite stand-in driver.
+"""
+
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from src import main
+from src.drivers import SnowflakeDriver, SQLiteDriver
+from src.loader import BulkLoader
+from src.main import app
+
+
+@pytest.fixture
+def driver():
+    driver = SQLiteDriver()
+    driver.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, plan TEXT, tags TEXT)"
+    )
+    yield driver
+    driver.close()
+
+
+def rows(driver):
+    return driver.execute("SELECT id, email, plan, tags FROM users ORDER BY id")
+
+
+def test_insert_spools_several_parts(driver):
+    """Test that inserts are split into parts and all of them are copied."""
+    records = [
+        {"id": i, "email": f"{i}@example.com", "plan": None, "tags": ["a", "b"]}
+        for i in range(2000)
+    ]
+
+    result = BulkLoader(driver, max_part_bytes=4096).load("users", "insert", records)
+
+    assert result.rows == 2000
+    assert result.parts > 1
+    assert len(rows(driver)) == 2000
+    assert rows(driver)[0] == (0, "0@example.com", None, '["a","b"]')
+
+
+def test_insert_keeps_empty_strings(driver):
+    """Test that empty strings are loaded as such, not as NULL."""
+    records = [{"id": 1, "email": "", "plan": None}]
+
+    BulkLoader(driver).load("users", "insert", records)
+
+    assert rows(driver) == [(1, "", None, None)]
+
+
+def test_upsert_merges_and_keeps_last_duplicate(driver):
+    """Test that upserts update existing keys, insert new ones, and that the
+    last record wins when a key appears more than once."""
+    driver.execute("INSERT INTO users VALUES (1, 'old@example.com', 'free', NULL)")
+    records = [
+        {"id": 1, "email": "first@example.com", "plan": "pro"},
+        {"id": 2, "email": "two@example.com", "plan": "free"},
+        {"id": 1, "email": "last@example.com", "plan": "pro"},
+    ]
+
+    BulkLoader(driver).load("users", "upsert", records, keys=["id"])
+
+    assert rows(driver) == [
+        (1, "last@example.com", "pro", None),
+        (2, "two@example.com", "free", None),
+    ]
+
+
+def test_update_and_delete(driver):
+    """Test that updates skip missing keys and deletes remove matching rows."""
+    driver.execute("INSERT INTO users VALUES (1, 'one@example.com', 'free', NULL)")
+    driver.execute("INSERT INTO users VALUES (2, 'two@example.com', 'free', NULL)")
+    loader = BulkLoader(driver)
+
+    loader.load(
+        "users",
+        "update",
+        [{"id": 1, "plan": "pro"}, {"id": 3, "plan": "pro"}],
+        keys=["id"],
+    )
+    loader.load("users", "delete", [{"id": 2}], keys=["id"])
+
+    assert rows(driver) == [(1, "one@example.com", "pro", None)]
+
+
+def test_merge_of_key_columns_only():
+    """Test that a MERGE has no update clause when every column is a key."""
+    driver = SnowflakeDriver.__new__(SnowflakeDriver)
+    statements = []
+    driver.execute = statements.append
+
+    driver.apply("upsert", "tags", "source", ["id"], ["id"])
+    driver.apply("update", "tags", "source", ["id"], ["id"])
+
+    (merge,) = statements
+    assert "WHEN MATCHED" not in merge
+    assert merge.endswith(
+        "ON t.id = s.id WHEN NOT MATCHED THEN INSERT (id) VALUES (s.id)"
+    )
+
+
+def test_keyed_operations_require_keys(driver):
+    """Test that upserts without key columns are rejected."""
+    with pytest.raises(ValueError):
+        BulkLoader(driver).load("users", "upsert", [{"id": 1}])
+
+
+def test_load_command(config_path, monkeypatch, driver):
+    """Test the load command end to end with the stand-in driver."""
+    driver.close = lambda: None
+    monkeypatch.setattr(main, "connect", lambda config: driver)
+    records = [{"id": i, "email": f"{i}@example.com"} for i in range(10)]
+
+    result = CliRunner().invoke(
+        app,
+        [
+            "--config",
+            str(config_path),
+            "load",
+            "--collection",
+            "users",
+            "--operation",
+            "upsert",
+            "--key",
+            "id",
+        ],
+        input="".join(json.dumps(record) + "\n" for record in records),
+    )
+
+    assert result.exit_code == 0, result.output
+    assert len(rows(driver)) == 10
+
+
+def test_load_batches_stages_parquet_parts(driver):
+    """Test that Arrow batches are staged as Parquet parts and merged by key."""
+    import pyarrow as pa
+
+    driver.execute("INSERT INTO users VALUES (1, 'old@example.com', 'free', NULL)")
+    schema = pa.schema([("id", pa.int64()), ("email", pa.string())])
+    batches = [
+        pa.record_batch([[i for i in range(1, 501)], [None] * 500], schema=schema),
+        pa.record_batch([[1], ["last@example.com"]], schema=schema),
+    ]
+
+    result = BulkLoader(driver, max_part_bytes=1024).load_batches(
+        "users",
+        "upsert",
+        pa.RecordBatchReader.from_batches(schema, batches),
+        keys=["id"],
+    )
+
+    assert result.rows == 501
+    assert result.parts == 2
+    assert len(rows(driver)) == 500
+    assert rows(driver)[0] == (1, "last@example.com", "free", None)